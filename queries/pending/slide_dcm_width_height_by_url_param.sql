@@ -4,14 +4,14 @@
 -- Estimated Cost: $0.05-0.10 | Bytes Scanned: TBD
 -- 
 -- Status: PENDING REVIEW
--- Reason: Parameterized query - requires <gcs_url> parameter substitution
+-- Reason: Parameterized query - binds query parameter @gcs_url (tests/query_params.py)
 -- 
 -- Description:
 -- Retrieves the pixel dimensions (width/height) for a specific Slide Microscopy
 -- DICOM object identified by its GCS URL.
 -- 
 -- Parameters:
---   <gcs_url>: GCS URL from slide queries (full path to DICOM object)
+--   @gcs_url STRING: GCS URL from slide queries (full path to DICOM object)
 -- 
 -- Author/Source: IDC Cookbook
 
@@ -21,4 +21,4 @@ SELECT
 FROM
   `bigquery-public-data.idc_current.dicom_all`
 WHERE
-  gcs_url = "<gcs_url>"
+  gcs_url = @gcs_url
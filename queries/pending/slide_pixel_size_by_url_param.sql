@@ -4,7 +4,7 @@
 -- Estimated Cost: $0.05-0.10 | Bytes Scanned: TBD
 -- 
 -- Status: PENDING REVIEW
--- Reason: Parameterized query - requires <gcs_url> parameter substitution
+-- Reason: Parameterized query - binds query parameter @gcs_url (tests/query_params.py)
 -- 
 -- Description:
 -- Retrieves pixel spacing (resolution) for a Slide Microscopy DICOM object.
@@ -18,7 +18,7 @@
 --     https://doi.org/10.4103/2153-3539.116866
 -- 
 -- Parameters:
---   <gcs_url>: GCS URL from slide queries (full path to DICOM object)
+--   @gcs_url STRING: GCS URL from slide queries (full path to DICOM object)
 -- 
 -- Author/Source: IDC Cookbook
 
@@ -32,4 +32,4 @@ SELECT
 FROM
   `bigquery-public-data.idc_current.dicom_all`
 WHERE
-  gcs_url = "<gcs_url>"
+  gcs_url = @gcs_url
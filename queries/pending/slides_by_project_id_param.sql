@@ -4,14 +4,14 @@
 -- Estimated Cost: $0.05-0.10 | Bytes Scanned: TBD
 -- 
 -- Status: PENDING REVIEW
--- Reason: Parameterized query - requires <project_id> parameter substitution
+-- Reason: Parameterized query - binds query parameter @project_id (tests/query_params.py)
 -- 
 -- Description:
 -- Retrieves all distinct slide IDs (ContainerIdentifier) for a specific clinical
 -- trial project identified by ClinicalTrialProtocolID.
 -- 
 -- Parameters:
---   <project_id>: ClinicalTrialProtocolID value (project identifier)
+--   @project_id STRING: ClinicalTrialProtocolID value (project identifier)
 -- 
 -- Author/Source: IDC Cookbook
 
@@ -20,5 +20,5 @@ SELECT
 FROM
   `bigquery-public-data.idc_current.dicom_all`
 WHERE
-  ClinicalTrialProtocolID = "<project_id>"
+  ClinicalTrialProtocolID = @project_id
   AND Modality = "SM"
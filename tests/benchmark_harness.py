@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of the regression test harness itself
+
+Times the harness's own work - indexing the query catalog, parsing headers,
+running the test cycle, generating the report and rewriting query headers -
+on a synthetic catalog of thousands of queries. Queries are "executed" by
+BenchmarkClient, a stand-in for the BigQuery client that returns configurable
+latencies and job stats, so no credentials are needed and nothing is billed.
+
+Each repetition builds a fresh synthetic catalog in a temporary directory
+(the harness writes manifests and rewrites headers in place). Phase times
+can be saved as JSON and compared against an earlier run with --baseline.
+
+To benchmark the queries themselves on BigQuery, use
+run_regression_tests.py --benchmark N.
+"""
+
+import contextlib
+import io
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from local_engine import LocalQueryJob
+from query_catalog import QueryCatalog, parse_header
+
+DEFAULT_QUERY_COUNT = 10000
+
+# Slowdowns smaller than this are timer noise, whatever their relative size
+NOISE_FLOOR_MS = 50.0
+
+# Harness phases, in the order they run
+PHASES = ("index (cold)", "index (warm)", "header parsing", "run", "report", "header rewrite")
+
+SYNTHETIC_CATEGORIES = ["general", "image_series", "measurements", "segmentations", "slide_microscopy"]
+SYNTHETIC_COMPLEXITIES = ["Low", "Medium", "High"]
+
+# Query bodies; {n} makes each query's SQL (and so its content hash) unique
+SYNTHETIC_TEMPLATES = [
+    """SELECT
+  collection_id,
+  COUNT(DISTINCT PatientID) AS patients
+FROM `bigquery-public-data.idc_current.dicom_all`
+WHERE Modality = 'MR' AND collection_id != 'synthetic_{n}'
+GROUP BY collection_id
+ORDER BY patients DESC""",
+    """WITH segs AS (
+  SELECT SeriesInstanceUID, SegmentedPropertyCategory.CodeMeaning AS category
+  FROM `bigquery-public-data.idc_current.segmentations`
+)
+SELECT category, COUNT(*) AS segments
+FROM segs
+WHERE category IS NOT NULL
+GROUP BY category
+HAVING COUNT(*) > {n}""",
+    """SELECT
+  m.SeriesInstanceUID,
+  m.StudyInstanceUID,
+  ARRAY_LENGTH(m.ImageType) AS image_types
+FROM `bigquery-public-data.idc_current.dicom_metadata` AS m
+WHERE m.SliceThickness > {n} / 1000
+LIMIT 100""",
+]
+
+
+class BenchmarkClient:
+    """Stand-in for google.cloud.bigquery.Client with configurable latency and job stats."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter: float = 0.0, dry_run_latency_ms: float = 0.0,
+                 bytes_processed: int = 50 * 1024 ** 3, slot_ms: int = 5000, row_count: int = 3,
+                 seed: int = 0, project: str = "benchmark"):
+        """
+        Args:
+            latency_ms: Time each execution job takes
+            jitter: Relative spread of latency_ms (0.2 = uniformly within +/-20%)
+            dry_run_latency_ms: Time each dry run takes
+            bytes_processed: Bytes processed and billed per job
+            slot_ms: Slot time reported per execution job
+            row_count: Rows returned per execution job
+            seed: Seed of the latency jitter
+            project: Reported as the client project
+        """
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.dry_run_latency_ms = dry_run_latency_ms
+        self.bytes_processed = bytes_processed
+        self.slot_ms = slot_ms
+        self.row_count = row_count
+        self.project = project
+        self._random = random.Random(seed)
+        self._job_ids = itertools.count(1)
+
+    def query(self, sql: str, job_config=None, job_id: Optional[str] = None, **kwargs) -> LocalQueryJob:
+        job_id = job_id or f"benchmark_{next(self._job_ids)}"
+        if getattr(job_config, "dry_run", False):
+            time.sleep(self.dry_run_latency_ms / 1000)
+            return LocalQueryJob(job_id, sql, self.bytes_processed)
+
+        latency_ms = self.latency_ms * (1 + self._random.uniform(-self.jitter, self.jitter))
+        time.sleep(latency_ms / 1000)
+        job = LocalQueryJob(job_id, sql, self.bytes_processed, [{"n": i} for i in range(self.row_count)], latency_ms)
+        job.total_bytes_billed = self.bytes_processed
+        job.slot_millis = self.slot_ms
+        return job
+
+
+def write_synthetic_queries(query_dir: str, count: int, pending_fraction: float = 0.05, seed: int = 0) -> int:
+    """
+    Write count queries with repo-style headers under query_dir, spread across categories.
+
+    Returns: number of pending queries written
+    """
+    rng = random.Random(seed)
+    pending = 0
+    for n in range(count):
+        is_pending = rng.random() < pending_fraction
+        category = "pending" if is_pending else SYNTHETIC_CATEGORIES[n % len(SYNTHETIC_CATEGORIES)]
+        pending += is_pending
+        complexity = rng.choice(SYNTHETIC_COMPLEXITIES)
+        path = Path(query_dir) / category / f"synthetic_query_{n:05d}.sql"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(
+            f"-- Purpose: Synthetic benchmark query {n}\n"
+            f"-- \n"
+            f"-- Complexity: {complexity}\n"
+            f"-- Estimated Cost: $0.05-0.10 | Bytes Scanned: TBD\n"
+            f"-- \n"
+            f"-- Author/Source: benchmark_harness.py\n"
+            f"\n"
+            f"{SYNTHETIC_TEMPLATES[n % len(SYNTHETIC_TEMPLATES)].format(n=n)}\n"
+        )
+    return pending
+
+
+def timed(func, *args, **kwargs):
+    """Call func; returns (its result, elapsed milliseconds)."""
+    start = time.perf_counter()
+    value = func(*args, **kwargs)
+    return value, (time.perf_counter() - start) * 1000
+
+
+def benchmark_harness(count: int, client: BenchmarkClient, concurrency: int = 1) -> Dict[str, float]:
+    """
+    Run every harness phase once over a fresh synthetic catalog of count queries.
+
+    Returns: phase -> elapsed milliseconds
+    """
+    from run_regression_tests import QueryTestRunner
+    from update_query_headers import QueryHeaderUpdater
+
+    timings = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="harness_benchmark_") as workdir:
+        # The harness keeps its manifest and caches relative to the working directory
+        os.chdir(workdir)
+        try:
+            write_synthetic_queries("queries", count)
+            _, timings["index (cold)"] = timed(QueryCatalog, "queries")
+            catalog, timings["index (warm)"] = timed(QueryCatalog, "queries")
+
+            contents = [catalog.content(path) for path in catalog.entries]
+            _, timings["header parsing"] = timed(lambda: [parse_header(content) for content in contents])
+
+            runner = QueryTestRunner(client=client)
+            # Per-query progress lines would dominate the measurement
+            with contextlib.redirect_stdout(io.StringIO()):
+                (results, _), timings["run"] = timed(runner.run_all_tests, "queries", concurrency=concurrency)
+            _, timings["report"] = timed(runner.generate_markdown_report, results)
+            _, timings["header rewrite"] = timed(QueryHeaderUpdater(0.10).batch_update, results, "queries")
+        finally:
+            os.chdir(cwd)
+    return timings
+
+
+def slower_phases(current: Dict[str, float], baseline: Dict[str, float], max_slowdown: float) -> List[str]:
+    """Phases more than max_slowdown (0.2 = 20%), and more than NOISE_FLOOR_MS, slower than in baseline."""
+    return [
+        phase for phase, ms in current.items()
+        if baseline.get(phase) and ms - baseline[phase] > max(baseline[phase] * max_slowdown, NOISE_FLOOR_MS)
+    ]
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the regression test harness on a synthetic catalog")
+    parser.add_argument("--queries", type=int, default=DEFAULT_QUERY_COUNT, help="Synthetic queries to generate")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions; the median time of each phase is reported")
+    parser.add_argument("--concurrency", type=int, default=1, help="Concurrency of the run phase")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency of each fake execution job")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Relative spread of --latency-ms (e.g. 0.2)")
+    parser.add_argument("--dry-run-latency-ms", type=float, default=0.0, help="Latency of each fake dry run")
+    parser.add_argument("--bytes-gb", type=float, default=50.0, help="GB processed per fake job")
+    parser.add_argument("--slot-ms", type=int, default=5000, help="Slot time reported per fake execution job")
+    parser.add_argument("--json-output", help="Write phase timings as JSON")
+    parser.add_argument("--baseline", help="JSON timings of an earlier run to compare against")
+    parser.add_argument("--max-slowdown", type=float, default=0.20,
+                        help="With --baseline, exit non-zero if a phase is more than this much slower (0.20 = 20%%)")
+
+    args = parser.parse_args()
+
+    print(f"Benchmarking the harness on {args.queries} synthetic queries, {args.repeat} repetitions...")
+    runs = []
+    for repetition in range(args.repeat):
+        client = BenchmarkClient(
+            latency_ms=args.latency_ms,
+            jitter=args.jitter,
+            dry_run_latency_ms=args.dry_run_latency_ms,
+            bytes_processed=int(args.bytes_gb * 1024 ** 3),
+            slot_ms=args.slot_ms,
+            seed=repetition,
+        )
+        runs.append(benchmark_harness(args.queries, client, args.concurrency))
+        print(f"  [{repetition + 1}/{args.repeat}] {sum(runs[-1].values()) / 1000:.1f}s")
+
+    timings = {phase: statistics.median(run[phase] for run in runs) for phase in PHASES}
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["timings"]
+
+    print(f"\n{'Phase':<16} {'Median':>10} {'Per Query':>10}" + (f" {'vs Baseline':>12}" if baseline else ""))
+    for phase, ms in timings.items():
+        line = f"{phase:<16} {ms:>8.0f}ms {ms * 1000 / args.queries:>8.0f}us"
+        if baseline:
+            before = baseline.get(phase)
+            line += f" {round((ms - before) / before * 100):>+11d}%" if before else f" {'N/A':>12}"
+        print(line)
+
+    if args.json_output:
+        with open(args.json_output, "w") as f:
+            json.dump({"queries": args.queries, "repeat": args.repeat, "timings": timings}, f, indent=2)
+        print(f"\n✓ Wrote timings to {args.json_output}")
+
+    if baseline:
+        slower = slower_phases(timings, baseline, args.max_slowdown)
+        if slower:
+            print(f"\n❌ {len(slower)} phase(s) more than {args.max_slowdown * 100:.0f}% slower than the baseline: "
+                  f"{', '.join(slower)}")
+            return 1
+        print(f"\n✓ No phase more than {args.max_slowdown * 100:.0f}% slower than the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Run catalog queries by name, with a local Parquet cache of their results
+
+For analysts re-running the same cookbook queries: the result of a query is
+cached as Parquet under .query_cache/parquet, keyed by its normalized SQL,
+its bound parameter values and the IDC release that `idc_current` resolves
+to. Re-running it is then a memory-mapped local read instead of a billed
+scan, until the query or the IDC release changes.
+
+    import sys; sys.path.insert(0, "tests")
+    from catalog_query import run_catalog_query
+
+    table = run_catalog_query("rtstruct_roi_names_with_counts")
+    df = table.to_pandas()
+
+The release is re-checked at most once per release_check_seconds (default one
+hour), since IDC releases change only a few times a year.
+"""
+
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from export_query_results import arrow_batches, resolve_query, select_columns
+from query_catalog import QueryCatalog, make_job_config
+from query_params import bind_parameters, convert_value, parse_parameters
+from result_cache import ParquetResultCache, ResultCache
+
+DEFAULT_CACHE_DIR = ".query_cache/parquet"
+
+DEFAULT_MAX_CACHE_BYTES = 2 * 1024 ** 3
+
+DEFAULT_RELEASE_CHECK_SECONDS = 3600
+
+
+def parameter_values(parameters: List) -> List:
+    """(name, value) pairs of bound query parameters, for use in a cache key."""
+    return [
+        (parameter.name, list(parameter.values) if hasattr(parameter, "values") else parameter.value)
+        for parameter in parameters
+    ]
+
+
+def cached_idc_version(runner, cache_dir: str, max_age_seconds: float) -> Optional[str]:
+    """IDC release of idc_current, resolved at most once per max_age_seconds."""
+    path = Path(cache_dir) / "idc_version.json"
+    try:
+        with open(path) as f:
+            record = json.load(f)
+        if time.time() - record["resolved_at"] <= max_age_seconds:
+            return record["idc_version"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    idc_version = runner.resolve_idc_version()
+    if idc_version is not None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"idc_version": idc_version, "resolved_at": time.time()}, f)
+    return idc_version
+
+
+def run_catalog_query(query: str, params: Optional[Dict] = None, columns: Optional[List[str]] = None,
+                      runner=None, credentials: Optional[str] = None, query_dir: str = "queries",
+                      cache_dir: str = DEFAULT_CACHE_DIR, max_cache_bytes: int = DEFAULT_MAX_CACHE_BYTES,
+                      release_check_seconds: float = DEFAULT_RELEASE_CHECK_SECONDS, refresh: bool = False):
+    """
+    Run a catalog query, serving repeat runs from the local Parquet cache.
+
+    Args:
+        query: Query name (e.g. quantitative_measurement_types) or path to a .sql file
+        params: Parameter name -> value; undeclared names raise, missing ones use the header example
+        columns: Only return these columns (pruned from the scan, too)
+        runner: QueryTestRunner to execute with (default: one built from credentials)
+        credentials: Path to service account JSON (default: GCP_SA_KEY env, then application credentials)
+        query_dir: Directory containing query files
+        cache_dir: Directory of cached results
+        max_cache_bytes: Least recently used results are evicted above this total size
+        release_check_seconds: How long a resolved IDC release is trusted
+        refresh: Re-run the query even if it is cached, and replace the cached result
+
+    Returns: pyarrow Table (memory-mapped from the cache file when cached)
+
+    Raises: LookupError if the query is unknown, ValueError for undeclared parameters
+    """
+    if runner is None:
+        from run_regression_tests import QueryTestRunner
+        runner = QueryTestRunner(credentials or os.getenv("GCP_SA_KEY"))
+
+    query_path = resolve_query(query, QueryCatalog(query_dir))
+    with open(query_path) as f:
+        content = f.read()
+
+    declared = parse_parameters(content)
+    undeclared = set(params or {}) - {p["name"] for p in declared}
+    if undeclared:
+        raise ValueError(f"{query_path} declares no parameter(s) {', '.join('@' + n for n in sorted(undeclared))}")
+    parameters = bind_parameters(declared, params)
+    sql = select_columns(content, columns) if columns else content
+
+    cache = ParquetResultCache(cache_dir, max_cache_bytes)
+    idc_version = cached_idc_version(runner, cache_dir, release_check_seconds)
+    key = None
+    if idc_version is not None:
+        key = ResultCache.make_key(sql, idc_version, json.dumps(parameter_values(parameters), default=str))
+        if not refresh:
+            table = cache.get(key)
+            if table is not None:
+                return table
+
+    job_config = make_job_config(query_parameters=parameters)
+    rows = runner.call_with_backoff(lambda: runner.client.query(sql, job_config=job_config).result())
+    if key is None or not cache.put(key, arrow_batches(rows)):
+        # Release unknown, so the result cannot be keyed, or a client with no result schema
+        import pyarrow as pa
+        batches = list(arrow_batches(rows)) if key is None else []
+        return pa.Table.from_batches(batches) if batches else pa.table({})
+
+    # The new entry is kept even if it alone exceeds max_cache_bytes: it has been paid for
+    cache.evict(keep=[key])
+    return cache.get(key)
+
+
+def main():
+    import argparse
+
+    from run_regression_tests import QueryTestRunner
+
+    parser = argparse.ArgumentParser(description="Run a catalog query, using the local result cache")
+    parser.add_argument("query", help="Query name (e.g. rtstruct_roi_names_with_counts) or path to a .sql file")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=VALUE",
+                        help="Value for a query parameter (repeatable; default: header example)")
+    parser.add_argument("--columns", help="Comma-separated columns to return (default: all)")
+    parser.add_argument("--output", help="Also write the result to this CSV or Parquet file")
+    parser.add_argument("--refresh", action="store_true", help="Re-run even if cached")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Result cache directory")
+    parser.add_argument("--max-cache-mb", type=int, default=DEFAULT_MAX_CACHE_BYTES // 1024 ** 2,
+                        help="Cache size above which least recently used results are evicted")
+    parser.add_argument("--query-dir", default="queries", help="Directory containing query files")
+    parser.add_argument("--credentials", help="Path to GCP service account JSON (or use GCP_SA_KEY env)")
+
+    args = parser.parse_args()
+
+    try:
+        query_path = resolve_query(args.query, QueryCatalog(args.query_dir))
+    except LookupError as e:
+        parser.error(str(e))
+    with open(query_path) as f:
+        types = {p["name"]: p["type"] for p in parse_parameters(f.read())}
+    params = {}
+    for assignment in args.param:
+        name, _, text = assignment.partition("=")
+        if name not in types:
+            parser.error(f"{query_path} declares no parameter @{name}")
+        params[name] = convert_value(text, types[name])
+
+    runner = QueryTestRunner(args.credentials or os.getenv("GCP_SA_KEY"))
+    start = time.perf_counter()
+    try:
+        table = run_catalog_query(
+            query_path, params, args.columns.split(",") if args.columns else None, runner=runner,
+            query_dir=args.query_dir, cache_dir=args.cache_dir,
+            max_cache_bytes=args.max_cache_mb * 1024 ** 2, refresh=args.refresh,
+        )
+    except Exception as e:
+        print(f"❌ Query failed: {e}")
+        return 1
+    elapsed = time.perf_counter() - start
+
+    if args.output:
+        if args.output.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            pq.write_table(table, args.output)
+        else:
+            import pyarrow.csv as pa_csv
+            pa_csv.write_csv(table, args.output)
+        print(f"✓ {table.num_rows:,} rows -> {args.output} ({elapsed:.1f}s)")
+    else:
+        for row in table.slice(0, 20).to_pylist():
+            print(json.dumps(row, default=str))
+        print(f"\n✓ {table.num_rows:,} rows ({elapsed:.1f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
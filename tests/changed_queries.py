@@ -0,0 +1,116 @@
+"""
+Select queries affected by a git revision range
+
+A query is selected when:
+1. Its own .sql file changed
+2. A file listed in its "-- Depends On:" header changed (shared fragments, lookup files)
+3. A category config file changed (any non-.sql, non-.md file in its category folder)
+4. A test harness input changed (tests/*.py or tests/test_config.yaml) - selects everything
+"""
+
+import subprocess
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from query_catalog import parse_header
+
+
+def git_changed_files(rev_range: str) -> List[Path]:
+    """Return absolute paths of files changed in rev_range (e.g. "origin/main...HEAD")."""
+    repo_root = subprocess.run(
+        ["git", "rev-parse", "--show-toplevel"],
+        capture_output=True, text=True, check=True
+    ).stdout.strip()
+    diff = subprocess.run(
+        ["git", "diff", "--name-only", rev_range],
+        capture_output=True, text=True, check=True, cwd=repo_root
+    ).stdout
+    return [(Path(repo_root) / line).resolve() for line in diff.splitlines() if line.strip()]
+
+
+def git_base_content(rev_range: str, path: str) -> Optional[str]:
+    """
+    Content of path at the base of rev_range, or None if it did not exist there.
+
+    The base of "A...B" is the merge base of A and B (what a pull request is compared
+    with); the base of "A..B" is A.
+    """
+    repo_root = subprocess.run(
+        ["git", "rev-parse", "--show-toplevel"],
+        capture_output=True, text=True, check=True
+    ).stdout.strip()
+    if "..." in rev_range:
+        base = subprocess.run(
+            ["git", "merge-base", *rev_range.split("...", 1)],
+            capture_output=True, text=True, check=True, cwd=repo_root
+        ).stdout.strip()
+    else:
+        base = rev_range.split("..", 1)[0]
+    relative = Path(path).resolve().relative_to(repo_root).as_posix()
+    shown = subprocess.run(
+        ["git", "show", f"{base}:{relative}"], capture_output=True, text=True, cwd=repo_root
+    )
+    return shown.stdout if shown.returncode == 0 else None
+
+
+def extract_dependencies(content: str) -> List[str]:
+    """Extract repo-relative paths from "-- Depends On: a, b" lines in the query header."""
+    return parse_header(content)["depends_on"]
+
+
+def is_harness_input(path: Path, repo_root: Path) -> bool:
+    """Check whether a changed file affects how every query is tested."""
+    try:
+        relative = path.relative_to(repo_root)
+    except ValueError:
+        return False
+    return relative.parts[:1] == ("tests",) and (
+        relative.suffix == ".py" or relative.name == "test_config.yaml"
+    )
+
+
+def select_changed_queries(queries: Dict[str, Dict], changed_files: Iterable[Path],
+                           query_dir: str, repo_root: str = ".") -> Set[str]:
+    """
+    Select the queries affected by a set of changed files.
+
+    Args:
+        queries: Query info dict from QueryTestRunner.load_queries, keyed by path
+        changed_files: Changed file paths
+        query_dir: Query directory the queries were loaded from
+        repo_root: Repository root, used to resolve "Depends On:" paths
+
+    Returns: set of selected query paths (keys of queries)
+    """
+    root = Path(repo_root).resolve()
+    query_root = Path(query_dir).resolve()
+    changed = {Path(p).resolve() for p in changed_files}
+
+    if any(is_harness_input(path, root) for path in changed):
+        return set(queries)
+
+    # Category folders whose config (anything but queries and notes) changed
+    changed_categories = set()
+    for path in changed:
+        if path.suffix in (".sql", ".md"):
+            continue
+        try:
+            relative = path.relative_to(query_root)
+        except ValueError:
+            continue
+        if len(relative.parts) > 1:
+            changed_categories.add(relative.parts[0])
+
+    selected = set()
+    for key, query_info in queries.items():
+        query_path = Path(query_info["path"]).resolve()
+        dependencies = {(root / dep).resolve() for dep in query_info["header"]["depends_on"]}
+        try:
+            folder = query_path.relative_to(query_root).parts[0]
+        except (ValueError, IndexError):
+            folder = None
+
+        if query_path in changed or dependencies & changed or folder in changed_categories:
+            selected.add(key)
+
+    return selected
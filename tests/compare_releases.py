@@ -0,0 +1,265 @@
+"""
+Cross-release performance comparison
+
+Every query reads idc_current, which moves forward with each IDC data
+release, so a query's cost and latency can jump with no change to its SQL.
+ReleaseComparison runs a query against two pinned releases (e.g. idc_v18 and
+idc_current) by substituting only its idc_current tables with the same tables
+of each release. Tables already pinned to a release are left alone.
+
+For each release it records bytes processed, slot time, latency and the full
+row count (queries run without the test LIMIT and with the BigQuery cache
+disabled), next to the size of the tables the query reads, measured with a
+free dry run of SELECT * on each (which also works for views such as
+dicom_all). A query is flagged when its bytes processed grew more than
+tolerance faster than those tables did, i.e. the query got more expensive
+for reasons other than more data.
+"""
+
+import re
+from typing import Dict, List, Optional
+
+from query_params import bind_parameters
+from sql_utils import IDC_TABLE_PATTERN, referenced_tables, rewrite_table_refs
+
+# Datasets a query can be pinned to
+RELEASE_PATTERN = re.compile(r"^idc_(current|v\d+)$")
+
+# The moving alias the queries are written against, and substituted by ReleaseComparison
+CURRENT_DATASET = "idc_current"
+
+
+def release_table_map(content: str, release: str) -> Dict[str, str]:
+    """idc_current table -> the same table in release, for each idc_current table content reads."""
+    table_map = {}
+    for table in referenced_tables(content):
+        match = IDC_TABLE_PATTERN.match(table)
+        if match and match.group(1) == CURRENT_DATASET:
+            table_map[table] = f"bigquery-public-data.{release}.{match.group(2)}"
+    return table_map
+
+
+def growth(new: Optional[float], old: Optional[float]) -> Optional[float]:
+    """new / old, or None if either is unknown or old is zero."""
+    if not new or not old:
+        return None
+    return new / old
+
+
+class ReleaseComparison:
+    def __init__(self, runner, old_release: str, new_release: str, tolerance: float = 0.10):
+        """
+        Args:
+            runner: QueryTestRunner to run queries with (its budget caps and pays for every job)
+            old_release: Dataset of the baseline release, e.g. idc_v18
+            new_release: Dataset of the release compared to it, e.g. idc_current
+            tolerance: How much faster than the data a query's bytes may grow before it is flagged
+
+        Raises: ValueError if a release is not idc_current or idc_vN
+        """
+        for release in (old_release, new_release):
+            if not RELEASE_PATTERN.match(release):
+                raise ValueError(f"Invalid release {release!r}, expected idc_current or idc_vN (e.g. idc_v18)")
+        self.runner = runner
+        self.releases = (old_release, new_release)
+        self.tolerance = tolerance
+        # Table id -> bytes of all its columns (None if the dry run failed, e.g. not in that release)
+        self._table_bytes = {}
+
+    def table_bytes(self, table: str) -> Optional[int]:
+        """Size of all columns of table, from a dry run of SELECT * (free)."""
+        if table not in self._table_bytes:
+            ok, bytes_scanned, _, _ = self.runner.run_dry_run(f"SELECT * FROM `{table}`")
+            self._table_bytes[table] = bytes_scanned if ok else None
+        return self._table_bytes[table]
+
+    def run_release(self, query_info: Dict, release: str) -> Dict:
+        """
+        Dry run, then execute a query with its idc_current tables read from release.
+
+        Returns: dict with status, error, data_bytes (tables read), dry_run_bytes, bytes_scanned,
+        bytes_billed, total_slot_ms, elapsed_ms, row_count and result_fingerprint
+        """
+        table_map = release_table_map(query_info["content"], release)
+        sql = rewrite_table_refs(query_info["content"], table_map)
+        sizes = [self.table_bytes(table) for table in table_map.values()]
+        outcome = {
+            "status": "Pass",
+            "error": "",
+            "data_bytes": sum(sizes) if None not in sizes else None,
+            "dry_run_bytes": None,
+            "bytes_scanned": None,
+            "bytes_billed": None,
+            "total_slot_ms": None,
+            "elapsed_ms": None,
+            "row_count": None,
+            "result_fingerprint": None,
+        }
+
+        parameters = bind_parameters(query_info["header"]["parameters"])
+        dry_run_ok, dry_run_bytes, _, dry_error = self.runner.run_dry_run(sql, parameters)
+        if not dry_run_ok:
+            # Typically a table or column the release does not have
+            outcome["status"] = "Syntax Error"
+            outcome["error"] = dry_error
+            return outcome
+        outcome["dry_run_bytes"] = dry_run_bytes
+
+        maximum_bytes_billed, skip_status = self.runner.reserve_execution(
+            sql, query_info["header"]["complexity"], dry_run_bytes
+        )
+        if skip_status is not None:
+            outcome["status"] = skip_status
+            return outcome
+        exec_ok, row_count, bytes_scanned, _, exec_error, job_stats = self.runner.run_query_with_limit(
+            sql, maximum_bytes_billed=maximum_bytes_billed, query_parameters=parameters,
+            fingerprint=True, use_query_cache=False
+        )
+        if self.runner.budget is not None:
+            self.runner.budget.settle(maximum_bytes_billed, job_stats.get("bytes_billed", 0))
+        if not exec_ok:
+            outcome["status"] = "Execution Error"
+            outcome["error"] = exec_error
+            return outcome
+
+        outcome.update(
+            bytes_scanned=bytes_scanned,
+            bytes_billed=job_stats["bytes_billed"],
+            total_slot_ms=job_stats["total_slot_ms"],
+            elapsed_ms=job_stats["elapsed_ms"] or job_stats["wall_time_ms"],
+            row_count=row_count,
+            result_fingerprint=job_stats["result_fingerprint"]["fingerprint"],
+        )
+        return outcome
+
+    def compare(self, query_info: Dict) -> Dict:
+        """
+        Run a query against both releases.
+
+        Returns: dict with name, category, path, status (Compared, Skipped, Error or
+        Not Release-Dependent), releases (release -> run_release() outcome),
+        data_growth, cost_growth, slot_growth, outgrew_data and identical_results
+        """
+        comparison = {
+            "name": query_info["name"],
+            "category": query_info["category"],
+            "path": query_info["path"],
+            "status": "Compared",
+            "releases": {},
+            "data_growth": None,
+            "cost_growth": None,
+            "slot_growth": None,
+            "outgrew_data": False,
+            "identical_results": None,
+        }
+        if not release_table_map(query_info["content"], self.releases[0]):
+            comparison["status"] = "Not Release-Dependent"
+            return comparison
+
+        for release in self.releases:
+            comparison["releases"][release] = self.run_release(query_info, release)
+        old, new = (comparison["releases"][release] for release in self.releases)
+        statuses = {old["status"], new["status"]} - {"Pass"}
+        if statuses:
+            # A tier cap or budget skip (reserve_execution) is deliberate, not a failure
+            skipped = all(status.startswith("Skipped") for status in statuses)
+            comparison["status"] = "Skipped" if skipped else "Error"
+            return comparison
+
+        comparison["data_growth"] = growth(new["data_bytes"], old["data_bytes"])
+        comparison["cost_growth"] = growth(new["bytes_scanned"], old["bytes_scanned"])
+        comparison["slot_growth"] = growth(new["total_slot_ms"], old["total_slot_ms"])
+        if comparison["data_growth"] is not None and comparison["cost_growth"] is not None:
+            comparison["outgrew_data"] = comparison["cost_growth"] > comparison["data_growth"] * (1 + self.tolerance)
+        comparison["identical_results"] = old["result_fingerprint"] == new["result_fingerprint"]
+        return comparison
+
+    def compare_all(self, query_infos: List[Dict]) -> List[Dict]:
+        """Compare every query, in the given order."""
+        comparisons = []
+        for i, query_info in enumerate(query_infos, 1):
+            print(f"  [{i}/{len(query_infos)}] Comparing {query_info['name']}...", end=" ")
+            comparison = self.compare(query_info)
+            comparisons.append(comparison)
+            flag = " (cost grew faster than data)" if comparison["outgrew_data"] else ""
+            print(f"[{comparison['status']}]{flag}")
+        return comparisons
+
+    def generate_report(self, comparisons: List[Dict], resolved_versions: Optional[Dict[str, str]] = None) -> str:
+        """
+        Generate markdown side-by-side report of a comparison.
+
+        Args:
+            comparisons: compare_all() results
+            resolved_versions: Release -> IDC version it pointed to (e.g. idc_current -> "22")
+        """
+        old_release, new_release = self.releases
+        format_bytes = self.runner.format_bytes
+        format_duration = self.runner.format_duration
+        labels = {
+            release: f"{release} (v{resolved_versions[release]})"
+            if resolved_versions and resolved_versions.get(release) else release
+            for release in self.releases
+        }
+
+        def ratio(value: Optional[float]) -> str:
+            return f"{value:.2f}x" if value is not None else "N/A"
+
+        def pair(old: Dict, new: Dict, key: str, fmt) -> str:
+            return f"{fmt(old[key]) if old[key] is not None else 'N/A'} → {fmt(new[key]) if new[key] is not None else 'N/A'}"
+
+        compared = [c for c in comparisons if c["status"] == "Compared"]
+        outgrew = [c for c in compared if c["outgrew_data"]]
+        lines = [
+            "# Release Comparison",
+            f"\n**Generated:** {self.runner.run_started.isoformat()}",
+            f"**Releases:** {labels[old_release]} → {labels[new_release]}",
+            f"**Compared:** {len(compared)} | "
+            f"**Skipped:** {sum(1 for c in comparisons if c['status'] == 'Skipped')} | "
+            f"**Errors:** {sum(1 for c in comparisons if c['status'] == 'Error')} | "
+            f"**Not Release-Dependent:** {sum(1 for c in comparisons if c['status'] == 'Not Release-Dependent')}",
+            f"**Cost Grew Faster Than Data:** {len(outgrew)} (tolerance {self.tolerance * 100:.0f}%)",
+            "\n## Results by Query\n",
+            "| Query | Category | Bytes | Data Growth | Cost Growth | Slot Time | Latency | Rows | Identical Results |",
+            "|-------|----------|-------|-------------|-------------|-----------|---------|------|-------------------|",
+        ]
+        for c in sorted(compared, key=lambda x: (x["category"], x["name"])):
+            old, new = (c["releases"][release] for release in self.releases)
+            cost = ratio(c["cost_growth"]) + (" ⚠" if c["outgrew_data"] else "")
+            lines.append(
+                f"| {c['name']} | {c['category']} | {pair(old, new, 'bytes_scanned', format_bytes)} | "
+                f"{ratio(c['data_growth'])} | {cost} | {pair(old, new, 'total_slot_ms', format_duration)} | "
+                f"{pair(old, new, 'elapsed_ms', format_duration)} | {pair(old, new, 'row_count', str)} | "
+                f"{'✓' if c['identical_results'] else 'Changed'} |"
+            )
+
+        if outgrew:
+            lines.extend([
+                "\n## Cost Grew Faster Than Data\n",
+                "Bytes processed grew by more than the tables the query reads, beyond the tolerance.\n",
+                "| Query | Data Growth | Cost Growth | Slot Time Growth |",
+                "|-------|-------------|-------------|------------------|",
+            ])
+            for c in sorted(outgrew, key=lambda x: x["cost_growth"] / x["data_growth"], reverse=True):
+                lines.append(
+                    f"| {c['name']} | {ratio(c['data_growth'])} | {ratio(c['cost_growth'])} | "
+                    f"{ratio(c['slot_growth'])} |"
+                )
+
+        skipped = [c for c in comparisons if c["status"] == "Skipped"]
+        if skipped:
+            lines.extend(["\n## Skipped\n", "| Query | Release | Status |", "|-------|---------|--------|"])
+            for c in sorted(skipped, key=lambda x: (x["category"], x["name"])):
+                for release, outcome in c["releases"].items():
+                    if outcome["status"] != "Pass":
+                        lines.append(f"| {c['name']} | {release} | {outcome['status']} |")
+
+        errors = [c for c in comparisons if c["status"] == "Error"]
+        if errors:
+            lines.extend(["\n## Errors\n", "| Query | Release | Status | Error |", "|-------|---------|--------|-------|"])
+            for c in sorted(errors, key=lambda x: (x["category"], x["name"])):
+                for release, outcome in c["releases"].items():
+                    if outcome["status"] != "Pass":
+                        error = outcome["error"][:80].replace("|", "/").replace("\n", " ")
+                        lines.append(f"| {c['name']} | {release} | {outcome['status']} | {error} |")
+        return "\n".join(lines)
@@ -0,0 +1,77 @@
+"""
+Cost budget for a regression test run
+
+Tracks spend against an optional per-run dollar budget and per-complexity-tier
+caps (see docs/COMPLEXITY_GRADING.md), and derives the maximum_bytes_billed
+guardrail for each execution job from its dry-run bytes. Reservations are
+thread-safe so concurrent jobs cannot jointly overspend.
+"""
+
+import threading
+from typing import Dict, Optional
+
+# BigQuery on-demand pricing, USD per TiB
+PRICE_PER_TB = 6.25
+
+# BigQuery bills at least 10 MB per table referenced, rounded up to the next MB
+MIN_BILLED_BYTES_PER_TABLE = 10 * 1024 ** 2
+BILLING_ROUNDING_BYTES = 1024 ** 2
+
+
+class CostBudget:
+    def __init__(self, total_usd: Optional[float] = None, tier_caps_usd: Optional[Dict[str, float]] = None,
+                 bytes_billed_margin: float = 0.10):
+        """
+        Args:
+            total_usd: Maximum spend for the whole run (None = unlimited)
+            tier_caps_usd: Maximum cost of a single query per complexity tier, e.g. {"Low": 0.10}
+            bytes_billed_margin: Headroom over dry-run bytes allowed by maximum_bytes_billed
+        """
+        self.total_usd = total_usd
+        self.tier_caps_usd = tier_caps_usd or {}
+        self.bytes_billed_margin = bytes_billed_margin
+        self.spent_usd = 0.0
+        self.reserved_usd = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def schedules(self) -> bool:
+        """Whether the budget constrains which queries run (and so needs cheapest-first scheduling)."""
+        return self.total_usd is not None or bool(self.tier_caps_usd)
+
+    @staticmethod
+    def cost_usd(bytes_billed: int) -> float:
+        return (bytes_billed / (1024 ** 4)) * PRICE_PER_TB
+
+    def max_bytes_billed(self, dry_run_bytes: int, table_count: int = 1) -> int:
+        """maximum_bytes_billed for a job: dry-run bytes plus margin, never below the billing minimum."""
+        minimum = MIN_BILLED_BYTES_PER_TABLE * max(table_count, 1)
+        return max(int(dry_run_bytes * (1 + self.bytes_billed_margin)), minimum) + BILLING_ROUNDING_BYTES
+
+    def check_tier_cap(self, complexity: str, dry_run_bytes: int) -> Optional[str]:
+        """Return a skip status if a query's dry-run cost exceeds its tier cap, else None."""
+        tier = complexity.split()[0] if complexity else ""
+        cap = self.tier_caps_usd.get(tier)
+        if cap is not None and self.cost_usd(dry_run_bytes) > cap:
+            return "Skipped (Tier Cap)"
+        return None
+
+    def reserve(self, max_bytes_billed: int) -> bool:
+        """Reserve a job's worst-case cost; False if that would exceed the run budget."""
+        cost = self.cost_usd(max_bytes_billed)
+        with self._lock:
+            if self.total_usd is not None and self.spent_usd + self.reserved_usd + cost > self.total_usd:
+                return False
+            self.reserved_usd += cost
+            return True
+
+    def charge(self, bytes_billed: int) -> None:
+        """Record spend that was not reserved up front (e.g. shared-scan materialization)."""
+        with self._lock:
+            self.spent_usd += self.cost_usd(bytes_billed)
+
+    def settle(self, max_bytes_billed: int, bytes_billed: int) -> None:
+        """Replace a job's reservation with what it was actually billed."""
+        with self._lock:
+            self.reserved_usd -= self.cost_usd(max_bytes_billed)
+            self.spent_usd += self.cost_usd(bytes_billed)
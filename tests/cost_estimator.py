@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Static column-level cost estimator
+
+Estimates the bytes a query scans without a dry run, by resolving which
+columns of each referenced IDC table it mentions and summing their storage
+sizes from a column size catalog.
+
+The catalog (tests/column_sizes.json) is built once per IDC release: each
+top-level column's size is measured with a free dry run of
+SELECT `column` FROM `table`. Estimates are an upper bound, since any
+identifier that matches a column name counts as a reference and nested
+fields are charged as their whole top-level column.
+"""
+
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from sql_utils import CODE, IDC_TABLE_PATTERN, IDENTIFIER, masked_code, paren_depths, referenced_tables, scan_sql
+
+DEFAULT_CATALOG_PATH = "tests/column_sizes.json"
+
+# SELECT * / SELECT alias.* / SELECT * EXCEPT (a, b), up to the FROM that follows and what it reads
+SELECT_STAR_PATTERN = re.compile(
+    r"\bSELECT\s+(?:DISTINCT\s+)?(?:\w+\.)?\*\s*(?:EXCEPT\s*\(([^)]*)\))?(?:(?!\bSELECT\b)[^;])*?"
+    r"\bFROM\s*(`[^`]+`|\w+)",
+    re.IGNORECASE | re.DOTALL,
+)
+STAR_SELECT_START = re.compile(r"SELECT\s+(?:DISTINCT\s+)?(?:\w+\.)?\*", re.IGNORECASE)
+
+
+class ColumnSizeCatalog:
+    def __init__(self, idc_version: Optional[str] = None, tables: Optional[Dict[str, Dict[str, int]]] = None):
+        """
+        Args:
+            idc_version: IDC release the sizes were measured on
+            tables: Fully qualified table -> {column name: bytes}
+        """
+        self.idc_version = idc_version
+        self.tables = tables or {}
+        # Lowercase column name -> canonical name, per table (BigQuery names are case-insensitive)
+        self._lookup = {
+            table: {column.lower(): column for column in columns}
+            for table, columns in self.tables.items()
+        }
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_CATALOG_PATH) -> "ColumnSizeCatalog":
+        """Load catalog from JSON, returning an empty catalog if the file is missing."""
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data.get("idc_version"), data.get("tables", {}))
+
+    def save(self, path: str = DEFAULT_CATALOG_PATH) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"idc_version": self.idc_version, "tables": self.tables}, f, indent=1, sort_keys=True)
+
+    def columns(self, table: str) -> Dict[str, int]:
+        return self.tables.get(table, {})
+
+    def resolve_column(self, table: str, name: str) -> Optional[str]:
+        """Canonical column name in table matching name case-insensitively, or None."""
+        return self._lookup.get(table, {}).get(name.lower())
+
+    def table_bytes(self, table: str) -> int:
+        return sum(self.columns(table).values())
+
+
+def measure_column_sizes(runner, tables: Iterable[str], concurrency: int = 8) -> Dict[str, Dict[str, int]]:
+    """
+    Measure per-column bytes of each table with dry runs (free).
+
+    Args:
+        runner: QueryTestRunner whose client and backoff are used
+        tables: Fully qualified tables to measure
+        concurrency: Dry runs in flight at once
+
+    Returns: table -> {column: bytes}
+    """
+    def measure(table: str, column: str) -> Tuple[str, str, int]:
+        ok, bytes_scanned, _, error = runner.run_dry_run(f"SELECT `{column}` FROM `{table}`")
+        if not ok:
+            print(f"  WARNING: could not measure {table}.{column}: {error[:80]}")
+        return table, column, bytes_scanned or 0
+
+    jobs = []
+    for table in sorted(set(tables)):
+        columns = [field.name for field in runner.client.get_table(table).schema]
+        print(f"  Measuring {len(columns)} columns of {table}")
+        jobs.extend((table, column) for column in columns)
+
+    sizes = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for table, column, size in executor.map(lambda job: measure(*job), jobs):
+            sizes.setdefault(table, {})[column] = size
+    return sizes
+
+
+def identifiers(sql: str) -> Set[str]:
+    """Lowercased identifiers used in SQL code (keywords included; they never match column names)."""
+    names = set()
+    for kind, text in scan_sql(sql):
+        if kind == CODE:
+            names.update(word.lower() for word in re.findall(r"[A-Za-z_][A-Za-z0-9_]*", text))
+        elif kind == IDENTIFIER:
+            names.update(part.lower() for part in text.strip("`").split("."))
+    return names
+
+
+def star_reaches_output(code: str, depths: List[int], position: int,
+                        star_selects: Dict[str, List[int]], seen: FrozenSet[str] = frozenset()) -> bool:
+    """
+    Whether the star SELECT starting at position passes all its columns to the query's final result.
+
+    BigQuery prunes the columns of a CTE or subquery that nothing outside it uses, so a
+    star only costs full width if every SELECT it feeds, up to the top level, is a star too.
+
+    Args:
+        code: Masked query code (see masked_code)
+        depths: paren_depths(code)
+        position: Offset of the SELECT
+        star_selects: Lowercased source name (CTE or table) -> offsets of star SELECTs reading it
+        seen: CTEs already followed, to stop on recursive definitions
+    """
+    depth = depths[position]
+    if depth <= 0:
+        return True
+    open_paren = next(i for i in range(position - 1, -1, -1) if code[i] == "(" and depths[i] == depth - 1)
+    before = code[:open_paren]
+    cte = re.search(r"\b(\w+)\s+AS\s*$", before, re.IGNORECASE)
+    if cte:
+        name = cte.group(1).lower()
+        return name not in seen and any(
+            star_reaches_output(code, depths, reader, star_selects, seen | {name})
+            for reader in star_selects.get(name, [])
+        )
+    if re.search(r"\b(FROM|JOIN)\s*$", before, re.IGNORECASE):
+        # A derived table reaches the output only through a star SELECT reading it
+        outer = [m.start() for m in re.finditer(r"\bSELECT\b", before, re.IGNORECASE) if depths[m.start()] == depth - 1]
+        return bool(outer) and bool(STAR_SELECT_START.match(code, outer[-1])) and star_reaches_output(
+            code, depths, outer[-1], star_selects, seen
+        )
+    # IN / EXISTS / scalar subqueries output at most one column
+    return False
+
+
+def star_selected_tables(sql: str) -> Dict[str, Set[str]]:
+    """
+    Find IDC tables whose every column reaches the final result through SELECT * / SELECT * EXCEPT (...).
+
+    A star inside a CTE or subquery whose columns an outer SELECT picks from is not
+    counted, since BigQuery only scans the columns that are used.
+
+    Returns: table -> lowercased names of EXCEPTed columns
+    """
+    code = masked_code(sql)
+    depths = paren_depths(code)
+    matches = list(SELECT_STAR_PATTERN.finditer(code))
+    star_selects = {}
+    for match in matches:
+        star_selects.setdefault(match.group(2).strip("`").lower(), []).append(match.start())
+
+    starred = {}
+    for match in matches:
+        table = match.group(2).strip("`")
+        if IDC_TABLE_PATTERN.match(table) and star_reaches_output(code, depths, match.start(), star_selects):
+            excepted = {c.strip().lower() for c in (match.group(1) or "").split(",") if c.strip()}
+            starred[table] = starred.get(table, excepted) & excepted
+    return starred
+
+
+def estimate_query_bytes(sql: str, catalog: ColumnSizeCatalog) -> Dict:
+    """
+    Estimate bytes scanned by a query from the column size catalog.
+
+    Returns: dict with
+        bytes: estimated bytes scanned (upper bound)
+        columns: table -> sorted list of referenced columns
+        unknown_tables: referenced tables missing from the catalog (estimate is incomplete)
+    """
+    names = identifiers(sql)
+    starred = star_selected_tables(sql)
+    estimate = {"bytes": 0, "columns": {}, "unknown_tables": []}
+
+    for table in referenced_tables(sql):
+        columns = catalog.columns(table)
+        if not columns:
+            estimate["unknown_tables"].append(table)
+            continue
+
+        if table in starred:
+            used = [c for c in columns if c.lower() not in starred[table]]
+        else:
+            used = [c for c in columns if c.lower() in names]
+
+        estimate["columns"][table] = sorted(used)
+        estimate["bytes"] += sum(columns[c] for c in used)
+
+    return estimate
+
+
+def main():
+    import argparse
+
+    from run_regression_tests import QueryTestRunner
+    from update_query_headers import QueryHeaderUpdater
+
+    parser = argparse.ArgumentParser(description="Estimate query bytes from per-column storage sizes")
+    parser.add_argument("--query-dir", default="queries", help="Directory containing query files")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG_PATH, help="Column size catalog JSON")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Re-measure column sizes with BigQuery dry runs (once per IDC release)")
+    parser.add_argument("--if-stale", action="store_true",
+                        help="With --refresh, only re-measure if the catalog is from another IDC release "
+                             "or lacks a table the queries read")
+    parser.add_argument("--credentials", help="Path to GCP service account JSON (or use GCP_SA_KEY env)")
+    parser.add_argument("--update-headers", action="store_true",
+                        help="Fill Estimated Cost / Bytes Scanned headers that are still TBD")
+
+    args = parser.parse_args()
+
+    catalog = ColumnSizeCatalog.load(args.catalog)
+
+    if args.refresh:
+        runner = QueryTestRunner(args.credentials or os.getenv("GCP_SA_KEY"))
+        queries = runner.load_queries(args.query_dir)
+        tables = set()
+        for query_info in queries.values():
+            tables.update(referenced_tables(query_info["content"]))
+        idc_version = runner.resolve_idc_version()
+        if args.if_stale and catalog.idc_version == idc_version and tables <= set(catalog.tables):
+            print(f"✓ Column size catalog {args.catalog} is current (IDC release {idc_version})")
+        else:
+            print(f"Measuring column sizes for IDC release {idc_version}...")
+            catalog = ColumnSizeCatalog(idc_version, measure_column_sizes(runner, tables))
+            catalog.save(args.catalog)
+            print(f"✓ Wrote column size catalog to {args.catalog}")
+
+    if not catalog.tables:
+        print(f"ERROR: Column size catalog {args.catalog} is empty; run with --refresh")
+        return 1
+
+    updater = QueryHeaderUpdater()
+    print(f"\nEstimates from IDC release {catalog.idc_version} column sizes:")
+    for sql_file in sorted(Path(args.query_dir).rglob("*.sql")):
+        content = sql_file.read_text()
+        estimate = estimate_query_bytes(content, catalog)
+        note = f" (incomplete: {', '.join(estimate['unknown_tables'])})" if estimate["unknown_tables"] else ""
+        print(f"  {sql_file.stem}: {updater.format_bytes(estimate['bytes'])}{note}")
+
+        if args.update_headers and not estimate["unknown_tables"]:
+            was_updated, message = updater.fill_estimate(str(sql_file), estimate["bytes"])
+            if was_updated:
+                print(f"    ✓ {message}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Stream the results of a catalog query to Parquet or Arrow IPC files
+
+Results are read as Arrow record batches, one page at a time (through the
+BigQuery Storage Read API when google-cloud-bigquery-storage is installed),
+and written out as they arrive, so memory use is bounded by a row group
+rather than by the size of the result. Use this instead of to_dataframe()
+for results of millions of rows, e.g. for slide-level downstream pipelines.
+
+Usage:
+    python tests/export_query_results.py slide_base_level_dcm_objects --output slides.parquet
+    python tests/export_query_results.py queries/image_series/images_multiple_slices_per_position.sql \\
+        --output images.arrow --format arrow --columns SeriesInstanceUID,collection_id
+"""
+
+import os
+import re
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from query_catalog import QueryCatalog, make_job_config
+from query_params import bind_parameters, convert_value, parse_parameters
+from sql_utils import masked_code, paren_depths
+
+# Rows per Parquet row group (and per record batch in Arrow IPC files)
+DEFAULT_ROW_GROUP_SIZE = 100000
+
+FORMATS = ("parquet", "arrow")
+
+# BigQuery column type -> pyarrow type factory, for the schema of empty results
+ARROW_TYPES = {
+    "STRING": lambda pa: pa.string(),
+    "BYTES": lambda pa: pa.binary(),
+    "INTEGER": lambda pa: pa.int64(),
+    "INT64": lambda pa: pa.int64(),
+    "FLOAT": lambda pa: pa.float64(),
+    "FLOAT64": lambda pa: pa.float64(),
+    "NUMERIC": lambda pa: pa.decimal128(38, 9),
+    "BIGNUMERIC": lambda pa: pa.decimal256(76, 38),
+    "BOOLEAN": lambda pa: pa.bool_(),
+    "BOOL": lambda pa: pa.bool_(),
+    "TIMESTAMP": lambda pa: pa.timestamp("us", tz="UTC"),
+    "DATETIME": lambda pa: pa.timestamp("us"),
+    "DATE": lambda pa: pa.date32(),
+    "TIME": lambda pa: pa.time64("us"),
+}
+
+
+def resolve_query(query: str, catalog: QueryCatalog) -> str:
+    """
+    Path of a query given as a file path or a query name.
+
+    Raises: LookupError if no query matches, or a name matches several
+    """
+    if os.path.exists(query):
+        return query
+    matches = [entry["path"] for entry in catalog.entries.values() if entry["name"] == query]
+    if not matches:
+        raise LookupError(f"No query named {query} in {catalog.query_dir}")
+    if len(matches) > 1:
+        raise LookupError(f"Query name {query} is ambiguous: {', '.join(matches)}")
+    return matches[0]
+
+
+def select_columns(sql: str, columns: List[str]) -> str:
+    """
+    Wrap a query so it outputs only the given columns; BigQuery prunes the rest from the scan.
+
+    In a script (e.g. CREATE TEMP FUNCTION ...; SELECT ...), only the final statement is
+    wrapped and the statements before it are kept as they are.
+
+    Raises: ValueError if the final statement is not a query
+    """
+    code = masked_code(sql)
+    depths = paren_depths(code)
+    # Statement terminators; the last one may only be followed by whitespace and comments
+    ends = [i for i, char in enumerate(code) if char == ";" and depths[i] == 0]
+    if ends and not code[ends[-1] + 1:].strip():
+        sql, code = sql[:ends[-1]] + sql[ends[-1] + 1:], code[:ends[-1]] + code[ends[-1] + 1:]
+        ends.pop()
+    split = ends[-1] + 1 if ends else 0
+    leading, body = sql[:split], sql[split:]
+    if not re.match(r"\s*(SELECT|WITH|\()", code[split:], re.IGNORECASE):
+        raise ValueError("--columns needs the query to end in a SELECT statement")
+    column_list = ", ".join(f"`{column}`" for column in columns)
+    return f"{leading}\nSELECT {column_list} FROM (\n{body.strip()}\n)".lstrip("\n")
+
+
+def arrow_field(field):
+    """pyarrow field for a BigQuery SchemaField (types without an Arrow equivalent become strings)."""
+    import pyarrow as pa
+
+    if field.field_type in ("RECORD", "STRUCT"):
+        arrow_type = pa.struct([arrow_field(subfield) for subfield in field.fields])
+    else:
+        arrow_type = ARROW_TYPES.get(field.field_type, lambda pa: pa.string())(pa)
+    if field.mode == "REPEATED":
+        arrow_type = pa.list_(arrow_type)
+    return pa.field(field.name, arrow_type)
+
+
+def arrow_batches(rows, batch_size: int = DEFAULT_ROW_GROUP_SIZE, bqstorage_client=None) -> Iterator:
+    """
+    Yield the rows of a query result as pyarrow RecordBatches, fetching one page at a time.
+
+    Args:
+        rows: RowIterator from QueryJob.result() (or any iterable of dict rows)
+        batch_size: Rows per batch for iterables without native Arrow support
+        bqstorage_client: Optional BigQuery Storage Read API client
+
+    An empty result yields one empty batch with the result schema, if rows has one.
+    """
+    import pyarrow as pa
+
+    if hasattr(rows, "to_arrow_iterable"):
+        empty = True
+        for batch in rows.to_arrow_iterable(bqstorage_client=bqstorage_client):
+            empty = False
+            yield batch
+        if empty and getattr(rows, "schema", None):
+            yield pa.RecordBatch.from_pylist([], schema=pa.schema([arrow_field(f) for f in rows.schema]))
+        return
+
+    schema = None
+    chunk = []
+    for row in rows:
+        chunk.append(dict(row.items()) if hasattr(row, "items") else dict(row))
+        if len(chunk) == batch_size:
+            batch = pa.RecordBatch.from_pylist(chunk, schema=schema)
+            schema = batch.schema
+            yield batch
+            chunk = []
+    if chunk:
+        yield pa.RecordBatch.from_pylist(chunk, schema=schema)
+
+
+class StreamingExporter:
+    def __init__(self, path: str, format: str = "parquet", row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+                 compression: Optional[str] = "zstd"):
+        """
+        Initialize streaming writer. The file is opened on the first batch, when the schema is known.
+
+        Args:
+            path: Output file
+            format: "parquet" or "arrow" (Arrow IPC file)
+            row_group_size: Rows buffered per Parquet row group / Arrow record batch
+            compression: Codec for Parquet pages or Arrow IPC buffers (None = uncompressed)
+        """
+        if format not in FORMATS:
+            raise ValueError(f"Unknown export format {format}, expected one of {', '.join(FORMATS)}")
+        self.path = path
+        self.format = format
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.row_count = 0
+        self.row_groups = 0
+        self._writer = None
+        self._schema = None
+        self._buffer = []
+        self._buffered_rows = 0
+
+    def open(self, schema) -> None:
+        import pyarrow as pa
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._schema = schema
+        if self.format == "parquet":
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(self.path, schema, compression=self.compression or "none")
+        else:
+            options = pa.ipc.IpcWriteOptions(compression=self.compression)
+            self._writer = pa.ipc.new_file(self.path, schema, options=options)
+
+    def write_batch(self, batch) -> None:
+        """Buffer a RecordBatch, writing out each full row group."""
+        if self._writer is None:
+            self.open(batch.schema)
+        self._buffer.append(batch)
+        self._buffered_rows += batch.num_rows
+        while self._buffered_rows >= self.row_group_size:
+            self.flush(self.row_group_size)
+
+    def flush(self, rows: Optional[int] = None) -> None:
+        """Write the first `rows` buffered rows (default: all) as one row group."""
+        import pyarrow as pa
+
+        if not self._buffered_rows:
+            return
+        table = pa.Table.from_batches(self._buffer).cast(self._schema)
+        rows = min(rows or self._buffered_rows, self._buffered_rows)
+        group, rest = table.slice(0, rows), table.slice(rows)
+        if self.format == "parquet":
+            self._writer.write_table(group, row_group_size=rows)
+        else:
+            self._writer.write_table(group.combine_chunks())
+        self.row_count += rows
+        self.row_groups += 1
+        self._buffer = rest.to_batches()
+        self._buffered_rows = rest.num_rows
+
+    @property
+    def schema(self):
+        """Schema of the file, or None if no batch (not even an empty one) was written."""
+        return self._schema
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self.flush()
+            self._writer.close()
+            self._writer = None
+
+    def write(self, batches: Iterable) -> int:
+        """Write all batches and close the file. Returns: number of rows written."""
+        try:
+            for batch in batches:
+                self.write_batch(batch)
+        finally:
+            self.close()
+        return self.row_count
+
+
+def main():
+    import argparse
+
+    from result_fingerprint import make_bqstorage_client
+    from run_regression_tests import QueryTestRunner
+
+    parser = argparse.ArgumentParser(description="Stream the results of a catalog query to Parquet or Arrow IPC")
+    parser.add_argument("query", help="Query name (e.g. slide_base_level_dcm_objects) or path to a .sql file")
+    parser.add_argument("--output", required=True, help="Output file")
+    parser.add_argument("--format", choices=FORMATS, help="Output format (default: from --output extension)")
+    parser.add_argument("--columns", help="Comma-separated columns to export (default: all)")
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE,
+                        help="Rows per Parquet row group / Arrow record batch")
+    parser.add_argument("--compression", default="zstd", help="Compression codec, or 'none'")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=VALUE",
+                        help="Value for a query parameter (repeatable; default: header example)")
+    parser.add_argument("--max-bytes-billed", type=int, help="Fail the job instead of billing more than this")
+    parser.add_argument("--query-dir", default="queries", help="Directory containing query files")
+    parser.add_argument("--credentials", help="Path to GCP service account JSON (or use GCP_SA_KEY env)")
+    parser.add_argument("--backend", choices=["bigquery", "local"], default="bigquery",
+                        help="Run on BigQuery or offline on Parquet fixtures")
+    parser.add_argument("--fixtures-dir", default="tests/fixtures",
+                        help="Parquet fixtures for the local backend (<dataset>/<table>.parquet)")
+
+    args = parser.parse_args()
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print("ERROR: export requires pyarrow (pip install pyarrow)")
+        return 1
+
+    output_format = args.format or ("arrow" if re.search(r"\.(arrow|feather|ipc)$", args.output) else "parquet")
+    compression = None if args.compression == "none" else args.compression
+
+    try:
+        query_path = resolve_query(args.query, QueryCatalog(args.query_dir))
+    except LookupError as e:
+        parser.error(str(e))
+    with open(query_path) as f:
+        content = f.read()
+
+    declared = parse_parameters(content)
+    types = {p["name"]: p["type"] for p in declared}
+    values: Dict = {}
+    for assignment in args.param:
+        name, _, text = assignment.partition("=")
+        if name not in types:
+            parser.error(f"{query_path} declares no parameter @{name}")
+        values[name] = convert_value(text, types[name])
+
+    try:
+        sql = select_columns(content, args.columns.split(",")) if args.columns else content
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.backend == "local":
+        from local_engine import LocalClient
+        runner = QueryTestRunner(client=LocalClient(args.fixtures_dir))
+        bqstorage_client = None
+    else:
+        runner = QueryTestRunner(args.credentials or os.getenv("GCP_SA_KEY"))
+        bqstorage_client = make_bqstorage_client(getattr(runner.client, "_credentials", None))
+
+    job_config = make_job_config(
+        query_parameters=bind_parameters(declared, values),
+        maximum_bytes_billed=args.max_bytes_billed,
+    )
+    print(f"Exporting {query_path} -> {args.output} ({output_format}"
+          + (", via the BigQuery Storage Read API" if bqstorage_client is not None else "") + ")")
+
+    def run():
+        job = runner.client.query(sql, job_config=job_config)
+        return job, job.result(page_size=args.row_group_size)
+
+    try:
+        job, rows = runner.call_with_backoff(run)
+        exporter = StreamingExporter(args.output, output_format, args.row_group_size, compression)
+        row_count = exporter.write(arrow_batches(rows, args.row_group_size, bqstorage_client))
+    except Exception as e:
+        print(f"❌ Export failed: {e}")
+        return 1
+
+    if not row_count:
+        if exporter.schema is not None:
+            print(f"⚠ Query returned no rows; wrote a schema-only file to {args.output}")
+        else:
+            print("⚠ Query returned no rows; no file written")
+        return 0
+    bytes_processed = getattr(job, "total_bytes_processed", None) or 0
+    print(f"✓ Wrote {row_count:,} rows in {exporter.row_groups} row group(s) to {args.output} "
+          f"({bytes_processed / 1e9:.2f} GB processed)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
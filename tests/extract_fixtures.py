@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Extract Parquet fixtures of the IDC tables for the local test backend.
+
+For every IDC table referenced by the queries, writes a small deterministic
+sample (same row selection as --sample mode) to
+<fixtures_dir>/<dataset>/<table>.parquet, keeping only the columns the queries
+use. The sample predicate does not prune the scan, so every extract is billed
+like a test query: capped by its dry run and charged to --budget-usd.
+Requires BigQuery access and pyarrow; run once per IDC release, then use
+run_regression_tests.py --backend local.
+"""
+
+import os
+import sys
+from pathlib import Path
+from typing import Iterable, List
+
+from cost_budget import CostBudget
+from cost_estimator import identifiers, star_selected_tables
+from export_query_results import StreamingExporter, arrow_batches
+from query_catalog import make_job_config
+from run_regression_tests import QueryTestRunner
+from sample_tables import SampleBuilder
+from sql_utils import IDC_TABLE_PATTERN, referenced_tables
+
+# Small tables always extracted so the local backend can resolve the IDC release
+ALWAYS_EXTRACT = ["bigquery-public-data.idc_current.version_metadata"]
+
+
+def fixture_columns(contents: Iterable[str], table: str, columns: List[str]) -> List[str]:
+    """
+    Columns of table the queries use: every column if one selects * from it into its
+    result, else the columns they mention (all of them if no query reads the table).
+    """
+    names = set()
+    for content in contents:
+        if table not in referenced_tables(content):
+            continue
+        if table in star_selected_tables(content):
+            return columns
+        names |= identifiers(content)
+    return [column for column in columns if column.lower() in names] or columns
+
+
+def extract_fixtures(runner: QueryTestRunner, tables: Iterable[str], fixtures_dir: str,
+                     builder: SampleBuilder, max_rows: int, contents: Iterable[str] = ()) -> List[Path]:
+    """
+    Write a sampled Parquet extract of each table and return the files written.
+
+    A hash predicate and LIMIT do not prune the scan, so each extract is dry run first,
+    capped with maximum_bytes_billed and reserved in runner.budget like a test query.
+    Only the columns the queries (contents) use are extracted.
+    """
+    contents = list(contents)
+    written = []
+    for table in sorted(set(tables)):
+        dataset_name, table_name = IDC_TABLE_PATTERN.match(table).groups()
+        columns = [field.name for field in runner.client.get_table(table).schema]
+        predicate = builder.sample_predicate(columns)
+        where = f"WHERE {predicate} " if predicate else ""
+        column_list = ", ".join(f"`{column}`" for column in fixture_columns(contents, table, columns))
+        query = f"SELECT {column_list} FROM `{table}` {where}LIMIT {max_rows}"
+
+        dry_run_ok, dry_run_bytes, _, dry_error = runner.run_dry_run(query)
+        if not dry_run_ok:
+            print(f"    WARNING: {table} could not be extracted: {dry_error[:100]}")
+            continue
+        maximum_bytes_billed, skip_status = runner.reserve_execution(query, "", dry_run_bytes)
+        if skip_status is not None:
+            print(f"    WARNING: {table} not extracted: {skip_status} "
+                  f"({runner.format_bytes(dry_run_bytes)} would be scanned)")
+            continue
+
+        print(f"  Extracting {table} ({'sampled' if predicate else 'first rows'}, "
+              f"{runner.format_bytes(dry_run_bytes)} scanned)...")
+        output = Path(fixtures_dir) / dataset_name / f"{table_name}.parquet"
+        job = None
+        try:
+            job_config = make_job_config(maximum_bytes_billed=maximum_bytes_billed)
+            job = runner.call_with_backoff(runner.client.query, query, job_config=job_config)
+            row_count = StreamingExporter(str(output)).write(arrow_batches(job.result()))
+        except Exception as e:
+            print(f"    WARNING: {table} could not be extracted: {str(e)[:100]}")
+            continue
+        finally:
+            if runner.budget is not None:
+                # A failed job is billed nothing, including one stopped by maximum_bytes_billed
+                billed = (getattr(job, "total_bytes_billed", None) or 0) if job is not None else 0
+                runner.budget.settle(maximum_bytes_billed, billed)
+        if not row_count:
+            # The exporter still writes the schema; an empty fixture would hide the missing sample
+            output.unlink(missing_ok=True)
+            print(f"    WARNING: {table} returned no rows; no fixture written")
+            continue
+        written.append(output)
+        print(f"    {row_count} rows -> {output}")
+
+    return written
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Extract Parquet fixtures for the local test backend")
+    parser.add_argument("--query-dir", default="queries", help="Directory containing query files")
+    parser.add_argument("--fixtures-dir", default="tests/fixtures", help="Output directory for fixtures")
+    parser.add_argument("--credentials", help="Path to GCP service account JSON (or use GCP_SA_KEY env)")
+    parser.add_argument("--permille", type=int, default=1, help="Series kept per 1000 (default 1)")
+    parser.add_argument("--max-rows", type=int, default=100000, help="Row cap per table")
+    parser.add_argument("--budget-usd", type=float, help="Maximum spend on extracts (default: unlimited)")
+
+    args = parser.parse_args()
+
+    runner = QueryTestRunner(args.credentials or os.getenv("GCP_SA_KEY"))
+    # Every extract is capped by its dry run, and stops once the budget is spent
+    runner.budget = CostBudget(total_usd=args.budget_usd)
+    builder = SampleBuilder(runner.client, runner.project_id, permille=args.permille)
+
+    contents = [query_info["content"] for query_info in runner.load_queries(args.query_dir).values()]
+    tables = set(ALWAYS_EXTRACT)
+    for content in contents:
+        tables.update(referenced_tables(content))
+
+    written = extract_fixtures(runner, tables, args.fixtures_dir, builder, args.max_rows, contents)
+    print(f"\n✓ Wrote {len(written)} fixtures to {args.fixtures_dir} (spent ${runner.budget.spent_usd:.4f})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
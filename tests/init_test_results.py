@@ -8,24 +8,12 @@ from pathlib import Path
 from typing import Dict, List
 import sys
 
+from query_catalog import QueryCatalog
+
 
 def discover_queries(query_dir: str = "queries") -> Dict[str, List[str]]:
     """Discover all queries organized by category."""
-    queries_by_category = {}
-    query_path = Path(query_dir)
-    
-    for sql_file in sorted(query_path.rglob("*.sql")):
-        relative = sql_file.relative_to(query_path)
-        parts = relative.parts[:-1]
-        category = parts[0] if parts else "root"
-        
-        if category not in queries_by_category:
-            queries_by_category[category] = []
-        
-        query_name = sql_file.stem
-        queries_by_category[category].append(query_name)
-    
-    return queries_by_category
+    return QueryCatalog(query_dir).by_category()
 
 
 def generate_initial_markdown(queries_by_category: Dict[str, List[str]]) -> str:
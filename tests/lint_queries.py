@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Static performance lint for the query catalog
+
+Flags performance anti-patterns in queries/**/*.sql before any job is
+submitted, with an estimate of the bytes or slot time each one costs, and
+suggests a Low/Medium/High complexity grade following
+docs/COMPLEXITY_GRADING.md.
+
+Rules:
+- select-star: SELECT * / * EXCEPT from a large IDC table whose columns all reach the
+  final result (a star in a CTE or subquery the outer query picks columns from is pruned)
+- exact-distinct: COUNT(DISTINCT <computed string>) where APPROX_COUNT_DISTINCT would do
+- repeated-scan: the same table scanned more than once in one query
+- correlated-subquery: a subquery referencing a table alias of the outer query
+- unfiltered-scan: a large IDC table read without a WHERE clause
+- order-without-limit: a final ORDER BY over row-level output without LIMIT
+
+Byte impacts come from the column size catalog (see cost_estimator.py) and
+are left out when it is unavailable. A query can opt out of rules with a
+header line such as:
+
+    -- Lint: ignore select-star, order-without-limit
+"""
+
+import json
+import re
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from cost_budget import PRICE_PER_TB
+from cost_estimator import ColumnSizeCatalog, estimate_query_bytes, identifiers, star_selected_tables
+from sql_utils import IDC_TABLE_PATTERN, IDENTIFIER, masked_code, paren_depths, scan_sql
+
+SEVERITIES = ("info", "warning", "error")
+
+# Rule -> severity
+RULES = {
+    "select-star": "warning",
+    "exact-distinct": "warning",
+    "repeated-scan": "warning",
+    "correlated-subquery": "warning",
+    "unfiltered-scan": "warning",
+    "order-without-limit": "info",
+}
+
+# Tables treated as large when the column size catalog does not cover them
+LARGE_TABLES = {"dicom_all", "dicom_all_view", "dicom_metadata", "dicom_metadata_curated"}
+
+# With a catalog, tables at least this large are treated as large
+LARGE_TABLE_BYTES = 10 * 1024 ** 3
+
+# Estimated-cost boundaries between Low/Medium and Medium/High, from docs/COMPLEXITY_GRADING.md
+GRADE_COST_USD = (0.10, 0.30)
+
+GRADES = ("Low", "Medium", "High")
+
+IGNORE_PATTERN = re.compile(r"^--\s*Lint:\s*ignore\s+(.+)$", re.IGNORECASE | re.MULTILINE)
+COMPUTED_DISTINCT_PATTERN = re.compile(
+    r"\bCOUNT\s*\(\s*DISTINCT\s*\(?\s*(ARRAY_TO_STRING|TO_JSON_STRING|CONCAT|FORMAT|CAST)\s*\(", re.IGNORECASE
+)
+ALIAS_PATTERN = re.compile(
+    r"\b(?:FROM|JOIN)\s+(`[^`]+`|[\w.]+|UNNEST\s*\([^()]*(?:\([^()]*\)[^()]*)*\))\s+(?:AS\s+)?(\w+)",
+    re.IGNORECASE,
+)
+ALIAS_KEYWORDS = {"where", "on", "using", "join", "cross", "left", "right", "inner", "full", "outer", "group",
+                  "order", "having", "limit", "union", "window", "qualify", "with", "select", "unnest"}
+
+
+def line_of(code: str, offset: int) -> int:
+    return code.count("\n", 0, offset) + 1
+
+
+def ignored_rules(content: str) -> Set[str]:
+    """Rules a query opts out of with "-- Lint: ignore rule-a, rule-b" header lines."""
+    return {
+        rule.strip().lower()
+        for match in IGNORE_PATTERN.finditer(content)
+        for rule in match.group(1).split(",") if rule.strip()
+    }
+
+
+class QueryLinter:
+    def __init__(self, catalog: Optional[ColumnSizeCatalog] = None, large_table_bytes: int = LARGE_TABLE_BYTES):
+        """
+        Initialize linter.
+
+        Args:
+            catalog: Column size catalog for byte impacts and cost-based grading (optional)
+            large_table_bytes: Catalog size at which a table counts as large
+        """
+        self.catalog = catalog if catalog is not None else ColumnSizeCatalog()
+        self.large_table_bytes = large_table_bytes
+
+    def is_large(self, table: str) -> bool:
+        if self.catalog.columns(table):
+            return self.catalog.table_bytes(table) >= self.large_table_bytes
+        return IDC_TABLE_PATTERN.match(table).group(2) in LARGE_TABLES
+
+    def column_bytes(self, table: str, columns: Iterable) -> Optional[int]:
+        """Catalog size of columns of table, or None if the table is not in the catalog."""
+        sizes = self.catalog.columns(table)
+        if not sizes:
+            return None
+        return sum(sizes.get(column, 0) for column in columns)
+
+    @staticmethod
+    def finding(rule: str, line: int, message: str, impact: str, impact_bytes: Optional[int] = None) -> Dict:
+        return {
+            "rule": rule,
+            "severity": RULES[rule],
+            "line": line,
+            "message": message,
+            "impact": impact,
+            "impact_bytes": impact_bytes,
+        }
+
+    @staticmethod
+    def format_bytes(bytes_val: int) -> str:
+        for unit in ["B", "KB", "MB", "GB", "TB"]:
+            if bytes_val < 1024:
+                return f"{bytes_val:.1f}{unit}"
+            bytes_val /= 1024
+        return f"{bytes_val:.1f}PB"
+
+    def table_offsets(self, sql: str, code: str) -> Dict[str, List[int]]:
+        """IDC table -> offsets in code of each backtick reference to it."""
+        offsets = {}
+        position = 0
+        for kind, text in scan_sql(sql):
+            if kind == IDENTIFIER and IDC_TABLE_PATTERN.match(text.strip("`")):
+                offsets.setdefault(text.strip("`"), []).append(position)
+            position += len(text)
+        return offsets
+
+    def check_select_star(self, sql: str, code: str, estimate: Dict) -> List[Dict]:
+        findings = []
+        names = identifiers(re.sub(r"\*\s*EXCEPT\s*\([^)]*\)", "*", code, flags=re.IGNORECASE))
+        offsets = self.table_offsets(sql, code)
+        for table, excepted in star_selected_tables(sql).items():
+            if not self.is_large(table):
+                continue
+            # Columns pulled in only by the star, not named anywhere else in the query
+            extra = [c for c in self.catalog.columns(table) if c.lower() not in excepted and c.lower() not in names]
+            extra_bytes = self.column_bytes(table, extra)
+            impact = (f"~{self.format_bytes(extra_bytes)} for {len(extra)} columns not otherwise used"
+                      if extra_bytes is not None else "scans every column of the table")
+            findings.append(self.finding(
+                "select-star", line_of(code, offsets[table][0]),
+                f"SELECT * reads every column of {table}; list the columns needed", impact, extra_bytes,
+            ))
+        return findings
+
+    def check_exact_distinct(self, sql: str, code: str, estimate: Dict) -> List[Dict]:
+        return [
+            self.finding(
+                "exact-distinct", line_of(code, match.start()),
+                f"COUNT(DISTINCT {match.group(1).upper()}(...)) is exact; "
+                f"use APPROX_COUNT_DISTINCT if an estimate (~1% error) will do",
+                "shuffles every distinct value; the approximate sketch is fixed-size",
+            )
+            for match in COMPUTED_DISTINCT_PATTERN.finditer(code)
+        ]
+
+    def check_repeated_scan(self, sql: str, code: str, estimate: Dict) -> List[Dict]:
+        findings = []
+        for table, offsets in self.table_offsets(sql, code).items():
+            if len(offsets) < 2:
+                continue
+            scan_bytes = self.column_bytes(table, estimate["columns"].get(table, []))
+            extra_bytes = scan_bytes * (len(offsets) - 1) if scan_bytes is not None else None
+            impact = (f"~{self.format_bytes(extra_bytes)} for {len(offsets) - 1} extra scan(s)"
+                      if extra_bytes is not None else f"{len(offsets) - 1} extra scan(s)")
+            findings.append(self.finding(
+                "repeated-scan", line_of(code, offsets[1]),
+                f"{table} is scanned {len(offsets)} times; read it once in a CTE "
+                f"(or UNNEST an array of values) and reuse it", impact, extra_bytes,
+            ))
+        return findings
+
+    def check_correlated_subquery(self, sql: str, code: str, estimate: Dict) -> List[Dict]:
+        findings = []
+        depths = paren_depths(code)
+        for match in re.finditer(r"\(\s*SELECT\b", code, re.IGNORECASE):
+            start = match.start()
+            end = start + 1
+            while end < len(code) and depths[end] > depths[start]:
+                end += 1
+            inner = code[start + 1:end]
+            outer = code[:start] + " " * (end - start) + code[end:]
+            inner_sources = [m.group(1) for m in ALIAS_PATTERN.finditer(inner)]
+            if inner_sources and all(s.upper().startswith("UNNEST") for s in inner_sources):
+                continue  # Subqueries over arrays of the outer row are cheap
+            inner_aliases = {m.group(2).lower() for m in ALIAS_PATTERN.finditer(inner)}
+            outer_aliases = {
+                m.group(2).lower() for m in ALIAS_PATTERN.finditer(outer)
+                if m.group(2).lower() not in ALIAS_KEYWORDS
+            } - inner_aliases
+            references = {m.group(1).lower() for m in re.finditer(r"\b(\w+)\.\w+", inner)}
+            correlated = sorted(references & outer_aliases)
+            if correlated:
+                findings.append(self.finding(
+                    "correlated-subquery", line_of(code, start),
+                    f"Subquery references outer alias {', '.join(correlated)}; rewrite it as a JOIN",
+                    "may be evaluated per outer row instead of as one join",
+                ))
+        return findings
+
+    def check_unfiltered_scan(self, sql: str, code: str, estimate: Dict) -> List[Dict]:
+        findings = []
+        depths = paren_depths(code)
+        for table, offsets in self.table_offsets(sql, code).items():
+            if not self.is_large(table):
+                continue
+            for offset in offsets:
+                # The rest of the SELECT the table is read in: until its closing parenthesis,
+                # a set operation or the end of the statement
+                depth = depths[offset]
+                end = offset
+                while end < len(code) and depths[end] >= depth and code[end] != ";":
+                    end += 1
+                scope = code[offset:end]
+                clause_ends = [
+                    m.start() for m in re.finditer(r"\b(UNION|INTERSECT|EXCEPT\s+DISTINCT)\b", scope, re.IGNORECASE)
+                    if depths[offset + m.start()] == depth
+                ]
+                scope = scope[:clause_ends[0]] if clause_ends else scope
+                if any(
+                    depths[offset + m.start()] == depth
+                    for m in re.finditer(r"\b(WHERE|QUALIFY)\b", scope, re.IGNORECASE)
+                ):
+                    continue
+                scan_bytes = self.column_bytes(table, estimate["columns"].get(table, []))
+                impact = (f"~{self.format_bytes(scan_bytes)} full scan" if scan_bytes is not None
+                          else "full scan of the referenced columns")
+                findings.append(self.finding(
+                    "unfiltered-scan", line_of(code, offset),
+                    f"{table} is read without a WHERE filter (e.g. on collection_id or Modality)",
+                    impact, scan_bytes,
+                ))
+        return findings
+
+    def check_order_without_limit(self, sql: str, code: str, estimate: Dict) -> List[Dict]:
+        depths = paren_depths(code)
+        top_level = [
+            m for m in re.finditer(r"\b(SELECT|ORDER\s+BY|GROUP\s+BY|LIMIT)\b", code, re.IGNORECASE)
+            if depths[m.start()] == 0
+        ]
+        selects = [m for m in top_level if m.group(1).upper() == "SELECT"]
+        if not selects:
+            return []
+        final = [m for m in top_level if m.start() >= selects[-1].start()]
+        keywords = [re.sub(r"\s+", " ", m.group(1).upper()) for m in final]
+        if "ORDER BY" not in keywords or "LIMIT" in keywords or "GROUP BY" in keywords:
+            return []
+        if re.match(r"SELECT\s+DISTINCT\b", code[selects[-1].start():], re.IGNORECASE):
+            return []
+        order_by = final[keywords.index("ORDER BY")]
+        return [self.finding(
+            "order-without-limit", line_of(code, order_by.start()),
+            "ORDER BY over row-level output without LIMIT; sort downstream, or add a LIMIT",
+            "the final sort of every output row runs in a single worker",
+        )]
+
+    def lint(self, content: str) -> List[Dict]:
+        """
+        Lint one query.
+
+        Returns: findings (rule, severity, line, message, impact, impact_bytes), in line order
+        """
+        code = masked_code(content)
+        estimate = estimate_query_bytes(content, self.catalog)
+        ignored = ignored_rules(content)
+        findings = []
+        for check in (self.check_select_star, self.check_exact_distinct, self.check_repeated_scan,
+                      self.check_correlated_subquery, self.check_unfiltered_scan,
+                      self.check_order_without_limit):
+            findings.extend(f for f in check(content, code, estimate) if f["rule"] not in ignored)
+        return sorted(findings, key=lambda f: f["line"])
+
+    def suggest_complexity(self, content: str) -> Dict:
+        """
+        Suggest a complexity grade from the query's structure and, with a catalog, its estimated cost.
+
+        Returns: dict with grade (Low/Medium/High), estimated_bytes (None without a complete
+        catalog) and the structural counts behind the grade
+        """
+        code = masked_code(content)
+        counts = {
+            "joins": len(re.findall(r"\bJOIN\s+(?!UNNEST\b)", code, re.IGNORECASE)),
+            "unnests": len(re.findall(r"\bUNNEST\s*\(", code, re.IGNORECASE)),
+            "windows": len(re.findall(r"\bOVER\s*\(", code, re.IGNORECASE)),
+            "aggregations": len(re.findall(r"\bGROUP\s+BY\b", code, re.IGNORECASE)),
+            "table_scans": sum(len(o) for o in self.table_offsets(content, code).values()),
+        }
+        if counts["joins"] >= 3 or counts["unnests"] >= 3 or counts["windows"] >= 2:
+            grade = 2
+        elif counts["joins"] or counts["unnests"] or counts["windows"] or counts["aggregations"] > 1 \
+                or counts["table_scans"] > 1:
+            grade = 1
+        else:
+            grade = 0
+
+        estimate = estimate_query_bytes(content, self.catalog)
+        estimated_bytes = None
+        if not estimate["unknown_tables"]:
+            estimated_bytes = estimate["bytes"]
+            cost = estimated_bytes / 1024 ** 4 * PRICE_PER_TB
+            grade = max(grade, sum(cost >= boundary for boundary in GRADE_COST_USD))
+
+        return dict(counts, grade=GRADES[grade], estimated_bytes=estimated_bytes)
+
+
+def lint_catalog(linter: QueryLinter, queries: Dict[str, Dict]) -> Dict[str, Dict]:
+    """
+    Lint query infos (from QueryTestRunner.load_queries).
+
+    Returns: path -> {findings, suggested_complexity}
+    """
+    return {
+        path: {
+            "findings": linter.lint(query_info["content"]),
+            "suggested_complexity": linter.suggest_complexity(query_info["content"])["grade"],
+        }
+        for path, query_info in queries.items()
+    }
+
+
+def new_findings(findings: List[Dict], base_findings: List[Dict]) -> List[Dict]:
+    """Findings not already in base_findings, matched by rule and message (lines move between versions)."""
+    remaining = Counter((f["rule"], f["message"]) for f in base_findings)
+    new = []
+    for f in findings:
+        if remaining[(f["rule"], f["message"])] > 0:
+            remaining[(f["rule"], f["message"])] -= 1
+        else:
+            new.append(f)
+    return new
+
+
+def main():
+    import argparse
+
+    from changed_queries import git_base_content, git_changed_files
+    from query_catalog import QueryCatalog
+    from cost_estimator import DEFAULT_CATALOG_PATH
+
+    parser = argparse.ArgumentParser(description="Lint queries for performance anti-patterns")
+    parser.add_argument("paths", nargs="*", help="Query files to lint (default: all in --query-dir)")
+    parser.add_argument("--query-dir", default="queries", help="Directory containing query files")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG_PATH, help="Column size catalog JSON (optional)")
+    parser.add_argument("--changed", metavar="REV_RANGE",
+                        help="Only lint .sql files changed in a git range (e.g. origin/main...HEAD)")
+    parser.add_argument("--fail-on", choices=SEVERITIES + ("never",), default="never",
+                        help="Exit 1 if any finding has at least this severity (e.g. to gate PRs); "
+                             "with --changed, only findings the range introduces count")
+    parser.add_argument("--grades", action="store_true",
+                        help="Also report queries whose header complexity differs from the suggested grade")
+    parser.add_argument("--json", action="store_true", help="Print findings as JSON")
+
+    args = parser.parse_args()
+
+    catalog = QueryCatalog(args.query_dir)
+    if args.paths:
+        paths = [str(Path(p)) for p in args.paths]
+    else:
+        paths = [entry["path"] for entry in catalog.entries.values()]
+    if args.changed:
+        changed = {Path(p).resolve() for p in git_changed_files(args.changed)}
+        paths = [p for p in paths if Path(p).resolve() in changed]
+
+    linter = QueryLinter(ColumnSizeCatalog.load(args.catalog))
+    report = {}
+    for path in paths:
+        with open(path) as f:
+            content = f.read()
+        entry = catalog.get(path)
+        findings = linter.lint(content)
+        report[path] = {
+            "findings": findings,
+            "new_findings": findings,
+            "complexity": entry["header"]["complexity"] if entry else "Unknown",
+            "suggested_complexity": linter.suggest_complexity(content)["grade"],
+        }
+        if args.changed:
+            base_content = git_base_content(args.changed, path)
+            if base_content is not None:
+                report[path]["new_findings"] = new_findings(findings, linter.lint(base_content))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for path, lint in report.items():
+            for f in lint["findings"]:
+                print(f"{path}:{f['line']}: {f['severity']} [{f['rule']}] {f['message']} ({f['impact']})")
+            header_grade = lint["complexity"].split()[:1]
+            if args.grades and header_grade != [lint["suggested_complexity"]]:
+                print(f"{path}: info [grade] header says {lint['complexity']}, "
+                      f"suggested {lint['suggested_complexity']}")
+
+    findings = [f for lint in report.values() for f in lint["findings"]]
+    print(f"\n{len(findings)} finding(s) in {len(report)} queries", file=sys.stderr)
+
+    if args.fail_on != "never":
+        # Findings already on the base of --changed do not block a change to the query
+        gated = [f for lint in report.values() for f in lint["new_findings"]]
+        threshold = SEVERITIES.index(args.fail_on)
+        failing = [f for f in gated if SEVERITIES.index(f["severity"]) >= threshold]
+        if failing:
+            scope = f"new in {args.changed} " if args.changed else ""
+            print(f"❌ {len(failing)} finding(s) {scope}at or above {args.fail_on}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""
+Offline local execution backend for the regression test runner
+
+Transpiles the BigQuery SQL in queries/ to DuckDB with sqlglot and runs it
+against Parquet fixture extracts of the IDC tables, so queries can be checked
+for syntax, semantics and non-empty results without credentials or network.
+
+Fixtures are laid out as <fixtures_dir>/<dataset>/<table>.parquet, e.g.
+tests/fixtures/idc_current/dicom_all.parquet, and can be created with
+extract_fixtures.py.
+
+LocalClient implements the subset of google.cloud.bigquery.Client used by
+QueryTestRunner, so it can be passed in as the runner's client.
+"""
+
+import itertools
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from query_params import inline_parameters
+from sql_utils import referenced_tables, rewrite_table_refs
+
+
+class LocalRowIterator:
+    """Minimal stand-in for google.cloud.bigquery.table.RowIterator."""
+
+    def __init__(self, rows: List[Dict]):
+        self.rows = rows
+        self.total_rows = len(rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class LocalQueryJob:
+    """Minimal stand-in for google.cloud.bigquery.QueryJob, already complete."""
+
+    def __init__(self, job_id: str, query: str, total_bytes_processed: int,
+                 rows: Optional[List[Dict]] = None, elapsed_ms: float = 0.0):
+        self.job_id = job_id
+        self.query = query
+        self.state = "DONE"
+        self.total_bytes_processed = total_bytes_processed
+        self.total_bytes_billed = 0
+        self.slot_millis = None
+        self.cache_hit = False
+        self.query_plan = []
+        self.elapsed_ms = elapsed_ms
+        self._rows = rows or []
+
+    def result(self, **kwargs) -> LocalRowIterator:
+        return LocalRowIterator(self._rows)
+
+
+class LocalClient:
+    def __init__(self, fixtures_dir: str = "tests/fixtures", project: str = "local"):
+        """
+        Open an in-memory DuckDB database with one view per Parquet fixture.
+
+        Args:
+            fixtures_dir: Directory of <dataset>/<table>.parquet fixture files
+            project: Reported as the client project
+        """
+        try:
+            import duckdb
+            import sqlglot
+        except ImportError:
+            raise ImportError(
+                "The local backend requires duckdb and sqlglot. "
+                "Install with: pip install duckdb sqlglot"
+            )
+        self._sqlglot = sqlglot
+        self.project = project
+        self.fixtures_dir = Path(fixtures_dir)
+        self.connection = duckdb.connect()
+        self._job_ids = itertools.count(1)
+
+        # Full BigQuery table id -> (DuckDB view name, fixture path)
+        self.tables = {}
+        for path in sorted(self.fixtures_dir.glob("*/*.parquet")):
+            table_id = f"bigquery-public-data.{path.parent.name}.{path.stem}"
+            view = f"{path.parent.name}__{path.stem}"
+            escaped_path = str(path).replace("'", "''")
+            self.connection.execute(f'CREATE VIEW "{view}" AS SELECT * FROM read_parquet(\'{escaped_path}\')')
+            self.tables[table_id] = (view, path)
+
+    def missing_fixtures(self, sql: str) -> List[str]:
+        """IDC tables sql reads that have no Parquet fixture."""
+        return [t for t in referenced_tables(sql) if t not in self.tables]
+
+    def transpile(self, sql: str) -> List[str]:
+        """
+        Translate a BigQuery script over IDC tables into DuckDB statements over the fixture views.
+
+        The last statement is the query; any before it are setup (e.g. CREATE TEMP FUNCTION).
+        """
+        missing = self.missing_fixtures(sql)
+        if missing:
+            raise LookupError(f"No Parquet fixture for {', '.join(missing)} in {self.fixtures_dir}")
+
+        local_sql = rewrite_table_refs(sql, {t: view for t, (view, _) in self.tables.items()})
+        statements = self._sqlglot.transpile(local_sql, read="bigquery", write="duckdb")
+        if not statements:
+            raise ValueError("No SQL statement found")
+        return statements
+
+    def fixture_bytes(self, sql: str) -> int:
+        """Size on disk of the fixtures a statement reads (the local analogue of bytes processed)."""
+        return sum(
+            self.tables[t][1].stat().st_size for t in referenced_tables(sql) if t in self.tables
+        )
+
+    def query(self, sql: str, job_config=None, job_id: Optional[str] = None, **kwargs) -> LocalQueryJob:
+        """Run (or, with job_config.dry_run, only plan) a BigQuery statement locally."""
+        job_id = job_id or f"local_{next(self._job_ids)}"
+        # DuckDB has no BigQuery named parameters, so bound values are inlined as literals
+        parameters = getattr(job_config, "query_parameters", None)
+        *setup, local_sql = self.transpile(inline_parameters(sql, parameters) if parameters else sql)
+        # Each job gets its own cursor, so temporary objects do not leak between queries
+        cursor = self.connection.cursor()
+        for statement in setup:
+            cursor.execute(statement)
+
+        if getattr(job_config, "dry_run", False):
+            cursor.execute(f"EXPLAIN {local_sql}")
+            return LocalQueryJob(job_id, sql, self.fixture_bytes(sql))
+
+        start = time.perf_counter()
+        cursor.execute(local_sql)
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        return LocalQueryJob(job_id, sql, self.fixture_bytes(sql), rows, elapsed_ms)
+
+    def get_table(self, table_id: str):
+        """Describe a fixture table as a namespace with schema (name/field_type), num_rows and num_bytes."""
+        table_id = str(table_id)
+        if table_id not in self.tables:
+            raise LookupError(f"No Parquet fixture for {table_id}")
+        view, path = self.tables[table_id]
+        cursor = self.connection.cursor()
+        schema = [
+            SimpleNamespace(name=row[0], field_type=row[1])
+            for row in cursor.execute(f'DESCRIBE "{view}"').fetchall()
+        ]
+        num_rows = cursor.execute(f'SELECT COUNT(*) FROM "{view}"').fetchone()[0]
+        return SimpleNamespace(table_id=table_id, schema=schema, num_rows=num_rows,
+                               num_bytes=path.stat().st_size)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Merge the results of a sharded regression run
+
+Combines the per-shard JSON results of run_regression_tests.py --shard i/N
+into a single QUERY_TEST_RESULTS.md and JSON file, checking that every query
+was tested by exactly one shard. Optionally merges the shards' performance
+history and result cache back into one .query_cache, so the next run (and
+its shard balancing) sees the measurements of every shard.
+"""
+
+import json
+import shutil
+import sqlite3
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Tuple
+
+from perf_history import migrate
+
+
+def merge_results(result_files: Iterable[str]) -> Tuple[List[Dict], List[str]]:
+    """
+    Combine per-shard results, in path order.
+
+    Returns: (results, paths reported by more than one shard; the first shard's result is kept)
+    """
+    merged = {}
+    duplicates = []
+    for result_file in result_files:
+        with open(result_file) as f:
+            for result in json.load(f):
+                if result["path"] in merged:
+                    duplicates.append(result["path"])
+                    continue
+                merged[result["path"]] = result
+    return [merged[path] for path in sorted(merged)], duplicates
+
+
+def merge_history(target_db: str, shard_dbs: Iterable[str]) -> int:
+    """
+    Copy runs and fingerprints missing from target_db out of each shard's history database.
+
+    Returns: number of rows added
+    """
+    Path(target_db).parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(target_db)
+    # The target may be an older restored database; shards are migrated when they open it
+    migrate(connection)
+    added = 0
+    for shard_db in shard_dbs:
+        connection.execute("ATTACH DATABASE ? AS shard", (shard_db,))
+        with connection:
+            for table in ("runs", "fingerprints"):
+                # Shards start from the same restored history, so only rows new to the target are copied
+                added += connection.execute(
+                    f"INSERT INTO {table} SELECT * FROM shard.{table} AS s WHERE NOT EXISTS ("
+                    f"SELECT 1 FROM {table} AS t WHERE t.run_id = s.run_id "
+                    f"AND t.query_path = s.query_path AND t.recorded_at = s.recorded_at)"
+                ).rowcount
+        connection.execute("DETACH DATABASE shard")
+    connection.close()
+    return added
+
+
+def merge_cache_dirs(target_dir: str, shard_dirs: Iterable[str]) -> int:
+    """
+    Copy result cache entries missing from target_dir out of each shard's cache directory.
+
+    Entries are content-addressed, so an entry present in several shards is the same.
+
+    Returns: number of entries copied
+    """
+    copied = 0
+    for shard_dir in shard_dirs:
+        for path in Path(shard_dir).rglob("*"):
+            target = Path(target_dir) / path.relative_to(shard_dir)
+            if path.is_file() and not target.exists():
+                target.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(path, target)
+                copied += 1
+    return copied
+
+
+def main():
+    import argparse
+
+    from query_catalog import QueryCatalog
+    from run_regression_tests import SKIPPED_STATUSES, QueryTestRunner
+
+    parser = argparse.ArgumentParser(description="Merge the results of a sharded regression run")
+    parser.add_argument("results", nargs="+", help="Per-shard JSON results (--json-output of each shard)")
+    parser.add_argument("--output", default="tests/QUERY_TEST_RESULTS.md", help="Merged markdown report")
+    parser.add_argument("--json-output", default="tests/query_test_results.json", help="Merged JSON results")
+    parser.add_argument("--query-dir", default="queries", help="Query directory, to check every query ran")
+    parser.add_argument("--shard-caches", nargs="*", default=[], metavar="DIR",
+                        help="Each shard's .query_cache directory, merged into --cache-dir")
+    parser.add_argument("--cache-dir", default=".query_cache", help="Cache directory to merge shard caches into")
+
+    args = parser.parse_args()
+
+    results, duplicates = merge_results(args.results)
+    expected = set(QueryCatalog(args.query_dir).entries)
+    missing = sorted(expected - {r["path"] for r in results})
+
+    # The report needs no BigQuery client
+    runner = QueryTestRunner(client=SimpleNamespace(project=None))
+    report = runner.generate_markdown_report(results)
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w") as f:
+        f.write(report)
+    print(f"✓ Merged {len(results)} results from {len(args.results)} shards into {args.output}")
+    Path(args.json_output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.json_output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✓ Wrote JSON results to {args.json_output}")
+
+    if args.shard_caches:
+        history_dbs = [str(Path(d) / "perf_history.sqlite") for d in args.shard_caches
+                       if (Path(d) / "perf_history.sqlite").exists()]
+        added = merge_history(str(Path(args.cache_dir) / "perf_history.sqlite"), history_dbs)
+        copied = merge_cache_dirs(str(Path(args.cache_dir) / "results"),
+                                  [str(Path(d) / "results") for d in args.shard_caches])
+        print(f"✓ Merged {added} history rows and {copied} result cache entries into {args.cache_dir}")
+
+    production = [r for r in results if not r["is_pending"]]
+    failures = [r for r in production if r["status"] != "Pass" and r["status"] not in SKIPPED_STATUSES]
+    print(f"\n{len(production) - len(failures)} of {len(production)} production queries passed")
+
+    if duplicates:
+        print(f"⚠ {len(duplicates)} queries were tested by more than one shard:")
+        for path in duplicates:
+            print(f"   - {path}")
+    if missing:
+        # Shards computed different partitions, e.g. from different history
+        print(f"❌ {len(missing)} queries were not tested by any shard:")
+        for path in missing:
+            print(f"   - {path}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Historical performance store with regression detection
+
+Keeps per-query, per-run execution stats in a local SQLite database, indexed
+by query path and IDC release. Runs with --fingerprint execute without the
+test LIMIT, so they are recorded with their mode and only compared with runs
+of the same mode. Rolling medians and percentiles over recent
+runs give noise-resistant values for the header updater, and each new run is
+compared against them to flag:
+- regressions: a metric above the rolling median by more than the band
+- creep: the median of the newer half of the window above the older half by
+  more than the band, which catches slow drift that no single run exceeds
+"""
+
+import json
+import os
+import sqlite3
+import statistics
+import sys
+from typing import Dict, List, Optional
+
+from result_fingerprint import diff_fingerprints
+
+# Metrics tracked per run, as named in the test result dicts
+METRICS = ("bytes_scanned", "total_slot_ms", "elapsed_ms")
+
+# Changes smaller than this are noise regardless of the relative band
+MIN_ABSOLUTE_CHANGE = {"bytes_scanned": 10 * 1024 ** 2, "total_slot_ms": 1000, "elapsed_ms": 1000}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT NOT NULL,
+    recorded_at TEXT NOT NULL,
+    query_path TEXT NOT NULL,
+    query_name TEXT NOT NULL,
+    idc_version TEXT NOT NULL,
+    bytes_scanned INTEGER,
+    bytes_billed INTEGER,
+    total_slot_ms INTEGER,
+    elapsed_ms REAL,
+    row_count INTEGER,
+    mode TEXT NOT NULL DEFAULT 'limit'
+);
+CREATE INDEX IF NOT EXISTS runs_by_query ON runs (query_path, idc_version, recorded_at);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    run_id TEXT NOT NULL,
+    recorded_at TEXT NOT NULL,
+    query_path TEXT NOT NULL,
+    idc_version TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    fingerprint TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fingerprints_by_query ON fingerprints (query_path, idc_version, mode, recorded_at);
+"""
+
+
+def migrate(connection: sqlite3.Connection) -> None:
+    """Create the schema, adding columns that databases written by earlier versions lack."""
+    connection.executescript(SCHEMA)
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(runs)")}
+    if "mode" not in columns:
+        # Earlier runs predate --fingerprint runs being kept apart; LIMIT was the default
+        with connection:
+            connection.execute("ALTER TABLE runs ADD COLUMN mode TEXT NOT NULL DEFAULT 'limit'")
+
+
+def metric_value(result: Dict, metric: str) -> Optional[float]:
+    """Value of a tracked metric in a test result (elapsed falls back to client wall time)."""
+    if metric == "elapsed_ms":
+        return result.get("elapsed_ms") or result.get("wall_time_ms")
+    return result.get(metric)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Percentile (0-100) of values with linear interpolation between ranks."""
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class PerformanceHistory:
+    def __init__(self, db_path: str = ".query_cache/perf_history.sqlite", window: int = 20,
+                 band: float = 0.25, min_runs: int = 3):
+        """
+        Open (creating if needed) the history database.
+
+        Args:
+            db_path: SQLite database file
+            window: Number of most recent runs used for rolling statistics
+            band: Relative increase over the rolling median flagged as a regression (0.25 = 25%)
+            min_runs: Runs needed before a query's statistics are trusted
+        """
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self.window = window
+        self.band = band
+        self.min_runs = min_runs
+        self.connection = sqlite3.connect(db_path)
+        migrate(self.connection)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    @staticmethod
+    def run_mode(result: Dict) -> str:
+        """Runs with --fingerprint drop the test LIMIT ("full"), so they are only comparable with each other."""
+        return "full" if result.get("result_fingerprint") else "limit"
+
+    @staticmethod
+    def is_measurement(result: Dict) -> bool:
+        """Whether a result is a fresh, full-table BigQuery measurement worth recording."""
+        # Sampled and shared-scan runs read substitute tables, so their stats are not the query's
+        return (
+            result.get("status") == "Pass"
+            and not result.get("cached")
+            and not result.get("carried_over")
+            and not result.get("sampled")
+            and not result.get("shared_scan")
+            and not result.get("cache_hit")
+            and result.get("total_slot_ms") is not None
+        )
+
+    def record_results(self, results: List[Dict], run_id: str, idc_version: Optional[str],
+                       recorded_at: str) -> int:
+        """
+        Append the measurements from one run.
+
+        Returns: number of rows recorded
+        """
+        rows = [
+            (run_id, recorded_at, r["path"], r["name"], str(idc_version or "unknown"),
+             r.get("bytes_scanned"), r.get("bytes_billed"), r.get("total_slot_ms"),
+             metric_value(r, "elapsed_ms"), r.get("row_count"), self.run_mode(r))
+            for r in results if self.is_measurement(r)
+        ]
+        with self.connection:
+            self.connection.executemany("INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def recent_values(self, query_path: str, metric: str, idc_version: Optional[str] = None,
+                      mode: Optional[str] = None) -> List[float]:
+        """Values of metric over the last `window` runs of a query (of one run_mode, if given), oldest first."""
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        sql = f"SELECT {metric} FROM runs WHERE query_path = ? AND {metric} IS NOT NULL"
+        params = [query_path]
+        if idc_version is not None:
+            sql += " AND idc_version = ?"
+            params.append(str(idc_version))
+        if mode is not None:
+            sql += " AND mode = ?"
+            params.append(mode)
+        sql += " ORDER BY recorded_at DESC LIMIT ?"
+        params.append(self.window)
+        return [row[0] for row in self.connection.execute(sql, params).fetchall()][::-1]
+
+    def stats(self, query_path: str, metric: str, idc_version: Optional[str] = None,
+              mode: Optional[str] = None) -> Optional[Dict]:
+        """Rolling median/p90/p95 of metric, or None with fewer than min_runs runs."""
+        values = self.recent_values(query_path, metric, idc_version, mode)
+        if len(values) < self.min_runs:
+            return None
+        return {
+            "count": len(values),
+            "median": statistics.median(values),
+            "p90": percentile(values, 90),
+            "p95": percentile(values, 95),
+        }
+
+    def detect_regressions(self, results: List[Dict], idc_version: Optional[str]) -> Dict[str, List[Dict]]:
+        """
+        Compare a run against history recorded before it, in the same run_mode.
+
+        Call before record_results for the same run.
+
+        Returns: query path -> list of findings (metric, kind, value, baseline, change)
+        """
+        findings = {}
+        for r in results:
+            if not self.is_measurement(r):
+                continue
+            for metric in METRICS:
+                value = metric_value(r, metric)
+                history = self.recent_values(r["path"], metric, idc_version, self.run_mode(r))
+                if value is None or len(history) < self.min_runs:
+                    continue
+
+                baseline = statistics.median(history)
+                min_change = MIN_ABSOLUTE_CHANGE[metric]
+                if baseline > 0 and value > baseline * (1 + self.band) and value - baseline >= min_change:
+                    findings.setdefault(r["path"], []).append({
+                        "metric": metric, "kind": "regression", "value": value,
+                        "baseline": baseline, "change": value / baseline - 1,
+                    })
+                    continue
+
+                # Creep: newer half of the window (including this run) vs older half
+                series = history + [value]
+                half = len(series) // 2
+                older, newer = statistics.median(series[:half]), statistics.median(series[half:])
+                if (half >= self.min_runs and older > 0 and newer > older * (1 + self.band)
+                        and newer - older >= min_change):
+                    findings.setdefault(r["path"], []).append({
+                        "metric": metric, "kind": "creep", "value": newer,
+                        "baseline": older, "change": newer / older - 1,
+                    })
+        return findings
+
+    @staticmethod
+    def fingerprint_mode(result: Dict) -> str:
+        """Fingerprints are only comparable between runs on the same data (full tables, samples or projections)."""
+        if result.get("sampled"):
+            return "sampled"
+        return "shared_scan" if result.get("shared_scan") else "full"
+
+    @staticmethod
+    def has_fresh_fingerprint(result: Dict) -> bool:
+        return bool(result.get("result_fingerprint")) and not result.get("cached") and not result.get("carried_over")
+
+    def latest_fingerprint(self, query_path: str, idc_version: Optional[str], mode: str) -> Optional[Dict]:
+        row = self.connection.execute(
+            "SELECT fingerprint FROM fingerprints WHERE query_path = ? AND idc_version = ? AND mode = ? "
+            "ORDER BY recorded_at DESC LIMIT 1",
+            (query_path, str(idc_version or "unknown"), mode)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def detect_result_changes(self, results: List[Dict], idc_version: Optional[str]) -> Dict[str, List[str]]:
+        """
+        Compare result fingerprints with the last ones recorded on the same IDC release.
+
+        Call before record_fingerprints for the same run.
+
+        Returns: query path -> list of differences
+        """
+        changes = {}
+        for r in results:
+            if not self.has_fresh_fingerprint(r):
+                continue
+            previous = self.latest_fingerprint(r["path"], idc_version, self.fingerprint_mode(r))
+            if previous is not None:
+                diff = diff_fingerprints(previous, r["result_fingerprint"])
+                if diff:
+                    changes[r["path"]] = diff
+        return changes
+
+    def record_fingerprints(self, results: List[Dict], run_id: str, idc_version: Optional[str],
+                            recorded_at: str) -> int:
+        rows = [
+            (run_id, recorded_at, r["path"], str(idc_version or "unknown"), self.fingerprint_mode(r),
+             json.dumps(r["result_fingerprint"], default=str))
+            for r in results if self.has_fresh_fingerprint(r)
+        ]
+        with self.connection:
+            self.connection.executemany("INSERT INTO fingerprints VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show rolling performance stats from the history database")
+    parser.add_argument("--db", default=".query_cache/perf_history.sqlite", help="History database")
+    parser.add_argument("--idc-version", help="Only use runs on this IDC release")
+    parser.add_argument("--window", type=int, default=20, help="Runs per rolling window")
+    parser.add_argument("--mode", choices=("limit", "full"), default="limit",
+                        help="Runs with the test LIMIT, or full runs (--fingerprint)")
+
+    args = parser.parse_args()
+
+    history = PerformanceHistory(args.db, window=args.window, min_runs=1)
+    paths = [row[0] for row in history.connection.execute("SELECT DISTINCT query_path FROM runs ORDER BY 1")]
+    print(f"{len(paths)} queries in {args.db}\n")
+    print(f"{'Query':<60} {'Runs':>5} {'Median GB':>10} {'Median slot s':>14} {'p95 elapsed s':>14}")
+    for path in paths:
+        bytes_stats = history.stats(path, "bytes_scanned", args.idc_version, args.mode)
+        slot_stats = history.stats(path, "total_slot_ms", args.idc_version, args.mode)
+        elapsed_stats = history.stats(path, "elapsed_ms", args.idc_version, args.mode)
+        if not bytes_stats:
+            continue
+        print(f"{path:<60} {bytes_stats['count']:>5} {bytes_stats['median'] / 1024 ** 3:>10.2f} "
+              f"{(slot_stats['median'] if slot_stats else 0) / 1000:>14.1f} "
+              f"{(elapsed_stats['p95'] if elapsed_stats else 0) / 1000:>14.1f}")
+    history.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Indexed catalog of the queries in queries/
+
+Parses each query header once, in a single pass, into a structured manifest
+cached at .query_cache/catalog.json. A file is re-read only when its mtime or
+size changes, and re-parsed only when its SHA-256 changes too, so listing and
+filtering thousands of queries needs no more than a stat per file.
+
+This module has no cloud dependencies. google-cloud-bigquery is imported by
+load_bigquery() on first use, only when a query is actually executed.
+"""
+
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from query_params import parse_parameters
+
+DEFAULT_MANIFEST_PATH = ".query_cache/catalog.json"
+
+# Bump when parse_header output changes, to invalidate cached manifests
+MANIFEST_VERSION = 1
+
+# Header fields ("-- Key: value", several per line separated by "|") -> manifest key
+HEADER_FIELDS = {
+    "Purpose": "purpose",
+    "Complexity": "complexity",
+    "Estimated Cost": "estimated_cost",
+    "Bytes Scanned": "bytes_scanned",
+    "Status": "status",
+    "Reason": "reason",
+    "Author/Source": "author",
+    "Depends On": "depends_on",
+}
+
+_bigquery = None
+
+
+def load_bigquery():
+    """Import google.cloud.bigquery on first use; None if it is not installed."""
+    global _bigquery
+    if _bigquery is None:
+        try:
+            from google.cloud import bigquery
+        except ImportError:
+            return None
+        _bigquery = bigquery
+    return _bigquery
+
+
+def make_job_config(**kwargs):
+    """Build a QueryJobConfig, or a plain namespace when google-cloud-bigquery is not installed."""
+    bigquery = load_bigquery()
+    if bigquery is None:
+        return SimpleNamespace(**kwargs)
+    return bigquery.QueryJobConfig(**kwargs)
+
+
+def parse_header(content: str) -> Dict:
+    """
+    Parse the leading comment block of a query in one pass.
+
+    Returns: dict with purpose, complexity, estimated_cost, bytes_scanned, status,
+    reason, author, depends_on (list of paths) and parameters (see query_params)
+    """
+    header = {
+        "purpose": "",
+        "complexity": "Unknown",
+        "estimated_cost": "TBD",
+        "bytes_scanned": "TBD",
+        "status": "",
+        "reason": "",
+        "author": "",
+        "depends_on": [],
+    }
+    header_lines = []
+    for line in content.split("\n"):
+        stripped = line.strip()
+        if stripped and not stripped.startswith("--"):
+            break  # End of header comment block
+        header_lines.append(stripped)
+        for segment in stripped.lstrip("-").split("|"):
+            key, separator, value = segment.partition(":")
+            field = HEADER_FIELDS.get(key.strip())
+            if not separator or field is None:
+                continue
+            if field == "depends_on":
+                header[field].extend(dep.strip() for dep in value.split(",") if dep.strip())
+            else:
+                header[field] = value.strip()
+    header["parameters"] = parse_parameters("\n".join(header_lines))
+    return header
+
+
+class QueryCatalog:
+    def __init__(self, query_dir: str = "queries", manifest_path: Optional[str] = DEFAULT_MANIFEST_PATH):
+        """
+        Load the catalog of query_dir, refreshing stale entries.
+
+        Args:
+            query_dir: Directory containing query files
+            manifest_path: Cached manifest JSON (None = do not cache)
+        """
+        self.query_dir = query_dir
+        self.manifest_path = manifest_path
+        self.entries = {}
+        self.refresh()
+
+    def load_manifest(self) -> Dict[str, Dict]:
+        if not self.manifest_path or not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get("version") != MANIFEST_VERSION or manifest.get("query_dir") != self.query_dir:
+            return {}
+        return manifest.get("entries", {})
+
+    def save_manifest(self) -> None:
+        if not self.manifest_path:
+            return
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        temp_path = f"{self.manifest_path}.tmp.{os.getpid()}"
+        with open(temp_path, "w") as f:
+            json.dump({"version": MANIFEST_VERSION, "query_dir": self.query_dir, "entries": self.entries}, f)
+        os.replace(temp_path, self.manifest_path)
+
+    def make_entry(self, sql_file: Path, stat: os.stat_result, sha256: str, header: Dict) -> Dict:
+        query_path = Path(self.query_dir)
+        if "pending" in str(sql_file):
+            category = "pending"
+        else:
+            parts = sql_file.relative_to(query_path).parts[:-1]  # Exclude filename
+            category = parts[0] if parts else "root"
+        return {
+            "name": sql_file.stem,
+            "category": category,
+            "path": str(sql_file),
+            "is_pending": category == "pending",
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": sha256,
+            "header": header,
+        }
+
+    def refresh(self) -> int:
+        """
+        Bring the catalog up to date with the files on disk.
+
+        Returns: number of files whose header was (re)parsed
+        """
+        cached = self.load_manifest()
+        entries = {}
+        parsed = 0
+        changed = False
+        for sql_file in sorted(Path(self.query_dir).rglob("*.sql")):
+            path = str(sql_file)
+            stat = sql_file.stat()
+            entry = cached.get(path)
+            if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                entries[path] = entry
+                continue
+
+            content = sql_file.read_text()
+            sha256 = hashlib.sha256(content.encode("utf-8")).hexdigest()
+            if entry and entry["sha256"] == sha256:
+                header = entry["header"]  # Touched, not changed
+            else:
+                header = parse_header(content)
+                parsed += 1
+            entries[path] = self.make_entry(sql_file, stat, sha256, header)
+            changed = True
+
+        changed = changed or set(entries) != set(cached)
+        self.entries = entries
+        if changed:
+            self.save_manifest()
+        return parsed
+
+    def get(self, path: str) -> Optional[Dict]:
+        return self.entries.get(str(path))
+
+    def content(self, path: str) -> str:
+        with open(path) as f:
+            return f.read()
+
+    def filter(self, category: Optional[str] = None, complexity: Optional[str] = None,
+               pending: Optional[bool] = None) -> List[Dict]:
+        """Entries matching every given criterion, in path order."""
+        return [
+            entry for entry in self.entries.values()
+            if (category is None or entry["category"] == category)
+            and (complexity is None or entry["header"]["complexity"].split()[:1] == [complexity])
+            and (pending is None or entry["is_pending"] == pending)
+        ]
+
+    def by_category(self) -> Dict[str, List[str]]:
+        """Category -> query names, including pending as its own category."""
+        categories = {}
+        for entry in self.entries.values():
+            categories.setdefault(entry["category"], []).append(entry["name"])
+        return categories
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="List queries from the indexed query catalog")
+    parser.add_argument("--query-dir", default="queries", help="Directory containing query files")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST_PATH, help="Cached manifest JSON")
+    parser.add_argument("--category", help="Only queries in this category")
+    parser.add_argument("--complexity", choices=["Low", "Medium", "High"], help="Only queries of this tier")
+    parser.add_argument("--pending", action="store_true", help="Only pending queries")
+    parser.add_argument("--production", action="store_true", help="Only production queries")
+    parser.add_argument("--json", action="store_true", help="Print matching entries as JSON")
+
+    args = parser.parse_args()
+
+    catalog = QueryCatalog(args.query_dir, args.manifest)
+    pending = True if args.pending else False if args.production else None
+    entries = catalog.filter(args.category, args.complexity, pending)
+
+    if args.json:
+        print(json.dumps(entries, indent=2))
+        return 0
+
+    print(f"{'Query':<55} {'Category':<20} {'Complexity':<11} {'Estimated Cost':<16} Bytes Scanned")
+    for entry in entries:
+        header = entry["header"]
+        print(f"{entry['name']:<55} {entry['category']:<20} {header['complexity']:<11} "
+              f"{header['estimated_cost']:<16} {header['bytes_scanned']}")
+    print(f"\n{len(entries)} of {len(catalog.entries)} queries")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
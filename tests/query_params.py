@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Native query parameters for parameterized queries
+
+Parameterized queries declare their parameters in the header and reference
+them as BigQuery named parameters (@name) instead of hand-substituted
+<placeholders>:
+
+    -- Parameters:
+    --   @slide_id STRING: ContainerIdentifier value
+    --   Example: C3N-03928-22
+
+    WHERE ContainerIdentifier = @slide_id
+
+Values are bound as query parameters, so they are never spliced into SQL.
+In batch mode a single parameter takes a list of values and runs as one job:
+`column = @name` becomes `column IN UNNEST(@name)` and the column is added to
+the output as `name`, so each row can be matched back to its input value.
+Looking up N values then scans the table once instead of N times.
+"""
+
+import csv
+import json
+import re
+import sys
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sql_utils import CODE, masked_code, paren_depths, scan_sql
+
+# `--   @name TYPE: description` in the Parameters section of the header
+PARAMETER_DECLARATION_PATTERN = re.compile(r"^--\s*@(\w+)\s+([A-Z][A-Z0-9_]*)\s*:\s*(.*)$")
+# `--   Example: value` following a declaration
+PARAMETER_EXAMPLE_PATTERN = re.compile(r"^--\s*Example:\s*(.*?)\s*$")
+
+# Clauses that end a WHERE condition, and set operators that combine SELECTs (at the same depth)
+WHERE_CLAUSE_END = re.compile(r"\b(GROUP\s+BY|HAVING|QUALIFY|WINDOW|ORDER\s+BY|LIMIT|UNION|INTERSECT|EXCEPT\s+DISTINCT)\b",
+                              re.IGNORECASE)
+SET_OPERATOR = re.compile(r"\b(UNION|INTERSECT|EXCEPT\s+DISTINCT)\b", re.IGNORECASE)
+
+# Placeholder values used to dry run a query whose parameters have no example
+TYPE_DEFAULTS = {"STRING": "", "INT64": 0, "FLOAT64": 0.0, "NUMERIC": 0, "BOOL": False}
+
+
+def parse_parameters(content: str) -> List[Dict]:
+    """
+    Read parameter declarations from a query header.
+
+    Returns: list of {name, type, description, example} in declaration order
+    """
+    parameters = []
+    for line in content.split("\n"):
+        if line.strip() and not line.startswith("--"):
+            break  # End of header
+        declaration = PARAMETER_DECLARATION_PATTERN.match(line)
+        if declaration:
+            name, type_, description = declaration.groups()
+            parameters.append({"name": name, "type": type_, "description": description, "example": None})
+            continue
+        example = PARAMETER_EXAMPLE_PATTERN.match(line)
+        if example and parameters and parameters[-1]["example"] is None:
+            parameters[-1]["example"] = convert_value(example.group(1), parameters[-1]["type"])
+    return parameters
+
+
+def convert_value(text: str, type_: str):
+    """Convert a value given as text to the Python type bound for a BigQuery type."""
+    if type_ in ("INT64", "INTEGER"):
+        return int(text)
+    if type_ in ("FLOAT64", "FLOAT", "NUMERIC"):
+        return float(text)
+    if type_ in ("BOOL", "BOOLEAN"):
+        return text.strip().lower() in ("true", "1", "yes")
+    return text
+
+
+def scalar_parameter(name: str, type_: str, value):
+    # Plain namespaces stand in when google-cloud-bigquery is not installed (e.g. local backend)
+    from query_catalog import load_bigquery
+    bigquery = load_bigquery()
+    if bigquery is None:
+        return SimpleNamespace(name=name, type_=type_, value=value)
+    return bigquery.ScalarQueryParameter(name, type_, value)
+
+
+def array_parameter(name: str, type_: str, values: List):
+    from query_catalog import load_bigquery
+    bigquery = load_bigquery()
+    if bigquery is None:
+        return SimpleNamespace(name=name, array_type=type_, values=values)
+    return bigquery.ArrayQueryParameter(name, type_, values)
+
+
+def bind_parameters(declared: List[Dict], values: Optional[Dict] = None, batch: Optional[str] = None) -> List:
+    """
+    Build query parameters for a query.
+
+    Args:
+        declared: Parameters from parse_parameters
+        values: Parameter name -> value; missing values fall back to the header example,
+                then a type default, so the query can always be dry run
+        batch: Name of the parameter bound as an array of values (batch mode)
+
+    Returns: list of ScalarQueryParameter / ArrayQueryParameter
+    """
+    values = values or {}
+    parameters = []
+    for parameter in declared:
+        name, type_ = parameter["name"], parameter["type"]
+        if name == batch:
+            parameters.append(array_parameter(name, type_, list(values.get(name, []))))
+            continue
+        value = values.get(name, parameter["example"])
+        if value is None:
+            value = TYPE_DEFAULTS.get(type_)
+        parameters.append(scalar_parameter(name, type_, value))
+    return parameters
+
+
+def example_parameters(content: str) -> List:
+    """Query parameters bound to header examples (or type defaults), e.g. for regression tests."""
+    return bind_parameters(parse_parameters(content))
+
+
+def batch_sql(content: str, name: str) -> str:
+    """
+    Rewrite a query to take an array of values for parameter `name`.
+
+    Every `expression = @name` becomes `expression IN UNNEST(@name)`, and the
+    top-level SELECT list (after any WITH clause) gains `expression AS name` so
+    rows can be matched to values. Each comparison must be an AND-ed condition of
+    the top-level WHERE clause: under OR or NOT, rows it does not select would be
+    tagged with a value they never matched.
+
+    Raises: ValueError if a comparison with @name is not such a condition, or the
+    query aggregates or combines several SELECTs
+    """
+    comparison = re.compile(r"([\w.`\[\]()]+)\s*=\s*@" + re.escape(name) + r"\b")
+    code = masked_code(content)
+    depths = paren_depths(code)
+    matches = list(comparison.finditer(code))
+    if not matches:
+        raise ValueError(f"No `column = @{name}` comparison to batch")
+    if re.search(r"\bGROUP\s+BY\b", code, re.IGNORECASE):
+        raise ValueError("Batch mode does not support queries with GROUP BY")
+    if any(depths[m.start()] == 0 for m in SET_OPERATOR.finditer(code)):
+        raise ValueError("Batch mode does not support UNION, INTERSECT or EXCEPT queries")
+    select = next(
+        (m for m in re.finditer(r"\bSELECT\b(\s+DISTINCT\b)?", code, re.IGNORECASE) if depths[m.start()] == 0),
+        None
+    )
+    if select is None:
+        raise ValueError("No top-level SELECT to add the batched column to")
+
+    def operand_start(m) -> int:
+        # The pattern also takes a parenthesis that opens the condition, e.g. `(a = @name OR ...`
+        start = m.start(1)
+        while code[start] == "(" and code.count("(", start, m.end(1)) > code.count(")", start, m.end(1)):
+            start += 1
+        return start
+
+    where = top_level_where(code, depths)
+    for m in matches:
+        if where is None or not is_where_conjunct(code, depths, where, operand_start(m), m.end()):
+            raise ValueError(f"Batch mode needs each `column = @{name}` to be an AND-ed condition "
+                             f"of the top-level WHERE clause (not under OR or NOT, or in a CTE or subquery)")
+
+    first = matches[0]
+    expression = content[operand_start(first):first.end(1)]
+    # (start, end, replacement), applied back to front so earlier offsets stay valid
+    edits = [
+        (operand_start(m), m.end(), f"{content[operand_start(m):m.end(1)]} IN UNNEST(@{name})") for m in matches
+    ]
+    # Output the batched column first, so rows can be matched to values
+    edits.append((select.end(), select.end(), f" {expression} AS {name},"))
+    for start, end, replacement in sorted(edits, reverse=True):
+        content = content[:start] + replacement + content[end:]
+    return content
+
+
+def top_level_where(code: str, depths: List[int]) -> Optional[Tuple[int, int]]:
+    """(start, end) of the condition of the top-level WHERE clause in masked code, or None."""
+    where = next(
+        (m for m in re.finditer(r"\bWHERE\b", code, re.IGNORECASE) if depths[m.start()] == 0), None
+    )
+    if where is None:
+        return None
+    clause_end = next(
+        (m.start() for m in WHERE_CLAUSE_END.finditer(code, where.end()) if depths[m.start()] == 0), len(code)
+    )
+    return where.end(), clause_end
+
+
+def is_where_conjunct(code: str, depths: List[int], where: Tuple[int, int], start: int, end: int) -> bool:
+    """Whether code[start:end] is one of the AND-ed conditions of the WHERE condition code[where[0]:where[1]]."""
+    where_start, where_end = where
+    if not where_start <= start < end <= where_end or depths[start] != 0:
+        return False
+    condition = code[where_start:where_end]
+    if any(depths[where_start + m.start()] == 0 for m in re.finditer(r"\bOR\b", condition, re.IGNORECASE)):
+        return False
+    preceding = code[where_start:start].split()
+    return not preceding or preceding[-1].upper() == "AND"
+
+
+def sql_literal(value) -> str:
+    """BigQuery literal for a bound parameter value."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def inline_parameters(sql: str, parameters: Iterable) -> str:
+    """Substitute bound parameters into SQL as literals, for engines without BigQuery parameters."""
+    literals = {}
+    for parameter in parameters:
+        if hasattr(parameter, "values"):
+            literals[parameter.name] = "[" + ", ".join(sql_literal(v) for v in parameter.values) + "]"
+        else:
+            literals[parameter.name] = sql_literal(parameter.value)
+
+    def substitute(match):
+        return literals.get(match.group(1), match.group(0))
+
+    return "".join(
+        re.sub(r"@(\w+)", substitute, text) if kind == CODE else text
+        for kind, text in scan_sql(sql)
+    )
+
+
+def main():
+    import argparse
+    import os
+
+    from query_catalog import make_job_config
+    from run_regression_tests import QueryTestRunner
+
+    parser = argparse.ArgumentParser(description="Run a parameterized query with bound query parameters")
+    parser.add_argument("query", help="Path to a .sql file declaring @parameters in its header")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=VALUE",
+                        help="Value for a scalar parameter (repeatable)")
+    parser.add_argument("--batch", metavar="NAME", help="Parameter to bind as an array of values")
+    parser.add_argument("--values-file", help="Batch values, one per line (default: stdin)")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Values per job in batch mode")
+    parser.add_argument("--output", help="Write rows as CSV (default: JSON lines to stdout)")
+    parser.add_argument("--credentials", help="Path to GCP service account JSON (or use GCP_SA_KEY env)")
+
+    args = parser.parse_args()
+
+    with open(args.query) as f:
+        content = f.read()
+    declared = parse_parameters(content)
+    types = {p["name"]: p["type"] for p in declared}
+
+    values = {}
+    for assignment in args.param:
+        name, _, text = assignment.partition("=")
+        if name not in types:
+            parser.error(f"{args.query} declares no parameter @{name}")
+        values[name] = convert_value(text, types[name])
+
+    sql = content
+    batches = [values]
+    if args.batch:
+        if args.batch not in types:
+            parser.error(f"{args.query} declares no parameter @{args.batch}")
+        try:
+            sql = batch_sql(content, args.batch)
+        except ValueError as e:
+            parser.error(f"{e}; run once per value with --param instead")
+        if args.values_file:
+            with open(args.values_file) as f:
+                lines = f.readlines()
+        else:
+            lines = sys.stdin.readlines()
+        batch_values = [convert_value(line.strip(), types[args.batch]) for line in lines if line.strip()]
+        batches = [
+            dict(values, **{args.batch: batch_values[i:i + args.batch_size]})
+            for i in range(0, len(batch_values), args.batch_size)
+        ]
+
+    runner = QueryTestRunner(args.credentials or os.getenv("GCP_SA_KEY"))
+    writer = None
+    output = open(args.output, "w", newline="") if args.output else None
+    row_count = 0
+    for batch_values in batches:
+        job_config = make_job_config(query_parameters=bind_parameters(declared, batch_values, args.batch))
+        rows = runner.call_with_backoff(lambda: runner.client.query(sql, job_config=job_config).result())
+        for row in rows:
+            row = dict(row)
+            if output is None:
+                print(json.dumps(row, default=str))
+            else:
+                if writer is None:
+                    writer = csv.DictWriter(output, fieldnames=list(row))
+                    writer.writeheader()
+                writer.writerow(row)
+            row_count += 1
+    if output is not None:
+        output.close()
+
+    print(f"✓ {row_count} rows from {len(batches)} job(s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Content-addressed caches of query results
+
+Results are keyed by a hash of the normalized SQL (comments and formatting
+ignored) plus the IDC release that `idc_current` resolves to, so a query is
+only re-run when its SQL or the underlying data release changes.
+
+ResultCache holds regression test results (status, row counts, stats) as
+JSON. ParquetResultCache holds the result rows themselves, for analysts
+re-running catalog queries (see catalog_query.py).
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from sql_utils import normalize_sql
+
+
+class ResultCache:
+    def __init__(self, cache_dir: str, ttl_seconds: float = 7 * 24 * 3600,
+                 max_size_bytes: int = 50 * 1024 ** 2):
+        """
+        Initialize cache.
+
+        Args:
+            cache_dir: Directory holding one JSON file per cached result
+            ttl_seconds: Entries older than this are treated as misses and evicted
+            max_size_bytes: Least recently used entries are evicted above this total size
+        """
+        self.cache_dir = Path(cache_dir)
+        self.ttl_seconds = ttl_seconds
+        self.max_size_bytes = max_size_bytes
+
+    @staticmethod
+    def make_key(query_content: str, idc_version: str, *extra: str) -> str:
+        """Build cache key from normalized SQL, IDC release and any execution settings."""
+        digest = hashlib.sha256()
+        for part in (normalize_sql(query_content), str(idc_version)) + tuple(str(e) for e in extra):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return cached result for key, or None if missing or expired."""
+        path = self._entry_path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if time.time() - entry.get("created", 0) > self.ttl_seconds:
+            path.unlink(missing_ok=True)
+            return None
+
+        # Touch the file so eviction treats it as recently used
+        os.utime(path)
+        return entry["result"]
+
+    def put(self, key: str, result: Dict) -> None:
+        """Store result under key, replacing any existing entry atomically."""
+        path = self._entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"created": time.time(), "result": result}, f)
+        os.replace(tmp_path, path)
+
+    def evict(self) -> int:
+        """
+        Remove expired entries, then least recently used ones until under max size.
+
+        Returns: number of entries removed
+        """
+        if not self.cache_dir.exists():
+            return 0
+
+        now = time.time()
+        entries = []
+        removed = 0
+        for path in self.cache_dir.rglob("*.json"):
+            stat = path.stat()
+            try:
+                with open(path) as f:
+                    created = json.load(f).get("created", 0)
+            except (OSError, ValueError):
+                created = 0
+            if now - created > self.ttl_seconds:
+                path.unlink(missing_ok=True)
+                removed += 1
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total_size <= self.max_size_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= size
+            removed += 1
+
+        return removed
+
+
+class ParquetResultCache:
+    def __init__(self, cache_dir: str, max_size_bytes: int = 2 * 1024 ** 3):
+        """
+        Initialize cache.
+
+        Args:
+            cache_dir: Directory holding one Parquet file per cached result
+            max_size_bytes: Least recently used results are evicted above this total size
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_size_bytes = max_size_bytes
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.parquet"
+
+    def get(self, key: str):
+        """Return the cached result for key as a memory-mapped pyarrow Table, or None if missing."""
+        import pyarrow.parquet as pq
+
+        path = self._entry_path(key)
+        if not path.exists():
+            return None
+        try:
+            table = pq.read_table(path, memory_map=True)
+        except OSError:
+            return None
+        # Touch the file so eviction treats it as recently used
+        os.utime(path)
+        return table
+
+    def put(self, key: str, batches: Iterable) -> bool:
+        """
+        Stream Arrow record batches into the entry for key, replacing any existing entry atomically.
+
+        Empty results are stored too, as long as a batch (even an empty one) carries their schema.
+
+        Returns: whether an entry was stored (False if there were no batches at all)
+        """
+        from export_query_results import StreamingExporter
+
+        path = self._entry_path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        StreamingExporter(str(tmp_path)).write(batches)
+        if not tmp_path.exists():
+            return False
+        os.replace(tmp_path, path)
+        return True
+
+    def evict(self, keep: Iterable[str] = ()) -> int:
+        """
+        Remove least recently used entries until under max size.
+
+        Args:
+            keep: Keys never removed, e.g. a result just stored and about to be read
+
+        Returns: number of entries removed
+        """
+        if not self.cache_dir.exists():
+            return 0
+
+        entries = []
+        kept = {self._entry_path(key) for key in keep}
+        for path in self.cache_dir.rglob("*.parquet"):
+            if path in kept:
+                continue
+            stat = path.stat()
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        removed = 0
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total_size <= self.max_size_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= size
+            removed += 1
+
+        return removed
@@ -0,0 +1,145 @@
+"""
+Order-insensitive fingerprints of query results
+
+A fingerprint is built while streaming the result, one row or one Arrow
+record batch at a time, so memory stays bounded by a page however many rows
+the query returns. It holds:
+- the row count and column names
+- an order-insensitive content hash: the sum, modulo 2^128, of a hash of
+  each row (so duplicate rows count, and row order does not)
+- per-column summary stats: null count, and min/max of scalar values
+
+Floats are rounded to FLOAT_DIGITS significant digits before hashing, so
+aggregates that differ only in floating-point summation order still match.
+"""
+
+import hashlib
+import json
+from typing import Dict, Iterable, List, Optional
+
+FLOAT_DIGITS = 9
+
+HASH_MODULUS = 2 ** 128
+
+# Values of these types get min/max stats; anything else (arrays, structs, bytes) only null counts
+SCALAR_TYPES = (bool, int, float, str)
+
+# Longer string min/max values are truncated in the stored stats
+MAX_STAT_LENGTH = 100
+
+
+def canonical_value(value):
+    """JSON-serializable, run-independent form of a result value."""
+    if isinstance(value, float):
+        return float(f"{value:.{FLOAT_DIGITS}g}")
+    if isinstance(value, dict):
+        return {key: canonical_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonical_value(item) for item in value]
+    if isinstance(value, bytes):
+        return value.hex()
+    return value
+
+
+class ResultFingerprint:
+    def __init__(self):
+        self.row_count = 0
+        self.columns = None
+        self._sum = 0
+        self._stats = {}
+
+    def update_row(self, row: Dict) -> None:
+        if self.columns is None:
+            self.columns = sorted(row)
+            self._stats = {column: {"nulls": 0, "min": None, "max": None} for column in self.columns}
+        values = [canonical_value(row[column]) for column in self.columns]
+        encoded = json.dumps(values, default=str, separators=(",", ":")).encode("utf-8")
+        self._sum = (self._sum + int.from_bytes(hashlib.blake2b(encoded, digest_size=16).digest(), "big")) % HASH_MODULUS
+        self.row_count += 1
+
+        for column, value in zip(self.columns, values):
+            stats = self._stats[column]
+            if value is None:
+                stats["nulls"] += 1
+            elif isinstance(value, SCALAR_TYPES) and stats.get("comparable", True):
+                try:
+                    if stats["min"] is None or value < stats["min"]:
+                        stats["min"] = value
+                    if stats["max"] is None or value > stats["max"]:
+                        stats["max"] = value
+                except TypeError:
+                    # Mixed types in one column; stop tracking its range
+                    stats.update(min=None, max=None, comparable=False)
+
+    def update_rows(self, rows: Iterable) -> None:
+        """Add rows (dicts, or BigQuery Rows) from a row iterator, which fetches page by page."""
+        for row in rows:
+            self.update_row(dict(row.items()) if hasattr(row, "items") else dict(row))
+
+    def update_arrow_batch(self, batch) -> None:
+        """Add the rows of a pyarrow RecordBatch."""
+        for row in batch.to_pylist():
+            self.update_row(row)
+
+    def to_dict(self) -> Dict:
+        return {
+            "fingerprint": f"{self._sum:032x}",
+            "row_count": self.row_count,
+            "columns": {
+                column: {
+                    key: stats[key][:MAX_STAT_LENGTH] if isinstance(stats[key], str) else stats[key]
+                    for key in ("nulls", "min", "max")
+                }
+                for column, stats in self._stats.items()
+            },
+        }
+
+
+def fingerprint_result(rows, bqstorage_client=None) -> Dict:
+    """
+    Fingerprint a query result, streaming it.
+
+    Args:
+        rows: RowIterator from QueryJob.result()
+        bqstorage_client: Optional BigQuery Storage Read API client; with it, the result
+            is streamed as Arrow record batches
+
+    Returns: fingerprint dict (see ResultFingerprint.to_dict)
+    """
+    fingerprint = ResultFingerprint()
+    if bqstorage_client is not None and hasattr(rows, "to_arrow_iterable"):
+        for batch in rows.to_arrow_iterable(bqstorage_client=bqstorage_client):
+            fingerprint.update_arrow_batch(batch)
+    else:
+        fingerprint.update_rows(rows)
+    return fingerprint.to_dict()
+
+
+def diff_fingerprints(old: Dict, new: Dict) -> List[str]:
+    """Human-readable differences between two result fingerprints (empty if the results match)."""
+    if old["fingerprint"] == new["fingerprint"]:
+        return []
+    changes = []
+    if old["row_count"] != new["row_count"]:
+        changes.append(f"rows {old['row_count']} -> {new['row_count']}")
+    old_columns, new_columns = old["columns"], new["columns"]
+    added = sorted(set(new_columns) - set(old_columns))
+    removed = sorted(set(old_columns) - set(new_columns))
+    if added:
+        changes.append(f"added columns {', '.join(added)}")
+    if removed:
+        changes.append(f"removed columns {', '.join(removed)}")
+    for column in sorted(set(old_columns) & set(new_columns)):
+        for key in ("nulls", "min", "max"):
+            if old_columns[column][key] != new_columns[column][key]:
+                changes.append(f"{column}.{key} {old_columns[column][key]} -> {new_columns[column][key]}")
+    return changes or ["row contents changed"]
+
+
+def make_bqstorage_client(credentials=None) -> Optional[object]:
+    """BigQuery Storage Read API client, or None if google-cloud-bigquery-storage is not installed."""
+    try:
+        from google.cloud import bigquery_storage
+    except ImportError:
+        return None
+    return bigquery_storage.BigQueryReadClient(credentials=credentials)
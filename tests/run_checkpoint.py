@@ -0,0 +1,94 @@
+"""
+Checkpoint of a regression test run in progress
+
+Each finished query result is appended to a JSON lines file as soon as it is
+known, after a first line holding the run ID. A run that is killed can then
+be resumed with the same run ID: queries already in the checkpoint are not
+run again, and because execution job IDs are derived from the run ID and the
+SQL, jobs still running on BigQuery are reattached to rather than resubmitted.
+A job that failed (e.g. on a rate limit) keeps its ID, so it is resubmitted
+under a numbered retry ID, which is recorded in the checkpoint too.
+
+The checkpoint is removed when a run completes.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def job_id_for(run_id: str, sql: str, prefix: str = "idc_queries") -> str:
+    """Deterministic BigQuery job ID for executing sql within a run."""
+    return f"{prefix}_{run_id}_{content_hash(sql)[:20]}"
+
+
+def retry_job_id(job_id: str, attempt: int) -> str:
+    """Job ID of the attempt-th resubmission of job_id."""
+    return f"{job_id}_retry{attempt}"
+
+
+class RunCheckpoint:
+    def __init__(self, path: str = ".query_cache/checkpoint.jsonl"):
+        """
+        Args:
+            path: JSON lines checkpoint file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self) -> Tuple[Optional[str], Dict[str, Dict], Dict[str, int]]:
+        """
+        Read an interrupted run's checkpoint.
+
+        Returns: (run_id, query path -> {sha256, result}, job ID -> latest retry attempt),
+        or (None, {}, {}) if there is no checkpoint
+        """
+        if not os.path.exists(self.path):
+            return None, {}, {}
+        run_id = None
+        results = {}
+        attempts = {}
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Line cut short when the run was killed
+                if "run_id" in record:
+                    run_id = record["run_id"]
+                elif "result" in record:
+                    results[record["result"]["path"]] = record
+                elif "attempt" in record:
+                    attempts[record["job_id"]] = max(attempts.get(record["job_id"], 0), record["attempt"])
+        return run_id, results, attempts
+
+    def start(self, run_id: str) -> None:
+        """Begin a new checkpoint for run_id, discarding any previous one."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock, open(self.path, "w") as f:
+            f.write(json.dumps({"run_id": run_id}) + "\n")
+
+    def append(self, result: Dict, content: str) -> None:
+        """Record a finished result, with the hash of the query content it was run for."""
+        line = json.dumps({"sha256": content_hash(content), "result": result}, default=str)
+        with self._lock, open(self.path, "a") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def record_retry(self, job_id: str, attempt: int) -> None:
+        """Record that job_id is being resubmitted as retry_job_id(job_id, attempt)."""
+        with self._lock, open(self.path, "a") as f:
+            f.write(json.dumps({"job_id": job_id, "attempt": attempt}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
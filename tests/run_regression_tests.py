@@ -4,36 +4,140 @@ BigQuery Regression Test Runner
 Validates all queries by:
 1. Running dry run to check syntax and estimate cost
 2. Executing with LIMIT clause to ensure non-empty results
-3. Capturing execution stats (bytes scanned, estimated cost, execution time)
-4. Logging results to a markdown summary table
+3. Capturing execution stats (bytes scanned/billed, estimated cost, wall and slot
+   time, cache hits, shuffle/spill and a per-stage query plan breakdown)
+4. Logging results to a markdown summary table, with static lint findings
 """
 
 import os
 import json
+import random
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from pathlib import Path
 from typing import Dict, List, Tuple, Optional
 import yaml
 
-try:
-    from google.cloud import bigquery
-    from google.oauth2 import service_account
-except ImportError:
-    print("ERROR: google-cloud-bigquery not installed")
-    print("Install with: pip install google-cloud-bigquery google-auth")
-    sys.exit(1)
+from changed_queries import git_changed_files, select_changed_queries
+from compare_releases import CURRENT_DATASET, ReleaseComparison
+from cost_budget import MIN_BILLED_BYTES_PER_TABLE, CostBudget
+from cost_estimator import ColumnSizeCatalog, estimate_query_bytes
+from lint_queries import QueryLinter, lint_catalog
+from perf_history import PerformanceHistory, metric_value, percentile
+from query_catalog import QueryCatalog, load_bigquery, make_job_config, parse_header
+from query_params import bind_parameters, example_parameters
+from result_cache import ResultCache
+from result_fingerprint import fingerprint_result, make_bqstorage_client
+from run_checkpoint import RunCheckpoint, content_hash, job_id_for, retry_job_id
+from sample_tables import SampleBuilder
+from shard_queries import shard_paths
+from shared_scan import SharedScanBuilder, shared_tables
+from sql_utils import IDC_TABLE_PATTERN, has_limit_clause, referenced_tables, rewrite_table_refs
+from table_advisor import TableAdvisor, table_name
+
+
+# Statuses that depend only on the SQL and the data release, and so can be cached
+CACHEABLE_STATUSES = ("Pass", "Pending Review", "Empty Result")
+
+# Statuses for queries deliberately not run; reported, but not counted as failures
+SKIPPED_STATUSES = ("Skipped (Estimated Cost)", "Skipped (Tier Cap)", "Skipped (Budget)")
+
+# Status of a query the local backend cannot run because a table it reads has no fixture
+MISSING_FIXTURE_STATUS = "Missing Fixture"
+
+# Status of a query that passed its dry run and is waiting to be executed
+READY_STATUS = "Ready"
+
+# Error reasons BigQuery reports when too many jobs are submitted or running at once
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "jobRateLimitExceeded")
+
+
+def load_config(config_path: str) -> Dict:
+    """Load test configuration YAML, returning an empty dict if the file is missing."""
+    if not config_path or not os.path.exists(config_path):
+        return {}
+    with open(config_path) as f:
+        return yaml.safe_load(f) or {}
+
+
+def is_duplicate_job_error(error: Exception) -> bool:
+    """Check whether a job was rejected because a job with the same ID already exists."""
+    return getattr(error, "code", None) == 409 or "Already Exists" in str(error)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Check whether a BigQuery error is a transient rate-limit/concurrency error."""
+    if getattr(error, "code", None) == 429:
+        return True
+    for err in getattr(error, "errors", None) or []:
+        if isinstance(err, dict) and err.get("reason") in RATE_LIMIT_REASONS:
+            return True
+    return any(reason in str(error) for reason in RATE_LIMIT_REASONS)
 
 
 class QueryTestRunner:
-    def __init__(self, credentials_json: Optional[str] = None):
-        """Initialize BigQuery client with service account credentials."""
+    def __init__(self, credentials_json: Optional[str] = None, max_retries: int = 5,
+                 initial_backoff_seconds: float = 1.0, client=None):
+        """
+        Initialize BigQuery client with service account credentials.
+        
+        Args:
+            credentials_json: Path to service account JSON (default: application credentials)
+            max_retries: Retries for a job that hits a BigQuery rate limit
+            initial_backoff_seconds: First retry delay, doubled on each further retry
+            client: Pre-built client to use instead of BigQuery (e.g. local_engine.LocalClient)
+        """
         self.project_id = None
         self.client = None
         self.results = []
+        self.max_retries = max_retries
+        self.initial_backoff_seconds = initial_backoff_seconds
+        self.cache = None
+        self.refresh_cache = False
+        self.idc_version = None
+        # Source table -> replacement table used when executing (e.g. sample tables)
+        self.table_rewrites = {}
+        # Query content -> table map pointing it at shared-scan projections, and the
+        # bytes it would be billed without them (from its dry run)
+        self.shared_scans = {}
+        self.shared_scan_baseline_bytes = {}
+        self.shared_scan_materialized_bytes = 0
+        # Static cost estimation: queries estimated above max_estimated_bytes are not submitted
+        self.catalog = None
+        self.max_estimated_bytes = None
+        # Cheaper-source advisor; when set, safe rewrites are verified against the original results
+        self.rewrite_advisor = None
+        # Run budget, tier caps and maximum_bytes_billed guardrail for execution jobs
+        self.budget = None
+        # Historical performance store; each run is checked against it, then recorded
+        self.history = None
+        self.run_started = datetime.now()
+        self.run_id = self.run_started.strftime("%Y%m%dT%H%M%S")
+        # Stream full results into order-insensitive fingerprints (see result_fingerprint.py)
+        self.fingerprint_results = False
+        self.bqstorage_client = None
+        # Paths of the queries in this CI shard (None = all queries)
+        self.shard_paths = None
+        # Progress checkpoint, and results of an interrupted run being resumed (path -> record)
+        self.checkpoint = None
+        self.resumed = {}
+        # Deterministic job ID -> number of its latest resubmission after a failed attempt
+        self.job_attempts = {}
         
-        if credentials_json:
+        # google-cloud-bigquery is only imported when no other client is given
+        bigquery = load_bigquery() if client is None else None
+        if client is not None:
+            self.client = client
+            self.project_id = getattr(client, "project", None)
+        elif bigquery is None:
+            print("ERROR: google-cloud-bigquery not installed")
+            print("Install with: pip install google-cloud-bigquery google-auth")
+            print("Or run offline with: --backend local")
+            sys.exit(1)
+        elif credentials_json:
             try:
+                from google.oauth2 import service_account
                 credentials = service_account.Credentials.from_service_account_file(
                     credentials_json
                 )
@@ -55,59 +159,181 @@ class QueryTestRunner:
                 sys.exit(1)
 
     def load_queries(self, query_dir: str) -> Dict[str, Dict]:
-        """Load all .sql files from query directory, excluding pending."""
-        queries = {}
-        query_path = Path(query_dir)
-        
-        for sql_file in query_path.rglob("*.sql"):
-            # Skip pending folder for execution testing
-            if "pending" in str(sql_file):
-                category = "pending"
-            else:
-                # Extract category from folder structure
-                relative = sql_file.relative_to(query_path)
-                parts = relative.parts[:-1]  # Exclude filename
-                category = parts[0] if parts else "root"
-            
-            with open(sql_file, "r") as f:
-                query_content = f.read()
-            
-            query_name = sql_file.stem
-            queries[str(sql_file)] = {
-                "name": query_name,
-                "category": category,
-                "path": str(sql_file),
-                "content": query_content,
-                "is_pending": category == "pending"
+        """Load all .sql files from query directory, with headers from the indexed query catalog."""
+        catalog = QueryCatalog(query_dir)
+        return {
+            path: {
+                "name": entry["name"],
+                "category": entry["category"],
+                "path": path,
+                "content": catalog.content(path),
+                "is_pending": entry["is_pending"],
+                "header": entry["header"],
             }
-        
-        return queries
+            for path, entry in catalog.entries.items()
+        }
 
     def extract_complexity(self, content: str) -> str:
         """Extract complexity from query header comments."""
-        for line in content.split("\n")[:10]:
-            if "Complexity:" in line:
-                # Extract: "Complexity: Low" -> "Low"
-                return line.split("Complexity:")[1].strip().split("|")[0].strip()
-        return "Unknown"
+        return parse_header(content)["complexity"]
 
     def extract_estimated_cost(self, content: str) -> str:
         """Extract estimated cost from query header comments."""
-        for line in content.split("\n")[:10]:
-            if "Estimated Cost:" in line:
-                # Extract estimated cost before "|"
-                return line.split("Estimated Cost:")[1].strip().split("|")[0].strip()
-        return "TBD"
+        return parse_header(content)["estimated_cost"]
+
+    def resolve_idc_version(self) -> Optional[str]:
+        """Return the IDC release that idc_current currently points to, or None if unavailable."""
+        query = "SELECT MAX(idc_version) AS idc_version FROM `bigquery-public-data.idc_current.version_metadata`"
+        try:
+            rows = list(self.call_with_backoff(lambda: self.client.query(query).result()))
+            return str(rows[0]["idc_version"]) if rows else None
+        except Exception as e:
+            print(f"WARNING: Could not resolve idc_current version: {e}")
+            return None
+
+    def enable_cache(self, cache: ResultCache, refresh: bool = False) -> bool:
+        """
+        Enable the result cache for this runner.
+        
+        The cache is keyed by IDC release, so it stays disabled if the release
+        cannot be resolved. With refresh=True, cached results are ignored but
+        fresh results are still written back.
+        
+        Returns: whether the cache was enabled
+        """
+        self.idc_version = self.resolve_idc_version()
+        if self.idc_version is None:
+            print("WARNING: Result cache disabled")
+            return False
+        self.cache = cache
+        self.refresh_cache = refresh
+        return True
+
+    def cache_key(self, query_info: Dict) -> str:
+        """Cache key for a query under the current IDC release and execution mode."""
+        return self.cache.make_key(
+            query_info["content"], self.idc_version, query_info["is_pending"],
+            sorted(self.table_rewrites.items()), self.fingerprint_results
+        )
+
+    def enable_fingerprints(self) -> None:
+        """
+        Execute queries without the test LIMIT and fingerprint their full results.
+        
+        Results are streamed as Arrow batches through the BigQuery Storage Read API
+        when google-cloud-bigquery-storage is installed, else page by page.
+        """
+        self.fingerprint_results = True
+        credentials = getattr(self.client, "_credentials", None)
+        if credentials is not None:
+            self.bqstorage_client = make_bqstorage_client(credentials)
+
+    def enable_checkpoint(self, checkpoint: RunCheckpoint, resume: bool = False) -> None:
+        """
+        Checkpoint each result as it finishes.
+        
+        With resume=True, an interrupted run's checkpoint is picked up: its run ID is
+        reused, so execution jobs get the same IDs, and its finished queries are skipped
+        (except those skipped by the budget or failed, which run again).
+        """
+        self.checkpoint = checkpoint
+        if resume:
+            run_id, records, attempts = checkpoint.load()
+            if run_id is not None:
+                self.run_id = run_id
+                self.resumed = records
+                self.job_attempts = attempts
+                print(f"Resuming run {run_id} with {len(records)} finished queries")
+                return
+            print("WARNING: No checkpoint to resume from; starting a new run")
+        checkpoint.start(self.run_id)
+
+    def save_progress(self, query_info: Dict, result: Dict) -> None:
+        if self.checkpoint is not None:
+            self.checkpoint.append(result, query_info["content"])
+
+    def enable_sampling(self, builder: SampleBuilder, queries: Dict[str, Dict]) -> None:
+        """Materialize samples of the tables referenced by queries and execute against them."""
+        tables = set()
+        for query_info in queries.values():
+            tables.update(referenced_tables(query_info["content"]))
+        if self.idc_version is None:
+            self.idc_version = self.resolve_idc_version()
+        self.table_rewrites.update(builder.build(tables, self.idc_version))
+
+    def enable_shared_scan(self, builder: SharedScanBuilder, queries: Dict[str, Dict]) -> None:
+        """
+        Materialize shared projections of the tables the given queries have in common.
+        
+        Each query using a projection is dry run against it; one that fails keeps
+        reading the original tables.
+        """
+        contents = [q["content"] for q in queries.values() if not q["is_pending"]]
+        tables = set()
+        for content in contents:
+            tables.update(t for t in referenced_tables(content) if IDC_TABLE_PATTERN.match(t))
+        catalog = self.catalog if self.catalog is not None else builder.schema_catalog(tables)
+        if self.idc_version is None:
+            self.idc_version = self.resolve_idc_version()
+        
+        projections = builder.build(builder.plan(contents, catalog), self.table_rewrites, self.idc_version)
+        self.shared_scan_materialized_bytes += builder.materialized_bytes_billed
+        if self.budget is not None:
+            self.budget.charge(builder.materialized_bytes_billed)
+        
+        table_map = dict(self.table_rewrites, **projections)
+        for content in contents:
+            if not shared_tables(content, projections):
+                continue
+            baseline_sql = self.execution_sql(content)
+            parameters = example_parameters(content)
+            shared_ok, _, _, shared_error = self.run_dry_run(
+                rewrite_table_refs(content, table_map), parameters
+            )
+            baseline_ok, baseline_bytes, _, _ = self.run_dry_run(baseline_sql, parameters)
+            if shared_ok and baseline_ok:
+                self.shared_scans[content] = table_map
+                # Billed bytes are never below the per-table minimum
+                self.shared_scan_baseline_bytes[content] = max(
+                    baseline_bytes, MIN_BILLED_BYTES_PER_TABLE * len(referenced_tables(content))
+                )
+            elif baseline_ok:
+                print(f"  WARNING: not using shared scan for a query that fails against it: {shared_error[:80]}")
 
-    def run_dry_run(self, query_content: str) -> Tuple[bool, Optional[int], Optional[float], str]:
+    def execution_sql(self, query_content: str) -> str:
+        """SQL actually executed for a query, with any table rewrites applied."""
+        table_map = self.shared_scans.get(query_content, self.table_rewrites)
+        if not table_map:
+            return query_content
+        return rewrite_table_refs(query_content, table_map)
+
+    def call_with_backoff(self, func, *args, **kwargs):
+        """
+        Call func, retrying with exponential backoff and jitter on rate-limit errors.
+        
+        Any other error, or a rate-limit error after max_retries, is re-raised.
+        """
+        delay = self.initial_backoff_seconds
+        for attempt in range(self.max_retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.max_retries or not is_rate_limit_error(e):
+                    raise
+                time.sleep(delay + random.uniform(0, delay))
+                delay *= 2
+
+    def run_dry_run(self, query_content: str, query_parameters: Optional[List] = None) -> Tuple[bool, Optional[int], Optional[float], str]:
         """
         Execute dry run to validate syntax and estimate cost.
         
         Returns: (success, bytes_scanned, estimated_cost_usd, error_message)
         """
         try:
-            job_config = bigquery.QueryJobConfig(dry_run=True)
-            query_job = self.client.query(query_content, job_config=job_config)
+            job_config = make_job_config(dry_run=True, query_parameters=query_parameters or [])
+            query_job = self.call_with_backoff(
+                self.client.query, query_content, job_config=job_config
+            )
             
             # Dry run doesn't execute, but returns stats
             bytes_scanned = query_job.total_bytes_processed or 0
@@ -117,69 +343,351 @@ class QueryTestRunner:
         except Exception as e:
             return False, None, None, str(e)
 
-    def run_query_with_limit(self, query_content: str, limit: int = 1000) -> Tuple[bool, int, Optional[int], Optional[float], str]:
+    def collect_job_stats(self, query_job, wall_time_ms: float) -> Dict:
+        """
+        Collect performance telemetry from a finished query job.
+        
+        Returns: dict with wall/elapsed time, slot time, cache hit, bytes billed,
+        shuffle/spill totals and a per-stage breakdown of the query plan
+        """
+        started = getattr(query_job, "started", None)
+        ended = getattr(query_job, "ended", None)
+        elapsed_ms = getattr(query_job, "elapsed_ms", None)
+        if started and ended:
+            elapsed_ms = (ended - started).total_seconds() * 1000
+        
+        stages = []
+        for entry in getattr(query_job, "query_plan", None) or []:
+            steps = "; ".join(
+                f"{step.kind}: {', '.join(step.substeps)}" for step in (entry.steps or [])
+            )
+            stages.append({
+                "name": entry.name,
+                "slot_ms": entry.slot_ms or 0,
+                "records_read": entry.records_read or 0,
+                "records_written": entry.records_written or 0,
+                "shuffle_output_bytes": entry.shuffle_output_bytes or 0,
+                "shuffle_output_bytes_spilled": entry.shuffle_output_bytes_spilled or 0,
+                "steps": steps[:300],
+            })
+        top_stage = max(stages, key=lambda stage: stage["slot_ms"]) if stages else None
+        
+        return {
+            "wall_time_ms": round(wall_time_ms, 1),
+            "elapsed_ms": round(elapsed_ms, 1) if elapsed_ms is not None else None,
+            "total_slot_ms": getattr(query_job, "slot_millis", None),
+            "cache_hit": bool(getattr(query_job, "cache_hit", False)),
+            "bytes_billed": getattr(query_job, "total_bytes_billed", None) or 0,
+            "shuffle_bytes": sum(stage["shuffle_output_bytes"] for stage in stages),
+            "spilled_bytes": sum(stage["shuffle_output_bytes_spilled"] for stage in stages),
+            "stages": stages,
+            "top_stage": top_stage["name"] if top_stage else None,
+            "top_stage_steps": top_stage["steps"] if top_stage else None,
+        }
+
+    def run_query_with_limit(self, query_content: str, limit: int = 1000,
+                             maximum_bytes_billed: Optional[int] = None,
+                             query_parameters: Optional[List] = None,
+                             job_id: Optional[str] = None,
+                             fingerprint: bool = False,
+                             use_query_cache: bool = True) -> Tuple[bool, int, Optional[int], Optional[float], str, Dict]:
         """
         Execute query with LIMIT clause.
         
-        Returns: (success, row_count, bytes_scanned, estimated_cost_usd, error_message)
+        With fingerprint=True, no LIMIT is added (a LIMIT without ORDER BY returns
+        arbitrary rows) and the full result is streamed into job_stats["result_fingerprint"].
+        
+        If maximum_bytes_billed is set, BigQuery fails the job rather than bill more than that.
+        query_parameters are bound to the query's @parameters. If a job with job_id
+        already exists (e.g. from an interrupted run), it is reattached to instead,
+        unless it failed: a failed job cannot be rerun, so it is resubmitted under
+        a retry ID (recorded in the checkpoint, for --resume).
+        With use_query_cache=False, BigQuery runs the query even if it has cached results.
+        
+        Returns: (success, row_count, bytes_scanned, estimated_cost_usd, error_message, job_stats)
         """
         try:
-            # Append LIMIT if not already present
-            if "LIMIT" not in query_content.upper():
+            # Append LIMIT if the statement does not already end in one
+            if not fingerprint and not has_limit_clause(query_content):
                 query_to_run = f"{query_content}\nLIMIT {limit}"
             else:
                 query_to_run = query_content
             
-            query_job = self.client.query(query_to_run)
-            result = query_job.result()
+            job_config = make_job_config(
+                maximum_bytes_billed=maximum_bytes_billed, query_parameters=query_parameters or [],
+                use_query_cache=use_query_cache
+            )
+            
+            attempt = {"number": self.job_attempts.get(job_id, 0)}
+            
+            def current_job_id():
+                if job_id is None or attempt["number"] == 0:
+                    return job_id
+                return retry_job_id(job_id, attempt["number"])
+            
+            def next_attempt():
+                attempt["number"] += 1
+                self.job_attempts[job_id] = attempt["number"]
+                if self.checkpoint is not None:
+                    self.checkpoint.record_retry(job_id, attempt["number"])
+            
+            def submit_and_wait():
+                # A job rejected for rate limits has to be resubmitted as a whole
+                start = time.perf_counter()
+                while True:
+                    try:
+                        job = self.client.query(query_to_run, job_config=job_config, job_id=current_job_id())
+                        break
+                    except Exception as e:
+                        if job_id is None or not is_duplicate_job_error(e):
+                            raise
+                    job = self.client.get_job(current_job_id())
+                    # Reattach to a job that is running or succeeded; one that failed needs a new ID
+                    if not (job.state == "DONE" and getattr(job, "error_result", None)):
+                        break
+                    next_attempt()
+                try:
+                    rows = job.result()
+                except Exception:
+                    if job_id is not None:
+                        next_attempt()
+                    raise
+                return job, rows, (time.perf_counter() - start) * 1000
+            
+            query_job, result, wall_time_ms = self.call_with_backoff(submit_and_wait)
             
             row_count = result.total_rows
             bytes_scanned = query_job.total_bytes_processed or 0
             estimated_cost = (bytes_scanned / (1024 ** 4)) * 6.25
             
-            return True, row_count, bytes_scanned, estimated_cost, ""
+            job_stats = self.collect_job_stats(query_job, wall_time_ms)
+            if fingerprint:
+                job_stats["result_fingerprint"] = fingerprint_result(result, self.bqstorage_client)
+            return True, row_count, bytes_scanned, estimated_cost, "", job_stats
         except Exception as e:
-            return False, 0, None, None, str(e)
+            return False, 0, None, None, str(e), {}
+
+    def verify_rewrite(self, query_info: Dict, result: Dict) -> None:
+        """
+        Run a query and its cheaper-source rewrite in full and compare their result fingerprints.
+        
+        Sets result["table_rewrite"] to {replacements, original_bytes, rewritten_bytes,
+        identical, error}, if the advisor has a safe rewrite for the query.
+        """
+        content = query_info["content"]
+        advice = self.rewrite_advisor.advise(content)
+        rewritten = self.rewrite_advisor.rewrite(content, advice)
+        if rewritten is None:
+            return
+        parameters = bind_parameters(query_info["header"]["parameters"])
+        verification = {
+            "replacements": {a["table"]: a["replacement"][0] for a in advice if a["safe"]},
+            "original_bytes": None,
+            "rewritten_bytes": None,
+            "identical": None,
+            "error": "",
+        }
+        result["table_rewrite"] = verification
+        fingerprints = []
+        for sql, key in ((content, "original_bytes"), (rewritten, "rewritten_bytes")):
+            dry_run_ok, dry_run_bytes, _, dry_error = self.run_dry_run(sql, parameters)
+            if not dry_run_ok:
+                verification["error"] = dry_error
+                return
+            # Both run in full, so each is capped and reserved like any other execution job
+            maximum_bytes_billed, skip_status = self.reserve_execution(
+                sql, query_info["header"]["complexity"], dry_run_bytes
+            )
+            if skip_status is not None:
+                verification["error"] = skip_status
+                return
+            exec_ok, _, bytes_scanned, _, exec_error, job_stats = self.run_query_with_limit(
+                sql, maximum_bytes_billed=maximum_bytes_billed, query_parameters=parameters,
+                fingerprint=True, use_query_cache=False
+            )
+            if self.budget is not None:
+                self.budget.settle(maximum_bytes_billed, job_stats.get("bytes_billed", 0))
+            if not exec_ok:
+                verification["error"] = exec_error
+                return
+            verification[key] = bytes_scanned
+            fingerprints.append(job_stats["result_fingerprint"]["fingerprint"])
+        verification["identical"] = fingerprints[0] == fingerprints[1]
+
+    def cached_result(self, query_info: Dict) -> Optional[Dict]:
+        """Cached result for a query, or None if the cache is disabled, refreshing or has no entry."""
+        if self.cache is None or self.refresh_cache:
+            return None
+        cached = self.cache.get(self.cache_key(query_info))
+        if cached is not None:
+            # Header metadata is not part of the key, so refresh it from the current file
+            cached.update({
+                "name": query_info["name"],
+                "category": query_info["category"],
+                "path": query_info["path"],
+                "complexity": query_info["header"]["complexity"],
+                "estimated_cost_header": query_info["header"]["estimated_cost"],
+                "cached": True,
+                "perf_regressions": [],
+                "result_changes": [],
+            })
+        return cached
 
     def test_query(self, query_info: Dict) -> Dict:
+        """Run full test cycle for a query, reusing a cached result when the cache is enabled."""
+        return self.finish_query(query_info, self.plan_query(query_info))
+
+    def plan_query(self, query_info: Dict) -> Dict:
+        """First half of a test: the cached result if there is one, else static estimate and dry run."""
+        cached = self.cached_result(query_info)
+        if cached is not None:
+            return cached
+        return self.run_dry_run_phase(query_info)
+
+    def finish_query(self, query_info: Dict, result: Dict) -> Dict:
+        """Second half of a test: execute a query that passed its dry run, then cache and checkpoint the result."""
+        if result["status"] == READY_STATUS:
+            result = self.run_execution_phase(query_info, result)
+            if self.cache is not None and result["status"] in CACHEABLE_STATUSES:
+                self.cache.put(self.cache_key(query_info), result)
+        self.save_progress(query_info, result)
+        return result
+
+    def run_test_cycle(self, query_info: Dict) -> Dict:
         """Run full test cycle for a query: dry run -> execution -> capture stats."""
+        result = self.run_dry_run_phase(query_info)
+        if result["status"] != READY_STATUS:
+            return result
+        return self.run_execution_phase(query_info, result)
+
+    def run_dry_run_phase(self, query_info: Dict) -> Dict:
+        """
+        Static estimate and dry run for a query.
+        
+        Returns: result dict, with status READY_STATUS if the query should now be executed
+        """
         result = {
             "name": query_info["name"],
             "category": query_info["category"],
             "path": query_info["path"],
             "is_pending": query_info["is_pending"],
-            "complexity": self.extract_complexity(query_info["content"]),
-            "estimated_cost_header": self.extract_estimated_cost(query_info["content"]),
+            "complexity": query_info["header"]["complexity"],
+            "estimated_cost_header": query_info["header"]["estimated_cost"],
             "dry_run_success": False,
             "dry_run_error": "",
             "execution_success": False,
             "execution_error": "",
             "row_count": 0,
             "bytes_scanned": 0,
+            "dry_run_bytes": 0,
             "estimated_cost_usd": 0.0,
+            "static_estimate_bytes": None,
+            "maximum_bytes_billed": None,
+            "wall_time_ms": None,
+            "elapsed_ms": None,
+            "total_slot_ms": None,
+            "cache_hit": False,
+            "bytes_billed": 0,
+            "shuffle_bytes": 0,
+            "spilled_bytes": 0,
+            "stages": [],
+            "top_stage": None,
+            "top_stage_steps": None,
+            "perf_regressions": [],
+            "result_fingerprint": None,
+            "result_changes": [],
+            "sampled": False,
+            "bytes_saved": 0,
+            "shared_scan": False,
+            "shared_scan_baseline_bytes": None,
+            "cached": False,
             "status": "Unknown"
         }
         
+        # Step 0: Static estimate, to avoid submitting anything for queries known to be too expensive
+        if self.catalog is not None:
+            estimate = estimate_query_bytes(query_info["content"], self.catalog)
+            if not estimate["unknown_tables"]:
+                result["static_estimate_bytes"] = estimate["bytes"]
+                if self.max_estimated_bytes is not None and estimate["bytes"] > self.max_estimated_bytes:
+                    result["status"] = "Skipped (Estimated Cost)"
+                    return result
+        
+        # The local backend can only run queries whose tables were extracted
+        missing_fixtures = getattr(self.client, "missing_fixtures", None)
+        missing = missing_fixtures(query_info["content"]) if missing_fixtures is not None else []
+        if missing:
+            result["status"] = MISSING_FIXTURE_STATUS
+            result["dry_run_error"] = (f"No Parquet fixture for {', '.join(missing)}; "
+                                       f"extract it with tests/extract_fixtures.py")
+            return result
+        
         # Step 1: Dry run
-        dry_run_ok, bytes_estimated, cost_estimated, dry_error = self.run_dry_run(query_info["content"])
+        # Parameterized queries are tested with the example values declared in their header
+        dry_run_ok, bytes_estimated, cost_estimated, dry_error = self.run_dry_run(
+            query_info["content"], bind_parameters(query_info["header"]["parameters"])
+        )
         result["dry_run_success"] = dry_run_ok
         result["dry_run_error"] = dry_error
+        result["dry_run_bytes"] = bytes_estimated or 0
         
         if not dry_run_ok:
             result["status"] = "Syntax Error"
-            return result
-        
-        # Step 2: Execute (only for non-pending queries)
-        if query_info["is_pending"]:
+        elif query_info["is_pending"]:
+            # Pending queries are only dry run
             result["status"] = "Pending Review"
+        else:
+            result["status"] = READY_STATUS
+        return result
+
+    def reserve_execution(self, content: str, complexity: str, dry_run_bytes: int) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Cap an execution job by its dry run and reserve its worst-case cost in the run budget.
+        
+        Returns: (maximum_bytes_billed, skip status if it may not run); (None, None) without a budget
+        """
+        if self.budget is None:
+            return None, None
+        # Billing cap from the dry run; exceeding it fails the job instead of billing for it
+        maximum_bytes_billed = self.budget.max_bytes_billed(dry_run_bytes, len(referenced_tables(content)))
+        # The tier is graded on the expected cost, not the margined worst case
+        skip_status = self.budget.check_tier_cap(complexity, dry_run_bytes)
+        if skip_status is None and not self.budget.reserve(maximum_bytes_billed):
+            skip_status = "Skipped (Budget)"
+        return maximum_bytes_billed, skip_status
+
+    def run_execution_phase(self, query_info: Dict, result: Dict) -> Dict:
+        """Step 2: execute a query that passed its dry run, within the cost budget, and capture stats."""
+        maximum_bytes_billed, skip_status = self.reserve_execution(
+            query_info["content"], result["complexity"], result["dry_run_bytes"]
+        )
+        result["maximum_bytes_billed"] = maximum_bytes_billed
+        if skip_status is not None:
+            result["status"] = skip_status
             return result
         
-        exec_ok, row_count, bytes_scanned, cost_actual, exec_error = self.run_query_with_limit(query_info["content"])
+        execution_sql = self.execution_sql(query_info["content"])
+        result["sampled"] = any(t in self.table_rewrites for t in referenced_tables(query_info["content"]))
+        result["shared_scan"] = query_info["content"] in self.shared_scans
+        result["shared_scan_baseline_bytes"] = self.shared_scan_baseline_bytes.get(query_info["content"])
+        
+        exec_ok, row_count, bytes_scanned, cost_actual, exec_error, job_stats = self.run_query_with_limit(
+            execution_sql, maximum_bytes_billed=maximum_bytes_billed,
+            query_parameters=bind_parameters(query_info["header"]["parameters"]),
+            job_id=job_id_for(self.run_id, execution_sql),
+            fingerprint=self.fingerprint_results
+        )
+        if self.budget is not None:
+            # A failed job is billed nothing, including one stopped by maximum_bytes_billed
+            self.budget.settle(maximum_bytes_billed, job_stats.get("bytes_billed", 0))
+        result.update(job_stats)
         result["execution_success"] = exec_ok
         result["execution_error"] = exec_error
         result["row_count"] = row_count
         result["bytes_scanned"] = bytes_scanned or 0
         result["estimated_cost_usd"] = cost_actual or 0.0
+        if result["sampled"] and exec_ok:
+            result["bytes_saved"] = max(result["dry_run_bytes"] - result["bytes_scanned"], 0)
         
         if not exec_ok:
             result["status"] = "Execution Error"
@@ -190,6 +698,123 @@ class QueryTestRunner:
         
         return result
 
+    def benchmark_query(self, query_info: Dict, repeats: int) -> Dict:
+        """
+        Execute a query repeats times with the BigQuery cache disabled and summarize its latency.
+        
+        Each execution is a new job (no deterministic job ID) and is capped and charged
+        against the run budget like a test execution.
+        
+        Returns: dict with name, category, path, status, runs (successful executions),
+        error, bytes_billed (total) and p50/p95 of elapsed_ms, wall_time_ms and total_slot_ms
+        """
+        benchmark = {
+            "name": query_info["name"],
+            "category": query_info["category"],
+            "path": query_info["path"],
+            "status": "Pass",
+            "runs": 0,
+            "error": "",
+            "bytes_billed": 0,
+        }
+        planned = self.run_dry_run_phase(query_info)
+        if planned["status"] != READY_STATUS:
+            benchmark["status"] = planned["status"]
+            benchmark["error"] = planned["dry_run_error"]
+            return benchmark
+        
+        execution_sql = self.execution_sql(query_info["content"])
+        samples = {"elapsed_ms": [], "wall_time_ms": [], "total_slot_ms": []}
+        for _ in range(repeats):
+            maximum_bytes_billed, skip_status = self.reserve_execution(
+                query_info["content"], planned["complexity"], planned["dry_run_bytes"]
+            )
+            if skip_status is not None:
+                benchmark["status"] = skip_status
+                break
+            
+            exec_ok, _, _, _, exec_error, job_stats = self.run_query_with_limit(
+                execution_sql, maximum_bytes_billed=maximum_bytes_billed,
+                query_parameters=bind_parameters(query_info["header"]["parameters"]),
+                use_query_cache=False
+            )
+            if self.budget is not None:
+                self.budget.settle(maximum_bytes_billed, job_stats.get("bytes_billed", 0))
+            if not exec_ok:
+                benchmark["status"] = "Execution Error"
+                benchmark["error"] = exec_error
+                break
+            benchmark["runs"] += 1
+            benchmark["bytes_billed"] += job_stats["bytes_billed"]
+            for metric, values in samples.items():
+                # Elapsed falls back to client wall time for clients without job timestamps
+                value = metric_value(job_stats, metric)
+                if value is not None:
+                    values.append(value)
+        
+        for metric, values in samples.items():
+            benchmark[f"{metric}_p50"] = percentile(values, 50) if values else None
+            benchmark[f"{metric}_p95"] = percentile(values, 95) if values else None
+        return benchmark
+
+    def production_queries(self, query_dir: str, selected: Optional[set] = None) -> List[Dict]:
+        """Production (not pending) queries in this shard, optionally only the selected paths, in load order."""
+        return [
+            q for path, q in self.load_queries(query_dir).items()
+            if not q["is_pending"]
+            and (selected is None or path in selected)
+            and (self.shard_paths is None or path in self.shard_paths)
+        ]
+
+    def run_benchmarks(self, query_dir: str, repeats: int, selected: Optional[set] = None) -> List[Dict]:
+        """
+        Benchmark every production query (or only the selected paths), in load order.
+        
+        Returns: one benchmark_query() summary per query
+        """
+        query_infos = self.production_queries(query_dir, selected)
+        print(f"\nBenchmarking {len(query_infos)} queries, {repeats} runs each with the query cache disabled")
+        benchmarks = []
+        for i, query_info in enumerate(query_infos, 1):
+            print(f"  [{i}/{len(query_infos)}] Benchmarking {query_info['name']}...", end=" ")
+            benchmark = self.benchmark_query(query_info, repeats)
+            benchmarks.append(benchmark)
+            print(f"[{benchmark['status']}, p50 {self.format_duration(benchmark['elapsed_ms_p50'])}]")
+        return benchmarks
+
+    def generate_benchmark_report(self, benchmarks: List[Dict], repeats: int,
+                                  baseline: Optional[Dict[str, Dict]] = None) -> str:
+        """
+        Generate markdown table of benchmark latencies.
+        
+        Args:
+            benchmarks: run_benchmarks() summaries
+            repeats: Runs per query
+            baseline: Earlier summaries by path; adds the change in p50 elapsed time against them
+        """
+        lines = [
+            "# Query Benchmark Results",
+            f"\n**Generated:** {datetime.now().isoformat()}",
+            f"**Queries:** {len(benchmarks)} | **Runs per query:** {repeats} | **Query cache:** disabled",
+            f"**Bytes Billed:** {self.format_bytes(sum(b['bytes_billed'] for b in benchmarks))}\n",
+            "| Query | Category | Status | Runs | Elapsed p50 | Elapsed p95 | Slot Time p50 | Slot Time p95 |"
+            + (" p50 vs Baseline |" if baseline else ""),
+            "|-------|----------|--------|------|-------------|-------------|---------------|---------------|"
+            + ("-----------------|" if baseline else ""),
+        ]
+        for b in sorted(benchmarks, key=lambda x: (x["category"], x["name"])):
+            line = (f"| {b['name']} | {b['category']} | {b['status']} | {b['runs']} | "
+                    f"{self.format_duration(b['elapsed_ms_p50'])} | {self.format_duration(b['elapsed_ms_p95'])} | "
+                    f"{self.format_duration(b['total_slot_ms_p50'])} | {self.format_duration(b['total_slot_ms_p95'])} |")
+            if baseline:
+                before = (baseline.get(b["path"]) or {}).get("elapsed_ms_p50")
+                change = "N/A"
+                if before and b["elapsed_ms_p50"] is not None:
+                    change = f"{round((b['elapsed_ms_p50'] - before) / before * 100):+d}%"
+                line += f" {change} |"
+            lines.append(line)
+        return "\n".join(lines)
+
     def format_bytes(self, bytes_val: int) -> str:
         """Format bytes to human-readable format."""
         for unit in ["B", "KB", "MB", "GB", "TB"]:
@@ -198,6 +823,16 @@ class QueryTestRunner:
             bytes_val /= 1024
         return f"{bytes_val:.2f}PB"
 
+    def format_duration(self, millis: Optional[float]) -> str:
+        """Format milliseconds to human-readable format."""
+        if millis is None:
+            return "N/A"
+        if millis < 1000:
+            return f"{millis:.0f}ms"
+        if millis < 60000:
+            return f"{millis / 1000:.1f}s"
+        return f"{millis / 60000:.1f}min"
+
     def generate_markdown_report(self, results: List[Dict]) -> str:
         """Generate markdown table of test results."""
         lines = [
@@ -209,9 +844,21 @@ class QueryTestRunner:
             f"**Syntax Errors:** {sum(1 for r in results if r['status'] == 'Syntax Error')}",
             f"**Execution Errors:** {sum(1 for r in results if r['status'] == 'Execution Error')}",
             f"**Empty Results:** {sum(1 for r in results if r['status'] == 'Empty Result')}",
+            f"**Skipped:** {sum(1 for r in results if r['status'] in SKIPPED_STATUSES)}",
+            f"**Served from Cache:** {sum(1 for r in results if r.get('cached'))}",
+            f"**Carried Over (not selected):** {sum(1 for r in results if r.get('carried_over'))}",
+            f"**Resumed from Checkpoint:** {sum(1 for r in results if r.get('resumed'))}",
+        ]
+        missing_fixtures = sum(1 for r in results if r["status"] == MISSING_FIXTURE_STATUS)
+        if missing_fixtures:
+            lines.append(f"**Missing Fixtures (local backend):** {missing_fixtures}")
+        if self.budget is not None and self.budget.schedules:
+            total = f"${self.budget.total_usd:.2f}" if self.budget.total_usd is not None else "unlimited"
+            lines.append(f"**Budget Spent:** ${self.budget.spent_usd:.4f} of {total}")
+        lines += [
             "\n## Results by Query\n",
-            "| Query | Category | Complexity | Status | Rows | Bytes | Cost USD | Dry Run Error | Exec Error |",
-            "|-------|----------|------------|--------|------|-------|----------|---------------|-----------|"
+            "| Query | Category | Complexity | Status | Rows | Bytes | Cost USD | Time | Slot Time | Dry Run Error | Exec Error |",
+            "|-------|----------|------------|--------|------|-------|----------|------|-----------|---------------|-----------|"
         ]
         
         for r in sorted(results, key=lambda x: (x["category"], x["name"])):
@@ -221,22 +868,313 @@ class QueryTestRunner:
             bytes_fmt = self.format_bytes(r["bytes_scanned"]) if r["bytes_scanned"] > 0 else "N/A"
             cost_fmt = f"${r['estimated_cost_usd']:.4f}" if r["estimated_cost_usd"] > 0 else "N/A"
             rows_fmt = str(r["row_count"]) if r["row_count"] > 0 else "N/A"
+            time_fmt = self.format_duration(r.get("elapsed_ms") or r.get("wall_time_ms"))
+            slot_fmt = self.format_duration(r.get("total_slot_ms"))
             
-            line = f"| {r['name']} | {r['category']} | {r['complexity']} | {r['status']} | {rows_fmt} | {bytes_fmt} | {cost_fmt} | {dry_error} | {exec_error} |"
+            status = r["status"]
+            if r.get("carried_over"):
+                status += " (carried over)"
+            elif r.get("cached"):
+                status += " (cached)"
+            line = f"| {r['name']} | {r['category']} | {r['complexity']} | {status} | {rows_fmt} | {bytes_fmt} | {cost_fmt} | {time_fmt} | {slot_fmt} | {dry_error} | {exec_error} |"
             lines.append(line)
         
+        executed = [r for r in results if r.get("execution_success") and r.get("total_slot_ms") is not None]
+        if executed:
+            lines.extend([
+                "\n## Performance\n",
+                f"**Total Slot Time:** {self.format_duration(sum(r['total_slot_ms'] for r in executed))}",
+                f"**Bytes Billed:** {self.format_bytes(sum(r.get('bytes_billed') or 0 for r in executed))}",
+                f"**Cache Hits:** {sum(1 for r in executed if r.get('cache_hit'))}\n",
+                "| Query | Elapsed | Slot Time | Billed | Shuffle | Spilled | Most Expensive Stage |",
+                "|-------|---------|-----------|--------|---------|---------|----------------------|",
+            ])
+            for r in sorted(executed, key=lambda x: x["total_slot_ms"], reverse=True):
+                stage = f"{r['top_stage']}: {r['top_stage_steps'][:60]}" if r.get("top_stage") else "N/A"
+                lines.append(
+                    f"| {r['name']} | {self.format_duration(r.get('elapsed_ms') or r.get('wall_time_ms'))} | "
+                    f"{self.format_duration(r['total_slot_ms'])} | {self.format_bytes(r.get('bytes_billed') or 0)} | "
+                    f"{self.format_bytes(r.get('shuffle_bytes') or 0)} | {self.format_bytes(r.get('spilled_bytes') or 0)} | "
+                    f"{stage.replace('|', '/')} |"
+                )
+        
+        regressed = [r for r in results if r.get("perf_regressions")]
+        if regressed:
+            lines.extend([
+                "\n## Performance Regressions\n",
+                "| Query | Metric | Kind | Value | Rolling Median | Change |",
+                "|-------|--------|------|-------|----------------|--------|",
+            ])
+            for r in sorted(regressed, key=lambda x: (x["category"], x["name"])):
+                for finding in r["perf_regressions"]:
+                    format_value = self.format_bytes if finding["metric"] == "bytes_scanned" else self.format_duration
+                    lines.append(
+                        f"| {r['name']} | {finding['metric']} | {finding['kind']} | "
+                        f"{format_value(finding['value'])} | {format_value(finding['baseline'])} | "
+                        f"+{finding['change'] * 100:.0f}% |"
+                    )
+        
+        changed = [r for r in results if r.get("result_changes")]
+        if changed:
+            lines.extend([
+                "\n## Result Changes\n",
+                "Results whose content fingerprint differs from the last run on this IDC release.\n",
+                "| Query | Rows | Changes |",
+                "|-------|------|---------|",
+            ])
+            for r in sorted(changed, key=lambda x: (x["category"], x["name"])):
+                details = "; ".join(r["result_changes"])[:200].replace("|", "/")
+                lines.append(f"| {r['name']} | {r['row_count']} | {details} |")
+        
+        rewrites = [r for r in results if r.get("table_rewrite")]
+        if rewrites:
+            lines.extend([
+                "\n## Table Rewrites\n",
+                "Queries re-run reading cheaper tables (see `tests/table_advisor.py`), with full results compared.\n",
+                "| Query | Rewrite | Original Bytes | Rewritten Bytes | Identical Results |",
+                "|-------|---------|----------------|-----------------|-------------------|",
+            ])
+            for r in sorted(rewrites, key=lambda x: (x["category"], x["name"])):
+                rewrite = r["table_rewrite"]
+                tables = ", ".join(f"{table_name(a)} -> {table_name(b)}" for a, b in rewrite["replacements"].items())
+                identical = {True: "✓", False: "❌"}.get(rewrite["identical"], f"Error: {rewrite['error'][:40]}")
+                lines.append(
+                    f"| {r['name']} | {tables} | {self.format_bytes(rewrite['original_bytes'] or 0)} | "
+                    f"{self.format_bytes(rewrite['rewritten_bytes'] or 0)} | {identical.replace('|', '/')} |"
+                )
+        
+        linted = [r for r in results if r.get("lint_findings")]
+        if linted:
+            lines.extend([
+                "\n## Lint Findings\n",
+                "Static performance lint (see `tests/lint_queries.py`).\n",
+                "| Query | Line | Severity | Rule | Finding | Impact |",
+                "|-------|------|----------|------|---------|--------|",
+            ])
+            for r in sorted(linted, key=lambda x: (x["category"], x["name"])):
+                for finding in r["lint_findings"]:
+                    lines.append(
+                        f"| {r['name']} | {finding['line']} | {finding['severity']} | {finding['rule']} | "
+                        f"{finding['message'].replace('|', '/')} | {finding['impact'].replace('|', '/')} |"
+                    )
+        
+        regraded = [
+            r for r in results
+            if r.get("suggested_complexity") and r["complexity"].split()[:1] != [r["suggested_complexity"]]
+        ]
+        if regraded:
+            lines.extend([
+                "\n## Complexity Suggestions\n",
+                "Headers whose complexity differs from the grade suggested by the lint.\n",
+                "| Query | Header | Suggested |",
+                "|-------|--------|-----------|",
+            ])
+            for r in sorted(regraded, key=lambda x: (x["category"], x["name"])):
+                lines.append(f"| {r['name']} | {r['complexity']} | {r['suggested_complexity']} |")
+        
+        sampled = [r for r in results if r.get("sampled") and r["execution_success"]]
+        if sampled:
+            full_total = sum(r["dry_run_bytes"] for r in sampled)
+            sample_total = sum(r["bytes_scanned"] for r in sampled)
+            lines.extend([
+                "\n## Sample Mode Savings\n",
+                f"**Full-table estimate (dry run):** {self.format_bytes(full_total)}",
+                f"**Scanned against samples:** {self.format_bytes(sample_total)}",
+                f"**Bytes saved:** {self.format_bytes(max(full_total - sample_total, 0))}\n",
+                "| Query | Full Estimate | Sample Bytes | Saved |",
+                "|-------|---------------|--------------|-------|",
+            ])
+            for r in sorted(sampled, key=lambda x: (x["category"], x["name"])):
+                lines.append(
+                    f"| {r['name']} | {self.format_bytes(r['dry_run_bytes'])} | "
+                    f"{self.format_bytes(r['bytes_scanned'])} | {self.format_bytes(r['bytes_saved'])} |"
+                )
+        
+        shared = [
+            r for r in results
+            if r.get("shared_scan") and r["execution_success"] and not r.get("cached") and not r.get("carried_over")
+        ]
+        if shared:
+            without_total = sum(r["shared_scan_baseline_bytes"] for r in shared)
+            with_total = self.shared_scan_materialized_bytes + sum(r.get("bytes_billed") or 0 for r in shared)
+            lines.extend([
+                "\n## Shared Scan\n",
+                f"**Queries using shared projections:** {len(shared)}",
+                f"**Bytes billed without shared scan (dry run):** {self.format_bytes(without_total)}",
+                f"**Bytes billed with shared scan:** {self.format_bytes(with_total)} "
+                f"(including {self.format_bytes(self.shared_scan_materialized_bytes)} to materialize)\n",
+                "| Query | Without Shared Scan | With Shared Scan |",
+                "|-------|---------------------|------------------|",
+            ])
+            for r in sorted(shared, key=lambda x: (x["category"], x["name"])):
+                lines.append(
+                    f"| {r['name']} | {self.format_bytes(r['shared_scan_baseline_bytes'])} | "
+                    f"{self.format_bytes(r.get('bytes_billed') or 0)} |"
+                )
+        
         return "\n".join(lines)
 
-    def run_all_tests(self, query_dir: str) -> Tuple[List[Dict], str]:
-        """Run tests for all queries."""
+    def run_budgeted(self, query_infos: List[Dict], concurrency: int = 1) -> List[Dict]:
+        """
+        Dry run all queries, then execute those that passed in order of dry-run bytes, cheapest first.
+        
+        Returns: results in the order of query_infos
+        """
+        workers = max(concurrency, 1)
+        print(f"Dry running {len(query_infos)} queries to schedule them cheapest-first")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            planned = list(executor.map(self.plan_query, query_infos))
+        
+        ready = sorted(
+            (index for index, result in enumerate(planned) if result["status"] == READY_STATUS),
+            key=lambda index: planned[index]["dry_run_bytes"]
+        )
+        total_usd = self.budget.total_usd
+        print(f"Executing {len(ready)} queries"
+              + (f" within a ${total_usd:.2f} budget" if total_usd is not None else ""))
+        
+        ordered_results = list(planned)
+        for index, result in enumerate(planned):
+            if result["status"] != READY_STATUS:
+                self.save_progress(query_infos[index], result)
+        # A pool with N workers starts jobs in submission order, so execution stays cheapest-first
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(self.finish_query, query_infos[index], planned[index]): index
+                for index in ready
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                ordered_results[futures[future]] = result
+                print(f"  [{done}/{len(ready)}] {result['name']} [{result['status']}] "
+                      f"(spent ${self.budget.spent_usd:.4f})")
+        return ordered_results
+
+    def run_all_tests(self, query_dir: str, concurrency: int = 1, selected: Optional[set] = None,
+                      previous_results: Optional[Dict[str, Dict]] = None) -> Tuple[List[Dict], str]:
+        """
+        Run tests for all queries.
+        
+        With concurrency > 1, up to that many queries are tested at once in a
+        thread pool. Results are always returned in query load order.
+        
+        When a run budget or tier caps are set, every query is dry run first and
+        the rest are executed cheapest-first, so the budget goes as far as possible.
+        
+        If selected is given, only those query paths are tested; every other
+        query keeps its entry from previous_results (keyed by path), marked as
+        carried over. Queries with no previous result are always tested.
+        """
         queries = self.load_queries(query_dir)
         print(f"\nLoaded {len(queries)} queries from {query_dir}")
+        if self.shard_paths is not None:
+            queries = {path: q for path, q in queries.items() if path in self.shard_paths}
+            print(f"Testing the {len(queries)} queries of this shard")
+        
+        carried_over = {}
+        if selected is not None:
+            previous_results = previous_results or {}
+            for path in queries:
+                if path not in selected and path in previous_results:
+                    carried_over[path] = dict(previous_results[path], carried_over=True, perf_regressions=[],
+                                              result_changes=[])
+            print(f"Selected {len(queries) - len(carried_over)} queries, "
+                  f"carrying over {len(carried_over)} previous results")
+        
+        query_infos = [q for path, q in queries.items() if path not in carried_over]
+        
+        # Queries finished before an interrupted run stopped, unless edited since. Only settled
+        # outcomes count; skipped (e.g. out of budget) and failed queries are tried again
+        resumed = {}
+        for query_info in query_infos:
+            record = self.resumed.get(query_info["path"])
+            if (record and record["sha256"] == content_hash(query_info["content"])
+                    and record["result"]["status"] in CACHEABLE_STATUSES):
+                resumed[query_info["path"]] = dict(record["result"], resumed=True)
+        if resumed:
+            query_infos = [q for q in query_infos if q["path"] not in resumed]
+            print(f"Skipping {len(resumed)} queries finished before the run was interrupted")
+            if self.budget is not None:
+                self.budget.charge(sum(r.get("bytes_billed") or 0 for r in resumed.values()))
+        
+        if self.catalog is not None and self.max_estimated_bytes is not None:
+            for query_info in query_infos:
+                estimate = estimate_query_bytes(query_info["content"], self.catalog)
+                # Same rule as run_dry_run_phase: incomplete estimates never skip a query
+                if not estimate["unknown_tables"] and estimate["bytes"] > self.max_estimated_bytes:
+                    print(f"  WARNING: {query_info['name']} estimated at "
+                          f"{self.format_bytes(estimate['bytes'])}, will be skipped")
+        
+        if self.budget is not None and self.budget.schedules:
+            self.results.extend(self.run_budgeted(query_infos, concurrency))
+        elif concurrency <= 1:
+            for i, query_info in enumerate(query_infos, 1):
+                print(f"  [{i}/{len(query_infos)}] Testing {query_info['name']}...", end=" ")
+                result = self.test_query(query_info)
+                self.results.append(result)
+                print(f"[{result['status']}]")
+        else:
+            print(f"Running up to {concurrency} queries concurrently")
+            ordered_results = [None] * len(query_infos)
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                futures = {
+                    executor.submit(self.test_query, query_info): index
+                    for index, query_info in enumerate(query_infos)
+                }
+                for done, future in enumerate(as_completed(futures), 1):
+                    result = future.result()
+                    ordered_results[futures[future]] = result
+                    print(f"  [{done}/{len(query_infos)}] {result['name']} [{result['status']}]")
+            self.results.extend(ordered_results)
+        
+        if carried_over or resumed:
+            tested = {r["path"]: r for r in self.results}
+            earlier = dict(carried_over, **resumed)
+            self.results = [tested.get(path) or earlier[path] for path in queries]
+        
+        if self.rewrite_advisor is not None:
+            passed = [r for r in self.results if r["status"] == "Pass" and not r.get("carried_over")]
+            print(f"Verifying cheaper-source rewrites of {len(passed)} passing queries...")
+            for result in passed:
+                self.verify_rewrite(queries[result["path"]], result)
+        
+        # Static lint is free, so every query is linted on every run, including cached ones
+        lint = lint_catalog(QueryLinter(self.catalog), queries)
+        for result in self.results:
+            result["lint_findings"] = lint[result["path"]]["findings"]
+            result["suggested_complexity"] = lint[result["path"]]["suggested_complexity"]
+        
+        # Release the measurements are from, so history lookups (e.g. header updates) use the same one
+        for result in self.results:
+            if not result.get("carried_over"):
+                result["idc_version"] = self.idc_version
+        
+        if self.history is not None:
+            findings = self.history.detect_regressions(self.results, self.idc_version)
+            for result in self.results:
+                if result["path"] in findings:
+                    result["perf_regressions"] = findings[result["path"]]
+            changes = self.history.detect_result_changes(self.results, self.idc_version)
+            for result in self.results:
+                if result["path"] in changes:
+                    result["result_changes"] = changes[result["path"]]
+            recorded = self.history.record_results(
+                self.results, self.run_id, self.idc_version, self.run_started.isoformat()
+            )
+            self.history.record_fingerprints(
+                self.results, self.run_id, self.idc_version, self.run_started.isoformat()
+            )
+            print(f"Recorded {recorded} measurements in {self.history.db_path}; "
+                  f"{len(findings)} queries regressed")
         
-        for i, (path, query_info) in enumerate(queries.items(), 1):
-            print(f"  [{i}/{len(queries)}] Testing {query_info['name']}...", end=" ")
-            result = self.test_query(query_info)
-            self.results.append(result)
-            print(f"[{result['status']}]")
+        if self.cache is not None:
+            evicted = self.cache.evict()
+            if evicted:
+                print(f"Evicted {evicted} stale result cache entries")
+        
+        if self.checkpoint is not None:
+            # The run is complete, so there is nothing left to resume
+            self.checkpoint.clear()
         
         report = self.generate_markdown_report(self.results)
         return self.results, report
@@ -250,18 +1188,272 @@ def main():
     parser.add_argument("--output", default="tests/QUERY_TEST_RESULTS.md", help="Output markdown file")
     parser.add_argument("--credentials", help="Path to GCP service account JSON (or use GCP_SA_KEY env)")
     parser.add_argument("--json-output", help="Also write results as JSON")
+    parser.add_argument("--config", default="tests/test_config.yaml", help="Test configuration YAML")
+    parser.add_argument("--concurrency", type=int,
+                        help="Max queries in flight at once (default: test_parameters.concurrency, else 1)")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the result cache for this run")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Ignore cached results and re-run every query (fresh results are still cached)")
+    parser.add_argument("--backend", choices=["bigquery", "local"], default="bigquery",
+                        help="Execute on BigQuery, or offline with DuckDB against Parquet fixtures")
+    parser.add_argument("--fixtures-dir", default="tests/fixtures",
+                        help="Parquet fixtures for the local backend (<dataset>/<table>.parquet)")
+    parser.add_argument("--sample", action="store_true",
+                        help="Execute queries against materialized samples of the IDC tables (see 'sample' config)")
+    parser.add_argument("--shared-scan", action="store_true",
+                        help="Project the columns that selected queries share into scratch tables once per run "
+                             "(see 'shared_scan' config)")
+    parser.add_argument("--max-estimated-gb", type=float,
+                        help="Skip queries whose static column-size estimate exceeds this many GB")
+    parser.add_argument("--budget-usd", type=float,
+                        help="Maximum spend for this run; queries that would exceed it are skipped (see 'budget' config)")
+    parser.add_argument("--fail-on-perf-regression", action="store_true",
+                        help="Exit non-zero if any query regressed against its performance history")
+    parser.add_argument("--fingerprint", action="store_true",
+                        help="Run queries without the test LIMIT and flag results whose content fingerprint changed")
+    parser.add_argument("--verify-rewrites", action="store_true",
+                        help="Re-run passing queries reading the cheaper tables suggested by table_advisor.py "
+                             "and compare full results")
+    parser.add_argument("--shard", metavar="I/N",
+                        help="Only run shard I of N, balanced by historical cost (combine with merge_shard_results.py)")
+    parser.add_argument("--benchmark", type=int, metavar="N",
+                        help="Instead of testing, run each production query N times with the query cache disabled "
+                             "and report p50/p95 latency and slot time")
+    parser.add_argument("--benchmark-output", default="tests/BENCHMARK_RESULTS.md",
+                        help="Markdown report of --benchmark (--json-output writes its JSON)")
+    parser.add_argument("--benchmark-baseline",
+                        help="JSON of an earlier --benchmark run to compare p50 latency against")
+    parser.add_argument("--compare-releases", nargs=2, metavar=("OLD", "NEW"),
+                        help="Instead of testing, run production queries against two IDC releases "
+                             "(e.g. idc_v18 idc_current) and report cost and latency side by side")
+    parser.add_argument("--release-output", default="tests/RELEASE_COMPARISON.md",
+                        help="Markdown report of --compare-releases (--json-output writes its JSON)")
+    parser.add_argument("--growth-tolerance", type=float, default=0.10,
+                        help="Flag queries whose bytes grew this much faster than their tables (0.10 = 10%%)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted run: skip finished queries and reattach to running jobs")
+    parser.add_argument("--changed", metavar="REV_RANGE",
+                        help="Only test queries affected by changes in this git range (e.g. origin/main...HEAD)")
+    parser.add_argument("--previous-results",
+                        help="JSON results of an earlier run, reused for queries not selected by --changed")
     
     args = parser.parse_args()
     
+    config = load_config(args.config)
+    test_parameters = config.get("test_parameters", {})
+    cache_config = config.get("cache", {})
+    concurrency = args.concurrency or test_parameters.get("concurrency", 1)
+    
     # Get credentials path
     creds_path = args.credentials or os.getenv("GCP_SA_KEY")
     
     # Initialize runner
-    runner = QueryTestRunner(creds_path)
+    client = None
+    if args.backend == "local":
+        from local_engine import LocalClient
+        client = LocalClient(args.fixtures_dir)
+        print(f"Using local backend with {len(client.tables)} fixture tables from {args.fixtures_dir}")
+        if args.sample:
+            parser.error("--sample is only supported with the BigQuery backend")
+    
+    runner = QueryTestRunner(
+        creds_path,
+        max_retries=test_parameters.get("rate_limit_max_retries", 5),
+        initial_backoff_seconds=test_parameters.get("rate_limit_initial_backoff_seconds", 1.0),
+        client=client,
+    )
     print(f"Authenticated as: {runner.project_id}")
     
+    if args.fingerprint or test_parameters.get("fingerprint_results", False):
+        runner.enable_fingerprints()
+        print("Fingerprinting full results"
+              + (" via the BigQuery Storage Read API" if runner.bqstorage_client is not None else ""))
+    
+    # Local results say nothing about BigQuery, so they are never cached
+    if args.backend == "bigquery" and cache_config.get("enabled", False) and not args.no_cache:
+        cache = ResultCache(
+            cache_config.get("directory", ".query_cache/results"),
+            ttl_seconds=cache_config.get("ttl_days", 7) * 24 * 3600,
+            max_size_bytes=cache_config.get("max_size_mb", 50) * 1024 ** 2,
+        )
+        if runner.enable_cache(cache, refresh=args.refresh):
+            print(f"Using result cache for IDC release {runner.idc_version}")
+    
+    history_config = config.get("perf_history", {})
+    if args.backend == "bigquery" and history_config.get("enabled", False):
+        runner.history = PerformanceHistory(
+            history_config.get("database", ".query_cache/perf_history.sqlite"),
+            window=history_config.get("window", 20),
+            band=history_config.get("band", 0.25),
+            min_runs=history_config.get("min_runs", 3),
+        )
+        if runner.idc_version is None:
+            runner.idc_version = runner.resolve_idc_version()
+    
+    estimate_config = config.get("static_estimate", {})
+    catalog = ColumnSizeCatalog.load(estimate_config.get("catalog", "tests/column_sizes.json"))
+    if catalog.tables:
+        runner.catalog = catalog
+        max_estimated_gb = args.max_estimated_gb or estimate_config.get("max_estimated_gb")
+        if max_estimated_gb:
+            runner.max_estimated_bytes = int(max_estimated_gb * 1024 ** 3)
+        if runner.idc_version and catalog.idc_version != runner.idc_version:
+            print(f"WARNING: Column size catalog is from IDC release {catalog.idc_version}, "
+                  f"current is {runner.idc_version}; refresh with tests/cost_estimator.py --refresh")
+    
+    if args.verify_rewrites:
+        if args.backend == "local" or args.sample:
+            parser.error("--verify-rewrites needs the BigQuery backend without --sample")
+        if runner.catalog is None:
+            parser.error("--verify-rewrites needs a column size catalog; see tests/table_advisor.py --refresh")
+        runner.rewrite_advisor = TableAdvisor(runner.catalog)
+    
+    # Every BigQuery execution job gets a maximum_bytes_billed cap derived from its dry run
+    budget_config = config.get("budget", {})
+    if args.backend == "bigquery":
+        runner.budget = CostBudget(
+            total_usd=args.budget_usd if args.budget_usd is not None else budget_config.get("total_usd"),
+            tier_caps_usd=budget_config.get("tier_caps_usd"),
+            bytes_billed_margin=budget_config.get("bytes_billed_margin", 0.10),
+        )
+    
+    if args.sample:
+        sample_config = config.get("sample", {})
+        builder = SampleBuilder(
+            runner.client,
+            runner.project_id,
+            dataset=sample_config.get("dataset", "idc_queries_sample"),
+            key_column=sample_config.get("key_column", "SeriesInstanceUID"),
+            permille=sample_config.get("permille", 10),
+            collections=sample_config.get("collections"),
+            expiration_hours=sample_config.get("expiration_hours", 24),
+            retry=runner.call_with_backoff,
+        )
+        print("Preparing sample tables...")
+        runner.enable_sampling(builder, runner.load_queries(args.query_dir))
+        print(f"Sampling {len(runner.table_rewrites)} tables "
+              f"(materialization scanned {runner.format_bytes(builder.materialized_bytes)})")
+    
+    selected = None
+    previous_results = {}
+    if args.changed:
+        changed_files = git_changed_files(args.changed)
+        selected = select_changed_queries(runner.load_queries(args.query_dir), changed_files, args.query_dir)
+        print(f"{len(changed_files)} files changed in {args.changed}")
+        if args.previous_results and os.path.exists(args.previous_results):
+            with open(args.previous_results) as f:
+                previous_results = {r["path"]: r for r in json.load(f)}
+    
+    if args.shard:
+        try:
+            runner.shard_paths, shard_weights = shard_paths(
+                runner.load_queries(args.query_dir), args.shard, runner.history, selected
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Shard {args.shard}: {len(runner.shard_paths)} queries "
+              f"(weights per shard: {', '.join(f'{w:.1f}' for w in shard_weights)})")
+    
+    if args.shared_scan:
+        if args.backend == "local":
+            parser.error("--shared-scan is only supported with the BigQuery backend")
+        shared_config = config.get("shared_scan", {})
+        builder = SharedScanBuilder(
+            runner.client,
+            runner.project_id,
+            dataset=shared_config.get("dataset", "idc_queries_scratch"),
+            min_queries=shared_config.get("min_queries", 2),
+            expiration_hours=shared_config.get("expiration_hours", 24),
+            retry=runner.call_with_backoff,
+        )
+        queries = runner.load_queries(args.query_dir)
+        if selected is not None:
+            queries = {path: q for path, q in queries.items() if path in selected}
+        if runner.shard_paths is not None:
+            queries = {path: q for path, q in queries.items() if path in runner.shard_paths}
+        print("Preparing shared scans...")
+        runner.enable_shared_scan(builder, queries)
+        print(f"{len(runner.shared_scans)} queries will read shared projections "
+              f"(materialization billed {runner.format_bytes(runner.shared_scan_materialized_bytes)})")
+    
+    if args.benchmark is not None:
+        if args.benchmark < 1:
+            parser.error("--benchmark needs at least 1 run per query")
+        baseline = None
+        if args.benchmark_baseline:
+            with open(args.benchmark_baseline) as f:
+                baseline = {b["path"]: b for b in json.load(f)}
+        benchmarks = runner.run_benchmarks(args.query_dir, args.benchmark, selected)
+        os.makedirs(os.path.dirname(args.benchmark_output) or ".", exist_ok=True)
+        with open(args.benchmark_output, "w") as f:
+            f.write(runner.generate_benchmark_report(benchmarks, args.benchmark, baseline))
+        print(f"\n✓ Wrote benchmark results to {args.benchmark_output}")
+        if args.json_output:
+            os.makedirs(os.path.dirname(args.json_output) or ".", exist_ok=True)
+            with open(args.json_output, "w") as f:
+                json.dump(benchmarks, f, indent=2)
+            print(f"✓ Wrote JSON benchmark results to {args.json_output}")
+        failures = [b for b in benchmarks if b["status"] != "Pass" and b["status"] not in SKIPPED_STATUSES]
+        if failures:
+            print(f"\n❌ {len(failures)} benchmark(s) failed:")
+            for b in failures:
+                print(f"   - {b['name']}: {b['status']}")
+            return 1
+        return 0
+    
+    if args.compare_releases:
+        if args.backend == "local" or args.sample:
+            parser.error("--compare-releases needs the BigQuery backend without --sample")
+        try:
+            comparison = ReleaseComparison(runner, *args.compare_releases, tolerance=args.growth_tolerance)
+        except ValueError as e:
+            parser.error(str(e))
+        # idc_current is an alias, so record which release it resolved to
+        resolved_versions = {
+            release: runner.resolve_idc_version() if release == CURRENT_DATASET else release[len("idc_v"):]
+            for release in args.compare_releases
+        }
+        query_infos = runner.production_queries(args.query_dir, selected)
+        print(f"\nComparing {len(query_infos)} queries between {' and '.join(args.compare_releases)}")
+        comparisons = comparison.compare_all(query_infos)
+        os.makedirs(os.path.dirname(args.release_output) or ".", exist_ok=True)
+        with open(args.release_output, "w") as f:
+            f.write(comparison.generate_report(comparisons, resolved_versions))
+        print(f"\n✓ Wrote release comparison to {args.release_output}")
+        if args.json_output:
+            os.makedirs(os.path.dirname(args.json_output) or ".", exist_ok=True)
+            with open(args.json_output, "w") as f:
+                json.dump(comparisons, f, indent=2)
+            print(f"✓ Wrote JSON release comparison to {args.json_output}")
+        skipped = [c for c in comparisons if c["status"] == "Skipped"]
+        if skipped:
+            print(f"\n⚠ {len(skipped)} query(s) skipped (tier cap or budget):")
+            for c in skipped:
+                statuses = {outcome["status"] for outcome in c["releases"].values()} - {"Pass"}
+                print(f"   - {c['name']}: {', '.join(sorted(statuses))}")
+        outgrew = [c for c in comparisons if c["outgrew_data"]]
+        if outgrew:
+            print(f"\n⚠ {len(outgrew)} query(s) grew in cost faster than their data:")
+            for c in outgrew:
+                print(f"   - {c['name']}: data {c['data_growth']:.2f}x, bytes {c['cost_growth']:.2f}x")
+        errors = [c for c in comparisons if c["status"] == "Error"]
+        if errors:
+            print(f"\n❌ {len(errors)} comparison(s) failed:")
+            for c in errors:
+                print(f"   - {c['name']}")
+            return 1
+        return 0
+    
+    # Only a test run checkpoints; starting one truncates the checkpoint an interrupted run left
+    checkpoint_config = config.get("checkpoint", {})
+    runner.enable_checkpoint(
+        RunCheckpoint(checkpoint_config.get("path", ".query_cache/checkpoint.jsonl")), resume=args.resume
+    )
+    
     # Run tests
-    results, report = runner.run_all_tests(args.query_dir)
+    results, report = runner.run_all_tests(
+        args.query_dir, concurrency=concurrency, selected=selected, previous_results=previous_results
+    )
     
     # Write markdown report
     os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
@@ -278,7 +1470,33 @@ def main():
     
     # Exit with error code if any tests failed (non-pending)
     non_pending = [r for r in results if not r["is_pending"]]
-    failures = [r for r in non_pending if r["status"] not in ["Pass"]]
+    skipped = [r for r in non_pending if r["status"] in SKIPPED_STATUSES]
+    failures = [r for r in non_pending if r["status"] not in ["Pass"] and r not in skipped]
+    
+    for r in skipped:
+        print(f"   ⚠ {r['name']}: {r['status']}")
+    
+    changed = [r for r in results if r.get("result_changes")]
+    if changed:
+        print(f"\n⚠ {len(changed)} query result(s) changed since the last run:")
+        for r in changed:
+            print(f"   - {r['name']}: {'; '.join(r['result_changes'])[:120]}")
+    
+    mismatched = [r for r in results if (r.get("table_rewrite") or {}).get("identical") is False]
+    if mismatched:
+        print(f"\n⚠ {len(mismatched)} cheaper-source rewrite(s) changed the results:")
+        for r in mismatched:
+            print(f"   - {r['name']}")
+    
+    regressed = [r for r in results if r.get("perf_regressions")]
+    fail_on_regression = args.fail_on_perf_regression or history_config.get("fail_on_regression", False)
+    if regressed:
+        print(f"\n{'❌' if fail_on_regression else '⚠'} {len(regressed)} query(s) regressed in performance:")
+        for r in regressed:
+            for finding in r["perf_regressions"]:
+                print(f"   - {r['name']}: {finding['metric']} {finding['kind']} +{finding['change'] * 100:.0f}%")
+        if fail_on_regression and not failures:
+            return 1
     
     if failures:
         print(f"\n❌ {len(failures)} test(s) failed:")
@@ -286,7 +1504,7 @@ def main():
             print(f"   - {f['name']}: {f['status']}")
         return 1
     
-    print(f"\n✓ All {len(non_pending)} production queries passed!")
+    print(f"\n✓ All {len(non_pending) - len(skipped)} production queries passed!")
     return 0
 
 
@@ -0,0 +1,130 @@
+"""
+Materialize small, reproducible samples of IDC tables for cheap query testing
+
+LIMIT does not reduce bytes scanned in BigQuery, so a "test" execution of a
+query over dicom_all still scans the whole table. Sample mode instead copies a
+deterministic subset of each referenced IDC table (by a hash of
+SeriesInstanceUID, or by collection) into a scratch dataset once, and runs the
+queries against those copies.
+
+Sample tables are named by IDC release and sample spec, so repeated runs
+against the same release reuse them until they expire.
+"""
+
+import hashlib
+import re
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sql_utils import IDC_TABLE_PATTERN
+
+
+class SampleBuilder:
+    def __init__(self, client, project_id: str, dataset: str = "idc_queries_sample",
+                 key_column: str = "SeriesInstanceUID", permille: int = 10,
+                 collections: Optional[List[str]] = None, source_datasets: Iterable[str] = ("idc_current",),
+                 expiration_hours: int = 24, location: str = "US", retry: Optional[Callable] = None):
+        """
+        Initialize sample builder.
+
+        Args:
+            client: BigQuery client used to create the sample tables
+            project_id: Project that owns the scratch dataset
+            dataset: Scratch dataset name (created if missing)
+            key_column: Column hashed to pick rows (rows of a series stay together)
+            permille: Rows kept per 1000 key values when sampling by hash
+            collections: If given, sample by collection_id instead of by hash
+            source_datasets: Only tables in these IDC datasets are sampled
+            expiration_hours: Lifetime of sample tables
+            location: Dataset location; must match bigquery-public-data (US)
+            retry: Wrapper used to call BigQuery, e.g. QueryTestRunner.call_with_backoff
+        """
+        self.client = client
+        self.project_id = project_id
+        self.dataset = dataset
+        self.key_column = key_column
+        self.permille = permille
+        self.collections = sorted(collections) if collections else None
+        self.source_datasets = set(source_datasets)
+        self.expiration_hours = expiration_hours
+        self.location = location
+        self.retry = retry or (lambda func: func())
+        self.materialized_bytes = 0
+
+    def run_query(self, sql: str):
+        """Run a statement to completion and return its job."""
+        def submit_and_wait():
+            job = self.client.query(sql)
+            job.result()
+            return job
+        return self.retry(submit_and_wait)
+
+    def spec_id(self) -> str:
+        """Short, stable identifier of the sample definition."""
+        spec = f"collections={self.collections}" if self.collections else f"{self.key_column}:{self.permille}"
+        return hashlib.sha256(spec.encode("utf-8")).hexdigest()[:8]
+
+    def sample_predicate(self, columns: Iterable[str]) -> Optional[str]:
+        """WHERE clause selecting the sample from a table with the given columns, or None if not sampleable."""
+        columns = set(columns)
+        if self.collections:
+            if "collection_id" not in columns:
+                return None
+            values = ", ".join('"' + c.replace('"', '') + '"' for c in self.collections)
+            return f"collection_id IN ({values})"
+        if self.key_column not in columns:
+            return None
+        return f"MOD(ABS(FARM_FINGERPRINT({self.key_column})), 1000) < {self.permille}"
+
+    def sample_table_id(self, table: str, idc_version: Optional[str]) -> str:
+        """Fully qualified sample table name for a source table."""
+        dataset_name, table_name = IDC_TABLE_PATTERN.match(table).groups()
+        version = re.sub(r"[^A-Za-z0-9]", "_", str(idc_version or "unknown"))
+        return f"{self.project_id}.{self.dataset}.{dataset_name}__{table_name}__v{version}_{self.spec_id()}"
+
+    def table_exists(self, table_id: str) -> bool:
+        try:
+            self.client.get_table(table_id)
+            return True
+        except Exception:
+            return False
+
+    def build(self, tables: Iterable[str], idc_version: Optional[str] = None) -> Dict[str, str]:
+        """
+        Materialize samples for the given source tables.
+
+        Tables outside source_datasets, or without the sampling column, are skipped
+        and keep pointing at the full table.
+
+        Returns: mapping of source table -> sample table
+        """
+        self.run_query(
+            f"CREATE SCHEMA IF NOT EXISTS `{self.project_id}.{self.dataset}` "
+            f"OPTIONS(location = \"{self.location}\", "
+            f"default_table_expiration_days = {self.expiration_hours / 24})"
+        )
+
+        table_map = {}
+        for table in sorted(set(tables)):
+            match = IDC_TABLE_PATTERN.match(table)
+            if not match or match.group(1) not in self.source_datasets:
+                continue
+
+            columns = [field.name for field in self.client.get_table(table).schema]
+            predicate = self.sample_predicate(columns)
+            if predicate is None:
+                print(f"  Not sampling {table}: no {self.key_column}/collection_id column")
+                continue
+
+            sample_id = self.sample_table_id(table, idc_version)
+            if not self.table_exists(sample_id):
+                print(f"  Materializing sample of {table} -> {sample_id}")
+                job = self.run_query(
+                    f"CREATE TABLE `{sample_id}` "
+                    f"OPTIONS(expiration_timestamp = TIMESTAMP_ADD(CURRENT_TIMESTAMP(), "
+                    f"INTERVAL {self.expiration_hours} HOUR)) AS "
+                    f"SELECT * FROM `{table}` WHERE {predicate}"
+                )
+                self.materialized_bytes += job.total_bytes_processed or 0
+            table_map[table] = sample_id
+
+        return table_map
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Cost-balanced sharding of the regression suite
+
+Splits the queries into N shards of about equal expected cost, so CI can
+run them as a matrix of parallel jobs (run_regression_tests.py --shard i/N)
+and combine the results with merge_shard_results.py.
+
+Each query is weighted by its historical median elapsed time and bytes
+scanned from the performance history, each relative to the average over the
+queries with history. Queries with no history are weighted by their header
+complexity. Shards are then filled longest-processing-time first: queries in
+decreasing weight, each to the currently lightest shard.
+
+Every shard computes the same partition independently, so all shards must
+see the same queries and history (e.g. restored from the same CI cache).
+"""
+
+import heapq
+import statistics
+import sys
+from typing import Dict, List, Optional, Tuple
+
+# Relative weight of a query with no history, by header complexity (Medium ~ an average query)
+COMPLEXITY_WEIGHTS = {"Low": 0.3, "Medium": 1.0, "High": 3.0}
+
+# Pending queries are only dry run
+PENDING_WEIGHT = 0.05
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """
+    Parse "i/N" (1-based shard i of N).
+
+    Raises: ValueError if spec is malformed or i is out of range
+    """
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard {spec!r}, expected i/N (e.g. 2/4)")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Invalid shard {spec!r}: i must be between 1 and N")
+    return index, count
+
+
+def query_weights(queries: Dict[str, Dict], history=None) -> Dict[str, float]:
+    """
+    Expected relative cost of testing each query.
+
+    Args:
+        queries: Query infos (QueryTestRunner.load_queries) or catalog entries, keyed by path
+        history: PerformanceHistory to weight queries by (optional)
+
+    Returns: path -> weight (1.0 ~ an average query)
+    """
+    measured = {}
+    if history is not None:
+        for path, query_info in queries.items():
+            if query_info["is_pending"]:
+                continue
+            elapsed = history.recent_values(path, "elapsed_ms")
+            scanned = history.recent_values(path, "bytes_scanned")
+            if elapsed and scanned:
+                measured[path] = (statistics.median(elapsed), statistics.median(scanned))
+
+    weights = {}
+    if measured:
+        mean_elapsed = statistics.mean(e for e, _ in measured.values()) or 1
+        mean_bytes = statistics.mean(b for _, b in measured.values()) or 1
+        for path, (elapsed, scanned) in measured.items():
+            weights[path] = (elapsed / mean_elapsed + scanned / mean_bytes) / 2
+
+    for path, query_info in queries.items():
+        if path in weights:
+            continue
+        if query_info["is_pending"]:
+            weights[path] = PENDING_WEIGHT
+        else:
+            tier = query_info["header"]["complexity"].split()[:1]
+            weights[path] = COMPLEXITY_WEIGHTS.get(tier[0] if tier else "", COMPLEXITY_WEIGHTS["Medium"])
+    return weights
+
+
+def partition(weights: Dict[str, float], count: int) -> List[List[str]]:
+    """
+    Split paths into count shards of about equal total weight (LPT scheduling).
+
+    Returns: list of count lists of paths, each in path order
+    """
+    shards = [[] for _ in range(count)]
+    loads = [(0.0, index) for index in range(count)]
+    heapq.heapify(loads)
+    # Ties broken by path, so every shard computes the same partition
+    for path in sorted(weights, key=lambda p: (-weights[p], p)):
+        load, index = heapq.heappop(loads)
+        shards[index].append(path)
+        heapq.heappush(loads, (load + weights[path], index))
+    return [sorted(shard) for shard in shards]
+
+
+def shard_paths(queries: Dict[str, Dict], spec: str, history=None,
+                selected: Optional[set] = None) -> Tuple[set, List[float]]:
+    """
+    Paths of the queries in shard spec ("i/N").
+
+    With selected (e.g. from --changed), queries not selected are carried over
+    rather than tested, so they count as free when balancing.
+
+    Returns: (paths in the shard, total weight of each shard)
+    """
+    index, count = parse_shard(spec)
+    weights = query_weights(queries, history)
+    if selected is not None:
+        weights = {path: weight if path in selected else 0.0 for path, weight in weights.items()}
+    shards = partition(weights, count)
+    return set(shards[index - 1]), [sum(weights[path] for path in shard) for shard in shards]
+
+
+def main():
+    import argparse
+    import os
+
+    from perf_history import PerformanceHistory
+    from query_catalog import QueryCatalog
+
+    parser = argparse.ArgumentParser(description="Show how the queries would be split into shards")
+    parser.add_argument("--shards", type=int, required=True, help="Number of shards")
+    parser.add_argument("--query-dir", default="queries", help="Directory containing query files")
+    parser.add_argument("--history-db", default=".query_cache/perf_history.sqlite", help="History database")
+
+    args = parser.parse_args()
+
+    queries = QueryCatalog(args.query_dir).entries
+    history = PerformanceHistory(args.history_db) if os.path.exists(args.history_db) else None
+    weights = query_weights(queries, history)
+    for index, shard in enumerate(partition(weights, args.shards), 1):
+        print(f"Shard {index}/{args.shards}: {len(shard)} queries, weight {sum(weights[p] for p in shard):.2f}")
+        for path in shard:
+            print(f"  {weights[path]:6.2f}  {path}")
+    if history is not None:
+        history.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Shared-scan materialization across the queries of one run
+
+Many queries read overlapping columns of the same wide IDC tables and views
+(above all dicom_all, a view that joins several tables on every read). For
+each IDC table referenced by at least min_queries of the queries in a run,
+the union of the columns they use is projected once into a scratch table,
+and the queries are pointed at that projection for the rest of the run.
+
+Columns are resolved with the column size catalog of cost_estimator.py, so
+the union is a superset of what each query needs; a query whose rewritten
+SQL still fails its dry run simply keeps reading the original tables.
+
+Projection tables are named by IDC release and column set, so repeated runs
+selecting the same queries reuse them until they expire.
+"""
+
+import hashlib
+import re
+from typing import Callable, Dict, Iterable, List, Optional
+
+from cost_estimator import ColumnSizeCatalog, estimate_query_bytes
+from sql_utils import IDC_TABLE_PATTERN, referenced_tables
+
+
+class SharedScanBuilder:
+    def __init__(self, client, project_id: str, dataset: str = "idc_queries_scratch", min_queries: int = 2,
+                 expiration_hours: int = 24, location: str = "US", retry: Optional[Callable] = None):
+        """
+        Initialize shared-scan builder.
+
+        Args:
+            client: BigQuery client used to create the projection tables
+            project_id: Project that owns the scratch dataset
+            dataset: Scratch dataset name (created if missing)
+            min_queries: Only tables referenced by at least this many queries are shared
+            expiration_hours: Lifetime of projection tables
+            location: Dataset location; must match bigquery-public-data (US)
+            retry: Wrapper used to call BigQuery, e.g. QueryTestRunner.call_with_backoff
+        """
+        self.client = client
+        self.project_id = project_id
+        self.dataset = dataset
+        self.min_queries = min_queries
+        self.expiration_hours = expiration_hours
+        self.location = location
+        self.retry = retry or (lambda func: func())
+        self.materialized_bytes_billed = 0
+
+    def run_query(self, sql: str):
+        """Run a statement to completion and return its job."""
+        def submit_and_wait():
+            job = self.client.query(sql)
+            job.result()
+            return job
+        return self.retry(submit_and_wait)
+
+    def table_exists(self, table_id: str) -> bool:
+        try:
+            self.client.get_table(table_id)
+            return True
+        except Exception:
+            return False
+
+    def schema_catalog(self, tables: Iterable[str]) -> ColumnSizeCatalog:
+        """Catalog of column names only (sizes 0), for when no column size catalog is available."""
+        columns = {}
+        for table in sorted(set(tables)):
+            try:
+                columns[table] = {field.name: 0 for field in self.client.get_table(table).schema}
+            except Exception as e:
+                # Left out of the catalog, so never shared
+                print(f"  WARNING: could not read schema of {table}: {e}")
+        return ColumnSizeCatalog(tables=columns)
+
+    def plan(self, query_contents: Iterable[str], catalog: ColumnSizeCatalog) -> Dict[str, List[str]]:
+        """
+        Find the tables worth sharing and the union of columns their queries use.
+
+        Returns: IDC table -> sorted column names to project
+        """
+        users = {}
+        columns = {}
+        for content in query_contents:
+            estimate = estimate_query_bytes(content, catalog)
+            for table, used in estimate["columns"].items():
+                users[table] = users.get(table, 0) + 1
+                columns.setdefault(table, set()).update(used)
+        return {
+            table: sorted(columns[table])
+            for table in sorted(users)
+            if users[table] >= self.min_queries and columns[table]
+        }
+
+    def projection_table_id(self, table: str, columns: List[str], source: str,
+                            idc_version: Optional[str]) -> str:
+        """Fully qualified projection table name for a table, its column set and the table it is read from."""
+        dataset_name, table_name = IDC_TABLE_PATTERN.match(table).groups()
+        version = re.sub(r"[^A-Za-z0-9]", "_", str(idc_version or "unknown"))
+        spec = hashlib.sha256(f"{source}:{','.join(columns)}".encode("utf-8")).hexdigest()[:8]
+        return f"{self.project_id}.{self.dataset}.{dataset_name}__{table_name}__v{version}_shared_{spec}"
+
+    def build(self, plan: Dict[str, List[str]], sources: Optional[Dict[str, str]] = None,
+              idc_version: Optional[str] = None) -> Dict[str, str]:
+        """
+        Materialize the projection of each planned table.
+
+        Args:
+            plan: IDC table -> columns, from plan()
+            sources: IDC table -> table to read it from instead (e.g. its sample)
+            idc_version: IDC release, used to name the projections
+
+        Returns: mapping of IDC table -> projection table
+        """
+        sources = sources or {}
+        if not plan:
+            return {}
+        self.run_query(
+            f"CREATE SCHEMA IF NOT EXISTS `{self.project_id}.{self.dataset}` "
+            f"OPTIONS(location = \"{self.location}\", "
+            f"default_table_expiration_days = {self.expiration_hours / 24})"
+        )
+
+        table_map = {}
+        for table, columns in plan.items():
+            source = sources.get(table, table)
+            projection_id = self.projection_table_id(table, columns, source, idc_version)
+            if not self.table_exists(projection_id):
+                print(f"  Projecting {len(columns)} columns of {table} -> {projection_id}")
+                column_list = ", ".join(f"`{column}`" for column in columns)
+                job = self.run_query(
+                    f"CREATE TABLE `{projection_id}` "
+                    f"OPTIONS(expiration_timestamp = TIMESTAMP_ADD(CURRENT_TIMESTAMP(), "
+                    f"INTERVAL {self.expiration_hours} HOUR)) AS "
+                    f"SELECT {column_list} FROM `{source}`"
+                )
+                self.materialized_bytes_billed += job.total_bytes_billed or job.total_bytes_processed or 0
+            table_map[table] = projection_id
+
+        return table_map
+
+
+def shared_tables(query_content: str, table_map: Dict[str, str]) -> List[str]:
+    """IDC tables of a query that have a shared projection."""
+    return [table for table in referenced_tables(query_content) if table in table_map]
@@ -0,0 +1,138 @@
+"""
+SQL text utilities shared by the test and maintenance scripts.
+
+These operate on BigQuery Standard SQL source text without a full parser:
+comments and string literals are recognized so that header comments and
+quoted values are never mistaken for SQL.
+"""
+
+import re
+from typing import Dict, Iterator, List, Tuple
+
+# Token kinds produced by scan_sql
+CODE = "code"
+COMMENT = "comment"
+STRING = "string"
+IDENTIFIER = "identifier"  # backtick-quoted
+
+
+def scan_sql(sql: str) -> Iterator[Tuple[str, str]]:
+    """
+    Split SQL text into (kind, text) segments of code, comments, strings and quoted identifiers.
+    
+    Handles `--` and `#` line comments, `/* */` block comments, single/double
+    quoted strings (including triple-quoted) and backtick-quoted identifiers.
+    """
+    i = 0
+    start = 0
+    length = len(sql)
+    while i < length:
+        char = sql[i]
+        two = sql[i:i + 2]
+        
+        if two == "--" or char == "#":
+            end = sql.find("\n", i)
+            end = length if end == -1 else end
+            kind = COMMENT
+        elif two == "/*":
+            end = sql.find("*/", i + 2)
+            end = length if end == -1 else end + 2
+            kind = COMMENT
+        elif char in ("'", '"', "`"):
+            quote = sql[i:i + 3] if sql[i:i + 3] in ("'''", '"""') else char
+            end = i + len(quote)
+            while end < length and sql[end:end + len(quote)] != quote:
+                end += 2 if sql[end] == "\\" else 1
+            end = min(end + len(quote), length)
+            kind = IDENTIFIER if char == "`" else STRING
+        else:
+            i += 1
+            continue
+        
+        if start < i:
+            yield CODE, sql[start:i]
+        yield kind, sql[i:end]
+        i = start = end
+    
+    if start < length:
+        yield CODE, sql[start:]
+
+
+def masked_code(sql: str) -> str:
+    """SQL with comments and string contents blanked (newlines and offsets kept), for pattern matching."""
+    parts = []
+    for kind, text in scan_sql(sql):
+        if kind in (CODE, IDENTIFIER):
+            parts.append(text)
+        else:
+            parts.append("".join(c if c == "\n" else " " for c in text))
+    return "".join(parts)
+
+
+def paren_depths(code: str) -> List[int]:
+    """Parenthesis nesting depth at each character of code."""
+    depths = []
+    depth = 0
+    for char in code:
+        if char == ")":
+            depth -= 1
+        depths.append(depth)
+        if char == "(":
+            depth += 1
+    return depths
+
+
+def strip_sql_comments(sql: str) -> str:
+    """Remove all comments from SQL text, leaving strings untouched."""
+    return "".join(text for kind, text in scan_sql(sql) if kind != COMMENT)
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Normalize SQL for hashing: drop comments, collapse whitespace and trailing semicolons.
+    
+    Two files that differ only in header comments or formatting normalize to
+    the same text, so edits to stats headers do not change the query identity.
+    """
+    parts = []
+    code = ""
+    for kind, text in scan_sql(sql):
+        if kind in (CODE, COMMENT):
+            code += " " if kind == COMMENT else text
+            continue
+        parts.append(re.sub(r"\s+", " ", code))
+        parts.append(text)
+        code = ""
+    parts.append(re.sub(r"\s+", " ", code))
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+# Fully qualified IDC table, as written inside backticks: bigquery-public-data.idc_current.dicom_all
+IDC_TABLE_PATTERN = re.compile(r"^bigquery-public-data\.(idc_[a-z0-9_]+)\.([A-Za-z0-9_]+)$")
+
+
+def referenced_tables(sql: str) -> List[str]:
+    """Return the fully qualified IDC tables referenced in backticks, in order of first use."""
+    tables = []
+    for kind, text in scan_sql(sql):
+        if kind == IDENTIFIER:
+            name = text.strip("`")
+            if IDC_TABLE_PATTERN.match(name) and name not in tables:
+                tables.append(name)
+    return tables
+
+
+def rewrite_table_refs(sql: str, table_map: Dict[str, str]) -> str:
+    """Replace backtick-quoted table references according to table_map (comments and strings untouched)."""
+    parts = []
+    for kind, text in scan_sql(sql):
+        if kind == IDENTIFIER and text.strip("`") in table_map:
+            text = f"`{table_map[text.strip('`')]}`"
+        parts.append(text)
+    return "".join(parts)
+
+
+def has_limit_clause(sql: str) -> bool:
+    """Check whether the statement ends in a LIMIT clause, ignoring comments and string literals."""
+    code = "".join(text for kind, text in scan_sql(sql) if kind not in (COMMENT, STRING))
+    return re.search(r"\bLIMIT\s+\d+(\s+OFFSET\s+\d+)?\s*;?\s*$", code, re.IGNORECASE) is not None
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Cheapest-source table advisor
+
+Many queries read from dicom_all, a wide view that joins several tables on
+every read, even when every column they use is available in a smaller IDC
+table. The advisor indexes the columns of the IDC tables (from the column
+size catalog of cost_estimator.py) and reports, for each table a query
+reads, the cheapest table or pair of tables that supplies all the columns it
+uses, with the estimated bytes saved.
+
+A replacement is rewritten automatically only when it is a single table with
+one row per DICOM instance, like the table it replaces (e.g. dicom_all ->
+dicom_metadata). Anything else (a table of another grain, or a pair of
+tables to be joined) changes what the query counts and is only reported.
+Rewritten variants are verified by run_regression_tests.py --verify-rewrites,
+which runs both versions and compares their result fingerprints.
+"""
+
+import json
+import sys
+from itertools import combinations
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from cost_estimator import ColumnSizeCatalog, estimate_query_bytes
+from sql_utils import IDC_TABLE_PATTERN, referenced_tables, rewrite_table_refs
+
+# IDC tables measured into the catalog as candidate sources, beyond those the queries reference
+CANDIDATE_TABLES = [
+    "dicom_all",
+    "dicom_metadata",
+    "dicom_metadata_curated",
+    "dicom_metadata_curated_series_level",
+    "segmentations",
+    "measurement_groups",
+    "quantitative_measurements",
+    "qualitative_measurements",
+    "auxiliary_metadata",
+]
+
+# Row grain of IDC tables; only tables of the same grain are substituted automatically
+TABLE_GRAIN = {
+    "dicom_all": "instance",
+    "dicom_all_view": "instance",
+    "dicom_metadata": "instance",
+    "dicom_metadata_curated": "instance",
+    "auxiliary_metadata": "instance",
+    "dicom_metadata_curated_series_level": "series",
+    "segmentations": "segment",
+    "measurement_groups": "measurement_group",
+    "quantitative_measurements": "measurement",
+    "qualitative_measurements": "measurement",
+}
+
+# Columns a pair of tables can be joined on to supply a query's columns together
+JOIN_KEYS = ("SOPInstanceUID", "SeriesInstanceUID")
+
+
+def table_name(table: str) -> str:
+    return IDC_TABLE_PATTERN.match(table).group(2)
+
+
+class TableAdvisor:
+    def __init__(self, catalog: ColumnSizeCatalog):
+        """
+        Initialize advisor.
+
+        Args:
+            catalog: Column size catalog covering the candidate tables
+        """
+        self.catalog = catalog
+        # Lowercase column name -> tables that have it
+        self.index = {}
+        for table, columns in catalog.tables.items():
+            for column in columns:
+                self.index.setdefault(column.lower(), set()).add(table)
+
+    def tables_with(self, columns: Iterable[str]) -> List[str]:
+        """Tables in the index that have every one of columns."""
+        tables = None
+        for column in columns:
+            having = self.index.get(column.lower(), set())
+            tables = set(having) if tables is None else tables & having
+        return sorted(tables or [])
+
+    def columns_bytes(self, table: str, columns: Iterable[str]) -> int:
+        """Catalog size of the columns (case-insensitive) of table."""
+        sizes = self.catalog.columns(table)
+        return sum(sizes[self.catalog.resolve_column(table, column)] for column in columns)
+
+    @staticmethod
+    def same_grain(table: str, other: str) -> bool:
+        grain = TABLE_GRAIN.get(table_name(table))
+        return grain is not None and TABLE_GRAIN.get(table_name(other)) == grain
+
+    def best_pair(self, table: str, columns: List[str]) -> Optional[Dict]:
+        """Cheapest two tables of table's dataset that together have columns and share a join key."""
+        dataset = IDC_TABLE_PATTERN.match(table).group(1)
+        tables = [t for t in self.catalog.tables if t != table and IDC_TABLE_PATTERN.match(t).group(1) == dataset]
+        best = None
+        for first, second in combinations(tables, 2):
+            key = next((k for k in JOIN_KEYS
+                        if self.catalog.resolve_column(first, k) and self.catalog.resolve_column(second, k)), None)
+            if key is None:
+                continue
+            from_first = [c for c in columns if self.catalog.resolve_column(first, c)]
+            from_second = [c for c in columns if c not in from_first]
+            if not from_second or not all(self.catalog.resolve_column(second, c) for c in from_second):
+                continue
+            cost = self.columns_bytes(first, from_first + [key]) + self.columns_bytes(second, from_second + [key])
+            if best is None or cost < best["bytes"]:
+                best = {"tables": [first, second], "join_key": key, "bytes": cost}
+        return best
+
+    def advise(self, content: str) -> List[Dict]:
+        """
+        Find cheaper sources for the IDC tables a query reads.
+
+        Returns: one dict per table with a cheaper source:
+            table, columns (used), bytes (reading them from table), replacement (list of tables),
+            replacement_bytes, saving_bytes, join_key (for pairs) and safe (rewritten automatically)
+        """
+        estimate = estimate_query_bytes(content, self.catalog)
+        advice = []
+        for table, columns in estimate["columns"].items():
+            if not columns:
+                continue
+            dataset = IDC_TABLE_PATTERN.match(table).group(1)
+            table_bytes = self.columns_bytes(table, columns)
+
+            singles = [
+                t for t in self.tables_with(columns)
+                if t != table and IDC_TABLE_PATTERN.match(t).group(1) == dataset
+            ]
+            best = min(singles, key=lambda t: self.columns_bytes(t, columns), default=None)
+            if best is not None and self.columns_bytes(best, columns) < table_bytes:
+                replacement_bytes = self.columns_bytes(best, columns)
+                advice.append({
+                    "table": table,
+                    "columns": columns,
+                    "bytes": table_bytes,
+                    "replacement": [best],
+                    "replacement_bytes": replacement_bytes,
+                    "saving_bytes": table_bytes - replacement_bytes,
+                    "join_key": None,
+                    "safe": self.same_grain(table, best),
+                })
+                continue
+
+            pair = self.best_pair(table, columns)
+            if pair is not None and pair["bytes"] < table_bytes:
+                advice.append({
+                    "table": table,
+                    "columns": columns,
+                    "bytes": table_bytes,
+                    "replacement": pair["tables"],
+                    "replacement_bytes": pair["bytes"],
+                    "saving_bytes": table_bytes - pair["bytes"],
+                    "join_key": pair["join_key"],
+                    "safe": False,
+                })
+        return advice
+
+    def rewrite(self, content: str, advice: Optional[List[Dict]] = None) -> Optional[str]:
+        """
+        Query with each table that has a safe replacement read from it instead.
+
+        Returns: rewritten SQL, or None if no replacement is safe
+        """
+        advice = self.advise(content) if advice is None else advice
+        table_map = {a["table"]: a["replacement"][0] for a in advice if a["safe"]}
+        if not table_map:
+            return None
+        return rewrite_table_refs(content, table_map)
+
+
+def main():
+    import argparse
+    import os
+
+    from cost_estimator import DEFAULT_CATALOG_PATH, measure_column_sizes
+    from query_catalog import QueryCatalog
+    from update_query_headers import QueryHeaderUpdater
+
+    parser = argparse.ArgumentParser(description="Suggest cheaper source tables for queries")
+    parser.add_argument("--query-dir", default="queries", help="Directory containing query files")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG_PATH, help="Column size catalog JSON")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Measure the candidate tables into the catalog with BigQuery dry runs")
+    parser.add_argument("--credentials", help="Path to GCP service account JSON (or use GCP_SA_KEY env)")
+    parser.add_argument("--write", metavar="DIR",
+                        help="Write safely rewritten queries to DIR, mirroring the query directory")
+    parser.add_argument("--json", action="store_true", help="Print advice as JSON")
+
+    args = parser.parse_args()
+
+    catalog = ColumnSizeCatalog.load(args.catalog)
+    queries = QueryCatalog(args.query_dir)
+
+    if args.refresh:
+        from run_regression_tests import QueryTestRunner
+        runner = QueryTestRunner(args.credentials or os.getenv("GCP_SA_KEY"))
+        idc_version = runner.resolve_idc_version()
+        if catalog.idc_version and catalog.idc_version != idc_version:
+            # Sizes from an older release must not be mixed with new ones under one version
+            print(f"⚠ Catalog is from IDC release {catalog.idc_version}; re-measuring for {idc_version}")
+            catalog = ColumnSizeCatalog(idc_version)
+        tables ={f"bigquery-public-data.idc_current.{name}" for name in CANDIDATE_TABLES}
+        for entry in queries.entries.values():
+            tables.update(referenced_tables(queries.content(entry["path"])))
+        missing = sorted(tables - set(catalog.tables))
+        print(f"Measuring {len(missing)} tables not yet in the catalog...")
+        catalog.tables.update(measure_column_sizes(runner, missing))
+        catalog.idc_version = idc_version
+        catalog.save(args.catalog)
+        catalog = ColumnSizeCatalog.load(args.catalog)
+        print(f"✓ Wrote column size catalog to {args.catalog}")
+
+    if not catalog.tables:
+        print(f"ERROR: Column size catalog {args.catalog} is empty; run with --refresh")
+        return 1
+
+    advisor = TableAdvisor(catalog)
+    format_bytes = QueryHeaderUpdater().format_bytes
+    report = {}
+    total_saving = 0
+    for entry in queries.entries.values():
+        content = queries.content(entry["path"])
+        advice = advisor.advise(content)
+        if not advice:
+            continue
+        report[entry["path"]] = advice
+        total_saving += sum(a["saving_bytes"] for a in advice)
+
+        rewritten = advisor.rewrite(content, advice)
+        if args.write and rewritten is not None:
+            output = Path(args.write) / Path(entry["path"]).relative_to(args.query_dir)
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text(rewritten)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    for path, advice in report.items():
+        print(f"\n{path}")
+        for a in advice:
+            via = f" joined on {a['join_key']}" if a["join_key"] else ""
+            action = "rewritten" if a["safe"] else "manual rewrite"
+            print(f"  {table_name(a['table'])} -> {' + '.join(table_name(t) for t in a['replacement'])}{via}: "
+                  f"{format_bytes(a['bytes'])} -> {format_bytes(a['replacement_bytes'])} "
+                  f"(saves {format_bytes(a['saving_bytes'])}, {action})")
+    print(f"\n{len(report)} queries could read cheaper tables; estimated saving {format_bytes(total_saving)}")
+    if args.write:
+        print(f"✓ Wrote rewritten variants to {args.write}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
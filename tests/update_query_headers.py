@@ -11,42 +11,31 @@ from pathlib import Path
 from typing import Dict, Tuple
 import json
 
+from query_catalog import parse_header
+
 
 class QueryHeaderUpdater:
-    def __init__(self, variance_threshold: float = 0.10):
+    def __init__(self, variance_threshold: float = 0.10, history=None):
         """
         Initialize updater.
         
         Args:
             variance_threshold: Only update if new value differs by this percentage (default 10%)
+            history: Optional perf_history.PerformanceHistory; when a query has enough
+                recorded runs on the release of its result, its rolling median bytes are used
+                instead of the single run
         """
         self.variance_threshold = variance_threshold
+        self.history = history
 
     def parse_header_stats(self, content: str) -> Dict:
         """Extract existing stats from query header."""
-        stats = {
-            "estimated_cost": "TBD",
-            "bytes_scanned": "TBD",
-            "complexity": "Unknown"
+        header = parse_header(content)
+        return {
+            "estimated_cost": header["estimated_cost"],
+            "bytes_scanned": header["bytes_scanned"],
+            "complexity": header["complexity"]
         }
-        
-        for line in content.split("\n")[:20]:
-            if "Estimated Cost:" in line:
-                cost_match = re.search(r"Estimated Cost:\s*([^\|]+)", line)
-                if cost_match:
-                    stats["estimated_cost"] = cost_match.group(1).strip()
-            
-            if "Bytes Scanned:" in line:
-                bytes_match = re.search(r"Bytes Scanned:\s*([^\|]+)", line)
-                if bytes_match:
-                    stats["bytes_scanned"] = bytes_match.group(1).strip()
-            
-            if "Complexity:" in line:
-                complexity_match = re.search(r"Complexity:\s*([^\|]+)", line)
-                if complexity_match:
-                    stats["complexity"] = complexity_match.group(1).strip()
-        
-        return stats
 
     def estimate_cost_from_bytes(self, bytes_scanned: int) -> float:
         """Estimate cost at $6.25 per TB."""
@@ -69,7 +58,7 @@ class QueryHeaderUpdater:
         
         try:
             # Try to parse a range or single value
-            old_val_clean = old_val.replace("$", "").split("-")[0].strip()
+            old_val_clean = old_val.replace("$", "").replace("~", "").split("-")[0].strip()
             old_numeric = float(old_val_clean)
             
             # Calculate variance
@@ -81,6 +70,46 @@ class QueryHeaderUpdater:
         except (ValueError, IndexError):
             return True  # Update if can't parse
 
+    def replace_stats_line(self, content: str, estimated_cost: str, bytes_scanned: str) -> str:
+        """
+        Replace the values on the header stats line, returning content unchanged if there is none.
+        
+        Handles both "-- Estimated Cost: ... | Bytes Scanned: ..." and the same line
+        with a trailing "| Complexity: ...", which is kept as is.
+        """
+        pattern = r"-- Estimated Cost:[^\n|]*\| Bytes Scanned:[^\n|]*(\|[^\n]*)?\n"
+        
+        def new_line(match):
+            suffix = match.group(1).strip() if match.group(1) else ""
+            line = f"-- Estimated Cost: {estimated_cost} | Bytes Scanned: {bytes_scanned}"
+            return f"{line} {suffix}\n" if suffix else f"{line}\n"
+        
+        return re.sub(pattern, new_line, content, count=1)
+
+    def fill_estimate(self, query_path: str, bytes_estimated: int) -> Tuple[bool, str]:
+        """
+        Fill a TBD Bytes Scanned header with a static estimate, marked with "~".
+        
+        Headers that already hold measured values are left alone.
+        
+        Returns: (was_updated, message)
+        """
+        with open(query_path, "r") as f:
+            content = f.read()
+        
+        if self.parse_header_stats(content)["bytes_scanned"] != "TBD":
+            return False, "Header already has stats"
+        
+        estimated_cost = f"~${self.estimate_cost_from_bytes(bytes_estimated):.4f}"
+        bytes_formatted = f"~{self.format_bytes(bytes_estimated)}"
+        updated_content = self.replace_stats_line(content, estimated_cost, bytes_formatted)
+        if updated_content == content:
+            return False, "Could not find stats pattern in header"
+        
+        with open(query_path, "w") as f:
+            f.write(updated_content)
+        return True, f"Estimated: {estimated_cost}, {bytes_formatted}"
+
     def update_query_file(self, query_path: str, bytes_scanned: int, row_count: int) -> Tuple[bool, str]:
         """
         Update query file with execution stats if variance exceeds threshold.
@@ -103,12 +132,7 @@ class QueryHeaderUpdater:
             new_estimated_cost = f"${estimated_cost_usd:.4f}"
             new_bytes_scanned = bytes_formatted
             
-            # Find and replace in header
-            # Pattern: "-- Estimated Cost: ... | Bytes Scanned: ... | Complexity: ..."
-            old_pattern = r"-- Estimated Cost:.*?\| Bytes Scanned:.*?\| Complexity:.*?\n"
-            new_stats_line = f"-- Estimated Cost: {new_estimated_cost} | Bytes Scanned: {new_bytes_scanned} | Complexity: {current_stats['complexity']}\n"
-            
-            updated_content = re.sub(old_pattern, new_stats_line, content)
+            updated_content = self.replace_stats_line(content, new_estimated_cost, new_bytes_scanned)
             
             if updated_content == content:
                 return False, "Could not find stats pattern in header"
@@ -135,9 +159,19 @@ class QueryHeaderUpdater:
                 continue  # Skip pending and failed queries
             
             query_path = result["path"]
+            # Sampled and shared-scan runs read substitute tables; the dry run has the real-table figure
+            substituted = result.get("sampled") or result.get("shared_scan")
+            bytes_scanned = result["dry_run_bytes"] if substituted else result["bytes_scanned"]
+            if self.history is not None and result.get("idc_version"):
+                # Medians of runs on the same release and in the same run mode only
+                stats = self.history.stats(
+                    query_path, "bytes_scanned", result["idc_version"], self.history.run_mode(result)
+                )
+                if stats:
+                    bytes_scanned = int(stats["median"])
             was_updated, message = self.update_query_file(
                 query_path,
-                result["bytes_scanned"],
+                bytes_scanned,
                 result["row_count"]
             )
             
@@ -157,6 +191,7 @@ def main():
     parser.add_argument("--results", required=True, help="JSON file with test results")
     parser.add_argument("--threshold", type=float, default=0.10, help="Variance threshold (default 0.10 = 10%)")
     parser.add_argument("--query-dir", default="queries", help="Base query directory")
+    parser.add_argument("--history-db", help="Use rolling medians from this performance history database")
     
     args = parser.parse_args()
     
@@ -165,7 +200,12 @@ def main():
         results = json_module.load(f)
     
     # Update headers
-    updater = QueryHeaderUpdater(variance_threshold=args.threshold)
+    history = None
+    if args.history_db and os.path.exists(args.history_db):
+        from perf_history import PerformanceHistory
+        history = PerformanceHistory(args.history_db)
+    
+    updater = QueryHeaderUpdater(variance_threshold=args.threshold, history=history)
     updates = updater.batch_update(results, args.query_dir)
     
     # Print summary